@@ -3,17 +3,27 @@ A file containing all functions related to logging in/out, registering etc.
 """
 
 
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import sha256
-from data import User, data
+from itertools import islice
+from data import User, data, normalise_email
 from error import AuthError, InputError
 from error_checks import check_username, check_logged_in
+from profiling import profiled
 
 
 MAX_USERNAME = 20
 MIN_PASSWORD = 6
 MAX_NAME = 30
+# bulk_register reads, checks and commits this many rows at a time
+BULK_CHUNK = 10000
+# Number of passwords sent to a worker process at a time
+HASH_CHUNK = 1000
+BULK_FIELDS = ("username", "password", "first_name", "last_name", "email")
 
 
+@profiled
 def log_in(username, password):
     """
     Log a user in if given a valid username/password.
@@ -35,16 +45,18 @@ def log_in(username, password):
     """
     check_username(username)
 
-    hashed_password = sha256(password.encode()).hexdigest()
-    if data.users[username].hash_pwd != hashed_password:
+    if data.users[username].hash_pwd != hash_password(password):
         raise AuthError("Incorrect password")
 
     if data.users[username].logged_in:
         raise InputError("Already logged in")
 
     data.users[username].logged_in = True
+    data.storage.save_user(data.users[username])
+    data.storage.commit()
 
 
+@profiled
 def log_out(username):
     """
     Log a user out if given valid username and if not already logged out.
@@ -65,8 +77,11 @@ def log_out(username):
     check_logged_in(username)
 
     data.users[username].logged_in = False
+    data.storage.save_user(data.users[username])
+    data.storage.commit()
 
 
+@profiled
 def register(username, password, first_name, last_name, email):
     """
     Register a new user with given details, then log them in.
@@ -87,36 +102,163 @@ def register(username, password, first_name, last_name, email):
                 password shorter than 6 characters
                 first_name or last_name longer than 30 characters, or not
                                         alphabetic or empty
-                email empty or not unique
+                email empty or not unique (ignoring case)
+    """
+    check_details(username, password, first_name, last_name, email)
+
+    if data.users.get(username):
+        raise InputError("Username already in use")
+
+    if normalise_email(email) in data.emails:
+        raise InputError("Email already in use")
+
+    new_user = User(username, hash_password(password), email,
+                    first_name, last_name)
+    data.add_user(new_user)
+    data.storage.save_user(new_user)
+    log_in(username, password)
+
+
+@profiled
+def bulk_register(rows, workers=None):
+    """
+    Register many new users, without logging them in. Rows are read and
+    checked BULK_CHUNK at a time, and each chunk's users are committed
+    together, so any number of rows can be imported in constant memory.
+    Rows with invalid details, or whose username or email is already in
+    use or appears earlier in rows, are skipped and reported.
+
+        Parameters:
+            rows (iterable): rows of new user details, each either a
+                             sequence of (username, password, first_name,
+                             last_name, email), as given by csv.reader, or
+                             a dict with those keys, as given by
+                             csv.DictReader
+            workers (int): number of worker processes hashing passwords,
+                           by default one per CPU; with 1 or fewer no
+                           processes are started
+
+        Returns:
+            imported (int): number of users registered
+            errors ([(int, InputError)]): list of (row index, error) pairs
+                                          of rows which were skipped
+    """
+    executor = None
+    if workers is None or workers > 1:
+        executor = ProcessPoolExecutor(workers)
+
+    imported = 0
+    errors = []
+    rows = iter(rows)
+    start = 0
+    try:
+        while True:
+            chunk = list(islice(rows, BULK_CHUNK))
+            if not chunk:
+                break
+
+            valid = check_chunk(chunk, start, errors)
+            start += len(chunk)
+            passwords = [details[1] for _, details in valid]
+            if executor is None:
+                hashes = map(hash_password, passwords)
+            else:
+                hashes = executor.map(hash_password, passwords,
+                                      chunksize=HASH_CHUNK)
+
+            for (i, details), hash_pwd in zip(valid, hashes):
+                username, _, first_name, last_name, email = details
+                new_user = User(username, hash_pwd, email,
+                                first_name, last_name)
+                try:
+                    data.add_user(new_user)
+                except InputError as e:
+                    errors.append((i, e))
+                    continue
+
+                data.storage.save_user(new_user)
+                imported += 1
+
+            data.storage.commit()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return imported, errors
+
+
+def check_chunk(chunk, start, errors):
+    """
+    Check the rows of a chunk of bulk_register, whose first row has index
+    start. Returns a list of (row index, details) pairs of valid rows, and
+    adds (row index, error) pairs of invalid rows to errors.
+    """
+    valid = []
+    usernames = set()
+    emails = set()
+    for i, row in enumerate(chunk, start):
+        try:
+            details = row_details(row)
+            check_details(*details)
+            username, email = details[0], normalise_email(details[4])
+            if username in usernames or data.users.get(username):
+                raise InputError("Username already in use")
+
+            if email in emails or email in data.emails:
+                raise InputError("Email already in use")
+        except InputError as e:
+            errors.append((i, e))
+            continue
+
+        usernames.add(username)
+        emails.add(email)
+        valid.append((i, details))
+
+    return valid
+
+
+def row_details(row):
+    """
+    Return the details of a bulk_register row as a tuple of BULK_FIELDS.
+    """
+    if isinstance(row, Mapping):
+        return tuple(row.get(field) or "" for field in BULK_FIELDS)
+
+    details = tuple(row)
+    if len(details) != len(BULK_FIELDS):
+        raise InputError("Row must have " + str(len(BULK_FIELDS)) + " fields")
+
+    return details
+
+
+def check_details(username, password, first_name, last_name, email):
+    """
+    Check the details of a new user, raising InputError if any is invalid.
+    Does not check whether the username or email is in use.
     """
     if not len(username) or len(username) > MAX_USERNAME:
         raise InputError("Username length invalid")
 
-    if len(password) < 6:
+    if len(password) < MIN_PASSWORD:
         raise InputError("Password too short")
 
-    if not len(first_name) or len(first_name) > 30 or not first_name.isalpha():
+    if (not len(first_name) or len(first_name) > MAX_NAME or
+        not first_name.isalpha()):
         raise InputError("First name invalid")
 
-    if not len(last_name) or len(last_name) > 30 or not last_name.isalpha():
+    if (not len(last_name) or len(last_name) > MAX_NAME or
+        not last_name.isalpha()):
         raise InputError("Last name invalid")
 
     if not email:
         raise InputError("Email is required")
 
-    if data.users.get(username):
-        raise InputError("Username already in use")
-
-    for u in data.users:
-        if data.users[u].email == email:
-            raise InputError("Email already in use")
 
-    hash_pwd = sha256(password.encode()).hexdigest()
-    new_user = User(username, hash_pwd, email, first_name, last_name)
-    data.users[username] = new_user
-    log_in(username, password)
+def hash_password(password):
+    return sha256(password.encode()).hexdigest()
 
 
+@profiled
 def request_password_reset(username):
     """
     Send a confirmation code for the user to reset their password.
@@ -130,6 +272,7 @@ def request_password_reset(username):
     pass
 
 
+@profiled
 def reset_password(username, code, new_password):
     """
     Given a correct code, reset a user's password.
@@ -0,0 +1,280 @@
+"""
+Benchmarks of the Meeter entry points on seeded synthetic users, events and
+schedules, reported as JSON.
+
+Run a benchmark:
+    python benchmark.py --members 1 10 100 1000 --events 10 --fill 0.2 \
+        --output new.json
+Compare two runs, listing entry points whose p50 latency got worse:
+    python benchmark.py --compare old.json new.json
+Measure the memory held by users and events:
+    python benchmark.py --memory 100000 50000
+"""
+
+
+import argparse
+import json
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, time as clock_time
+from time import perf_counter
+from data import data, MAX_DAYS, INTERVALS
+from auth import register
+from event_admin import create_event, invite_user
+from event_data import find_best_times, best_times_cache
+from event_member import (edit_availability_weekly, edit_availability_special,
+                          edit_availability_daily, MON, SUN)
+
+
+DEFAULT_MEMBERS = [1, 10, 100, 1000]
+DEFAULT_EVENTS = 10
+DEFAULT_FILL = 0.2
+DEFAULT_SEED = 1
+# Number of times find_best_times is called per event
+FIND_REPEATS = 5
+# A change in p50 latency above this fraction is reported as a regression
+REGRESSION_THRESHOLD = 0.2
+# Number of members invited to each event when measuring memory
+MEMORY_MEMBERS = 3
+
+ENTRY_POINTS = ["register", "invite_user", "edit_availability_weekly",
+                "edit_availability_special", "edit_availability_daily",
+                "find_best_times", "find_best_times_cached"]
+
+
+def timed(timings, name, f, *args):
+    """
+    Call f(*args), adding its duration in seconds to timings[name].
+    """
+    start = perf_counter()
+    result = f(*args)
+    timings[name].append(perf_counter() - start)
+    return result
+
+
+def random_time(rand, latest):
+    """
+    Return a random time on the half hour, at or before index latest.
+    """
+    index = rand.randrange(latest + 1)
+    return clock_time(index // 2, index % 2 * 30)
+
+
+def fill_schedule(rand, timings, username, event_id, fill):
+    """
+    Make random weekly, special and daily edits to a member's schedule until
+    about fill of the MAX_DAYS x INTERVALS intervals have been marked.
+    """
+    event = data.events[event_id]
+    first_day = event.create_time.date() + timedelta(days=1)
+    target = fill * MAX_DAYS * INTERVALS
+    marked = 0
+    while marked < target:
+        kind = rand.random()
+        if kind < 0.2:
+            start = random_time(rand, INTERVALS - 2)
+            length = rand.randrange(1, 9)
+            end_index = min(start.hour * 2 + start.minute // 30 + length,
+                            INTERVALS - 1)
+            end = clock_time(end_index // 2, end_index % 2 * 30)
+            timed(timings, "edit_availability_weekly",
+                  edit_availability_weekly, username, event_id, True,
+                  rand.randint(MON, SUN), start, end)
+            marked += length * MAX_DAYS // 7
+        elif kind < 0.3:
+            day = first_day + timedelta(days=rand.randrange(MAX_DAYS - 1))
+            timed(timings, "edit_availability_daily",
+                  edit_availability_daily, username, event_id, True, day)
+            marked += INTERVALS
+        else:
+            day = first_day + timedelta(days=rand.randrange(MAX_DAYS - 2))
+            start = datetime.combine(day, random_time(rand, INTERVALS - 1))
+            length = rand.randrange(1, 9)
+            timed(timings, "edit_availability_special",
+                  edit_availability_special, username, event_id, True,
+                  start, start + timedelta(minutes=30 * length))
+            marked += length
+
+
+def summarise(durations):
+    """
+    Return latency percentiles in milliseconds and throughput per second of
+    a list of call durations in seconds.
+    """
+    durations = sorted(durations)
+    n = len(durations)
+
+    def percentile(p):
+        return round(durations[min(n - 1, int(p * n))] * 1000, 4)
+
+    return {
+        "calls": n,
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(durations[-1] * 1000, 4),
+        "throughput_per_s": round(n / sum(durations), 1) if sum(durations)
+                            else None,
+    }
+
+
+def run_scenario(members, events, fill, seed):
+    """
+    Time every entry point on a fresh data set of events with the given
+    number of members each, and return a dict of entry point-summary pairs.
+    """
+    rand = random.Random(seed)
+    data.__init__()
+    best_times_cache.clear()
+    timings = {name: [] for name in ENTRY_POINTS}
+
+    usernames = ["user" + str(i) for i in range(members)]
+    for username in usernames:
+        timed(timings, "register", register, username, "password",
+              "Bench", "User", username + "@bench.com")
+
+    for _ in range(events):
+        admin = rand.choice(usernames)
+        event_id = create_event(admin, "Benchmark", [])
+        for username in usernames:
+            if username != admin:
+                timed(timings, "invite_user", invite_user,
+                      admin, username, event_id)
+            fill_schedule(rand, timings, username, event_id, fill)
+
+        for _ in range(FIND_REPEATS):
+            best_times_cache.clear()
+            timed(timings, "find_best_times", find_best_times,
+                  admin, event_id)
+            timed(timings, "find_best_times_cached", find_best_times,
+                  admin, event_id)
+
+    return {name: summarise(durations)
+            for name, durations in timings.items() if durations}
+
+
+def run_benchmark(members=DEFAULT_MEMBERS, events=DEFAULT_EVENTS,
+                  fill=DEFAULT_FILL, seed=DEFAULT_SEED):
+    """
+    Run a scenario for each number of members, returning the results as a
+    dict which can be dumped as JSON.
+    """
+    return {
+        "config": {"members": list(members), "events": events,
+                   "fill": fill, "seed": seed},
+        "results": {str(m): run_scenario(m, events, fill, seed)
+                    for m in members},
+    }
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """
+    Given two results of run_benchmark with the same config, return a list
+    of (members, entry point, old p50, new p50) for every entry point whose
+    p50 latency grew by more than threshold.
+    """
+    if old["config"] != new["config"]:
+        raise ValueError("Benchmarks were run with different configs")
+
+    regressions = []
+    for members, entry_points in new["results"].items():
+        for name, summary in entry_points.items():
+            before = old["results"].get(members, {}).get(name)
+            if before and summary["p50_ms"] > before["p50_ms"] * (1 + threshold):
+                regressions.append((int(members), name, before["p50_ms"],
+                                    summary["p50_ms"]))
+
+    return regressions
+
+
+def measure_memory(users, events, members=MEMORY_MEMBERS, seed=DEFAULT_SEED):
+    """
+    Register users, then create events with members invited members each,
+    where every member makes one weekly and one special edit. Return the
+    memory held by the users and by the events as a dict which can be
+    dumped as JSON.
+    """
+    rand = random.Random(seed)
+    data.__init__()
+    best_times_cache.clear()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        usernames = ["user" + str(i) for i in range(users)]
+        for username in usernames:
+            register(username, "password", "Bench", "User",
+                     username + "@bench.com")
+        registered = tracemalloc.get_traced_memory()[0]
+
+        for _ in range(events):
+            admin, *invited = rand.sample(usernames, members + 1)
+            event_id = create_event(admin, "Benchmark", [])
+            event = data.events[event_id]
+            first_day = event.create_time.date() + timedelta(days=1)
+            for username in [admin] + invited:
+                if username != admin:
+                    invite_user(admin, username, event_id)
+                edit_availability_weekly(username, event_id, True,
+                                         rand.randint(MON, SUN),
+                                         clock_time(9), clock_time(17))
+                start_time = datetime.combine(
+                    first_day + timedelta(days=rand.randrange(MAX_DAYS - 2)),
+                    clock_time(rand.randrange(20)))
+                edit_availability_special(username, event_id, True,
+                                          start_time,
+                                          start_time + timedelta(hours=2))
+        created = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "users": users,
+        "events": events,
+        "members": members,
+        "users_mb": round((registered - start) / 2 ** 20, 1),
+        "events_mb": round((created - registered) / 2 ** 20, 1),
+        "bytes_per_user": round((registered - start) / max(users, 1)),
+        "bytes_per_event": round((created - registered) / max(events, 1)),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--members", type=int, nargs="+",
+                        default=DEFAULT_MEMBERS)
+    parser.add_argument("--events", type=int, default=DEFAULT_EVENTS)
+    parser.add_argument("--fill", type=float, default=DEFAULT_FILL)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--memory", type=int, nargs=2,
+                        metavar=("USERS", "EVENTS"))
+    parser.add_argument("--threshold", type=float,
+                        default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            regressions = compare(json.load(f), json.load(g), args.threshold)
+        for members, name, before, after in regressions:
+            print(f"{name} with {members} members: "
+                  f"p50 {before} ms -> {after} ms")
+        return 1 if regressions else 0
+
+    if args.memory:
+        result = json.dumps(measure_memory(*args.memory, seed=args.seed),
+                            indent=2)
+    else:
+        result = json.dumps(run_benchmark(args.members, args.events,
+                                          args.fill, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(result)
+    else:
+        print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
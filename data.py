@@ -3,12 +3,26 @@ A file containing user/event data
 """
 
 
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableMapping, MutableSet
 from datetime import datetime, time
+from itertools import islice
+from operator import add
+from contextlib import contextmanager
+from threading import Condition, Lock
+from types import MappingProxyType
+from error import InputError
 
 
 MAX_DAYS = 60
 INTERVALS = 2 * 24
+FULL_DAY = (1 << INTERVALS) - 1
 DEFAULT_LENGTH = 3
+# A member's schedule is stored as a SparseSchedule while it has at most
+# SPARSE_MAX_RUNS blocks of availability, and as a Schedule once it has
+# more than DENSE_MIN_RUNS blocks
+SPARSE_MAX_RUNS = MAX_DAYS // 4
+DENSE_MIN_RUNS = MAX_DAYS // 2
 
 # Days of the week (datetime)
 MON = 0
@@ -20,24 +34,848 @@ SAT = 5
 SUN = 6
 
 
+class Row:
+    """
+    A view of one day of a Schedule, indexable like a list of bools.
+
+    Attributes
+    ----------
+    schedule : Schedule
+        schedule being viewed
+    day : int
+        index of the viewed day
+    """
+    __slots__ = ("schedule", "day")
+
+    def __init__(self, schedule, day):
+        self.schedule = schedule
+        self.day = day
+
+    def __len__(self):
+        return INTERVALS
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self[i] for i in range(*t.indices(INTERVALS))]
+        if t < 0:
+            t += INTERVALS
+        if not 0 <= t < INTERVALS:
+            raise IndexError("Interval index out of range")
+        return bool(self.schedule.row(self.day) >> t & 1)
+
+    def __setitem__(self, t, available):
+        if t < 0:
+            t += INTERVALS
+        if not 0 <= t < INTERVALS:
+            raise IndexError("Interval index out of range")
+        self.schedule.set_day_intervals(self.day, t, t + 1, available)
+
+    def __iter__(self):
+        row = self.schedule.row(self.day)
+        return (bool(row >> t & 1) for t in range(INTERVALS))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class Times:
+    """
+    A view of a Schedule's packed rows, indexable like a
+    MAX_DAYS x INTERVALS 2D list of bools.
+
+    Attributes
+    ----------
+    schedule : Schedule
+        schedule being viewed
+    """
+    __slots__ = ("schedule",)
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+
+    @property
+    def rows(self):
+        return self.schedule.rows
+
+    def __len__(self):
+        return MAX_DAYS
+
+    def __getitem__(self, d):
+        if isinstance(d, slice):
+            return [self[i] for i in range(*d.indices(MAX_DAYS))]
+        if d < 0:
+            d += MAX_DAYS
+        if not 0 <= d < MAX_DAYS:
+            raise IndexError("Day index out of range")
+        return Row(self.schedule, d)
+
+    def __setitem__(self, d, values):
+        self.schedule.set_row(d, pack(values))
+
+    def __iter__(self):
+        return (Row(self.schedule, d) for d in range(MAX_DAYS))
+
+
+def pack(values):
+    """
+    Pack an iterable of INTERVALS bools into an int, where bit t is set
+    if values[t] is True.
+    """
+    row = 0
+    for t, available in enumerate(values):
+        if available:
+            row |= 1 << t
+
+    return row
+
+
+def interval_mask(start, end):
+    """
+    Return a packed row with bits start up to (not including) end set.
+    """
+    return ((1 << (end - start)) - 1) << start
+
+
+def apply_mask(row, mask, available):
+    """
+    Return row with the bits set in mask set to available.
+    """
+    return row | mask if available else row & ~mask
+
+
+def day_masks(start, end, days=MAX_DAYS):
+    """
+    Split the intervals from start up to (not including) end, where both
+    are interval indices counted from the start of day 0, into a list of
+    (day, mask) pairs. Intervals past the last of the given number of days
+    are dropped.
+    """
+    end = min(end, days * INTERVALS)
+    masks = []
+    while start < end:
+        d, t = divmod(start, INTERVALS)
+        last = min(end - d * INTERVALS, INTERVALS)
+        masks.append((d, interval_mask(t, last)))
+        start = (d + 1) * INTERVALS
+
+    return masks
+
+
+def first_run(row):
+    """
+    Return (start, end) where bits start up to (not including) end are the
+    lowest block of set bits in the non-zero packed row.
+    """
+    start = (row & -row).bit_length() - 1
+    shifted = row >> start
+    return start, start + ((shifted + 1) & ~shifted).bit_length() - 1
+
+
+def update_counts(counts, old_row, new_row):
+    """
+    Given counts, a list of INTERVALS member counts for one day, update it
+    for a member whose packed row for that day changed from old_row to
+    new_row.
+    """
+    changed = old_row ^ new_row
+    while changed:
+        low = changed & -changed
+        counts[low.bit_length() - 1] += 1 if new_row & low else -1
+        changed ^= low
+
+
+class EmptyCounts(list):
+    """
+    A read only list of INTERVALS zero member counts, shared by every day
+    of every Event.counts that no member is available on.
+    """
+    def read_only(self, *args):
+        raise TypeError("Empty counts are read only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = \
+        read_only
+
+
+EMPTY_COUNTS = EmptyCounts([0] * INTERVALS)
+
+
+EMPTY_WEEK = (0,) * 7
+EMPTY_CLEARED = MappingProxyType({})
+
+
+class Calendar:
+    """
+    A user's personal availability, kept once and shared by all of their
+    events. Each of the user's event Schedules lays its event-specific
+    changes over the calendar. Days are date ordinals (date.toordinal()).
+
+    Attributes
+    ----------
+    weekly : (int)
+        tuple of 7 packed rows, where weekly[w] is repeated on every date
+        whose weekday() is w. Shares EMPTY_WEEK until first set.
+    days : {int : int}
+        dict of date ordinal-packed row pairs of dates whose row replaces
+        the weekly row of their weekday
+    """
+    __slots__ = ("weekly", "days")
+
+    def __init__(self):
+        self.weekly = EMPTY_WEEK
+        self.days = {}
+
+    def row(self, ordinal):
+        """
+        Return the packed row of the date with the given ordinal.
+        """
+        row = self.days.get(ordinal)
+        if row is None:
+            return self.weekly[(ordinal - 1) % 7]
+        return row
+
+    def set_row(self, ordinal, row):
+        """
+        Replace the packed row of the date with the given ordinal.
+        """
+        if row == self.weekly[(ordinal - 1) % 7]:
+            self.days.pop(ordinal, None)
+        else:
+            self.days[ordinal] = row
+
+    def set_masked(self, ordinal, mask, available):
+        """
+        Set availability for the intervals of the date with the given
+        ordinal whose bits are set in mask.
+        """
+        self.set_row(ordinal, apply_mask(self.row(ordinal), mask, available))
+
+    def set_weekly(self, weekday, mask, available):
+        """
+        Set availability for the intervals whose bits are set in mask, on
+        every date whose weekday() is weekday, replacing earlier edits of
+        those intervals.
+        """
+        weekly = list(self.weekly)
+        weekly[weekday] = apply_mask(weekly[weekday], mask, available)
+        self.weekly = tuple(weekly)
+        for ordinal in [o for o in self.days if (o - 1) % 7 == weekday]:
+            self.set_row(ordinal,
+                         apply_mask(self.days[ordinal], mask, available))
+
+    def event_days(self, first):
+        """
+        Return a sorted list of the day indices, counted from the date with
+        ordinal first, of the MAX_DAYS days with any availability.
+        """
+        if any(self.weekly):
+            return [d for d in range(MAX_DAYS) if self.row(first + d)]
+
+        return sorted(ordinal - first for ordinal in self.days
+                      if 0 <= ordinal - first < MAX_DAYS)
+
+
 class Schedule:
     """
     A class to represent a user's availabilities, for up to 60 days from
     the event's creation, or up to the event deadline.
 
+    Availability is kept in two layers, resolved when read: a weekly
+    template repeated every 7 days, and dated changes made for single days.
+    On day d the user is available in the intervals of weekly[d % 7] not
+    cleared[d], and in the intervals of the dated row of d. The dated row
+    never shares bits with the template, and cleared[d] only has bits of
+    the template.
+
+    While the schedule belongs to an event, it can be laid over the user's
+    calendar, which is then added to the template as a base. Intervals
+    edited for the event are pinned, as dated bits if available or cleared
+    bits if not, so that later calendar changes do not reach them. Then the
+    dated row may share bits with the base, and cleared[d] may have any bits.
+
     Attributes
     ----------
     username : str
         username of schedule owner
-    times : MAX_DAYS x INTERVALS 2D list of int
-        30 minute time intervals representing the user's availabilities.
-        E.g. times[3][14] = True represents that the user is available
-        between 7.00 and 7.30 am.
+    weekly : (int)
+        tuple of 7 packed rows, where weekly[w] is repeated on every day d
+        with d % 7 == w. Shares EMPTY_WEEK until first set.
+    cleared : {int : int}
+        dict of day-packed row pairs of intervals of the weekly template
+        the user is unavailable in on that day. Shares the read only
+        EMPTY_CLEARED until first set.
+    days : {int : int}
+        dict of day-packed dated row pairs of the days with dated
+        availability. Bit t of days[d] is set if the user is available in
+        the t-th 30 minute interval of day d. Days missing from days take
+        no memory.
+    rows : [int]
+        (read only) list of MAX_DAYS resolved packed rows, one per day,
+        e.g. rows[3] >> 14 & 1 represents that the user is available
+        between 7.00 and 7.30 am on day 3
+    times : Times
+        MAX_DAYS x INTERVALS 2D list-like view of rows,
+        e.g. times[3][14] == True
+    event : Event or None
+        event whose member counts and version are kept up to date
+        with every change to rows
+    calendar : Calendar or None
+        calendar of the user which the schedule is laid over, as a base,
+        while it belongs to an event
+    """
+    __slots__ = ("username", "weekly", "cleared", "days", "event",
+                 "calendar")
+
+    def __init__(self, username, event=None):
+        self.username = username
+        self.weekly = EMPTY_WEEK
+        self.cleared = EMPTY_CLEARED
+        self.days = {}
+        self.event = event
+        self.calendar = None
+
+    @property
+    def times(self):
+        return Times(self)
+
+    @property
+    def rows(self):
+        return [self.row(d) for d in range(MAX_DAYS)]
+
+    def row(self, day):
+        """
+        Return the packed row of the given day.
+        """
+        row = self.dated_row(day)
+        template = self.weekly[day % 7] | self.base_row(day)
+        if template:
+            row |= template & ~self.cleared.get(day, 0)
+        return row
+
+    def base_row(self, day):
+        """
+        Return the packed row of the user's calendar on the given day.
+        """
+        if self.calendar is None or self.event is None:
+            return 0
+        return self.calendar.row(self.event.first_day + day)
+
+    def base_days(self):
+        """
+        Return a sorted list of the days the user's calendar has any
+        availability on.
+        """
+        if self.calendar is None or self.event is None:
+            return []
+        return self.calendar.event_days(self.event.first_day)
+
+    def set_calendar(self, calendar):
+        """
+        Lay the schedule over calendar, a Calendar or None, updating the
+        event.
+        """
+        if calendar is self.calendar:
+            return
+
+        days = set(self.base_days())
+        if calendar is not None and self.event is not None:
+            days.update(calendar.event_days(self.event.first_day))
+        days = sorted(days)
+        old_rows = [self.row(d) for d in days]
+        self.calendar = calendar
+        for d, old_row in zip(days, old_rows):
+            if old_row != self.row(d):
+                self.changed(d, old_row)
+
+    def store_row(self, day, row):
+        template = self.weekly[day % 7] | self.base_row(day)
+        if template:
+            self.set_cleared(day, template & ~row)
+            row &= ~template
+        self.store_dated(day, row)
+
+    def dated_row(self, day):
+        """
+        Return the packed dated row of the given day.
+        """
+        return self.days.get(day, 0)
+
+    def store_dated(self, day, row):
+        if row:
+            self.days[day] = row
+        else:
+            self.days.pop(day, None)
+
+    def dated_days(self):
+        """
+        Return a sorted list of the days with dated availability.
+        """
+        return sorted(self.days)
+
+    def set_cleared(self, day, row):
+        if row:
+            if not self.cleared:
+                self.cleared = {}
+            self.cleared[day] = row
+        elif day in self.cleared:
+            del self.cleared[day]
+
+    def override_days(self):
+        """
+        Return a sorted list of the days whose rows may differ from the
+        weekly template: the days with dated changes, cleared intervals or
+        calendar availability.
+        """
+        days = set(self.dated_days())
+        days.update(self.cleared)
+        days.update(self.base_days())
+        return sorted(days)
+
+    def touched_days(self):
+        """
+        Return a sorted list of the days with any availability.
+        """
+        days = set(self.dated_days())
+        days.update(self.base_days())
+        for w, template in enumerate(self.weekly):
+            if template:
+                days.update(range(w, MAX_DAYS, 7))
+        return sorted(days)
+
+    def set_row(self, day, row):
+        """
+        Replace the packed row of the given day.
+        """
+        old_row = self.row(day)
+        if old_row != row:
+            self.store_row(day, row)
+            self.changed(day, old_row)
+
+    def changed(self, day, old_row, old_template=None):
+        """
+        Update the event after the given day changed from old_row, and its
+        weekly template row from old_template if given. The event counts
+        the template once per weekday, so only the difference of the day
+        from its template is counted for the day.
+        """
+        if self.event is not None:
+            deltas = self.event.day_deltas(day)
+            update_counts(deltas, old_row, self.row(day))
+            if old_template is not None:
+                update_counts(deltas, self.weekly[day % 7], old_template)
+            self.event.version += 1
+
+    def set_weekly(self, weekday, mask, available):
+        """
+        Set availability for the intervals whose bits are set in mask, on
+        every day d with d % 7 == weekday, replacing earlier edits of those
+        intervals. Only the template and the days overriding it are written,
+        and only the event's counts of the template and of those days are
+        updated, however many weeks there are. Unavailable edits are pinned
+        on every day if the schedule is laid over a calendar.
+        """
+        old_template = self.weekly[weekday]
+        old_rows = None
+        if self.event is not None:
+            old_rows = {d: self.row(d) for d in self.override_days()
+                        if d % 7 == weekday}
+
+        weekly = list(self.weekly)
+        weekly[weekday] = apply_mask(weekly[weekday], mask, available)
+        self.weekly = tuple(weekly)
+        for d in self.dated_days():
+            if d % 7 == weekday and self.dated_row(d) & mask:
+                self.store_dated(d, self.dated_row(d) & ~mask)
+        for d in [d for d in self.cleared if d % 7 == weekday]:
+            self.set_cleared(d, self.cleared[d] & ~mask)
+        if not available and self.calendar is not None:
+            for d in range(weekday, MAX_DAYS, 7):
+                self.set_cleared(d, self.cleared.get(d, 0) | mask)
+
+        if old_rows is None:
+            return
+        template = self.weekly[weekday]
+        if template != old_template:
+            self.event.change_weekly(weekday, old_template, template)
+        for d in self.override_days():
+            if d % 7 == weekday:
+                # Days not overriding the template before had its rows
+                old_rows.setdefault(d, old_template)
+        for d, old_row in old_rows.items():
+            if old_row != self.row(d) or template != old_template:
+                self.changed(d, old_row, old_template)
+
+    def set_intervals(self, start, end, available):
+        """
+        Set availability for the intervals from start up to (not including)
+        end, where both are interval indices counted from the start of day 0.
+        """
+        for d, mask in day_masks(start, end):
+            self.set_masked(d, mask, available)
+
+    def set_day_intervals(self, day, start, end, available):
+        """
+        Set availability for intervals start up to (not including) end of
+        the given day.
+        """
+        self.set_masked(day, interval_mask(start, end), available)
+
+    def set_masked(self, day, mask, available):
+        """
+        Set availability for the intervals of the given day whose bits
+        are set in mask.
+        """
+        self.set_row(day, apply_mask(self.row(day), mask, available))
+        self.pin(day, mask)
+
+    def pin(self, day, mask):
+        """
+        Keep the intervals of the given day whose bits are set in mask as
+        they are when the user's calendar changes. Does nothing if the
+        schedule is not laid over a calendar.
+        """
+        if self.calendar is None:
+            return
+
+        row = self.row(day)
+        self.store_dated(day, self.dated_row(day) | row & mask)
+        self.set_cleared(day, self.cleared.get(day, 0) & ~mask | mask & ~row)
+
+    def set_layers(self, weekly, dated, cleared):
+        """
+        Replace the weekly template and, given as lists of MAX_DAYS packed
+        rows, the dated and cleared rows, updating the event.
+        """
+        old_rows = self.rows
+        old_weekly = self.weekly
+        self.weekly = tuple(weekly) if any(weekly) else EMPTY_WEEK
+        self.cleared = EMPTY_CLEARED
+        for d in range(MAX_DAYS):
+            self.store_dated(d, dated[d])
+            self.set_cleared(d, cleared[d])
+
+        if self.event is None:
+            return
+        for w, old_template in enumerate(old_weekly):
+            if old_template != self.weekly[w]:
+                self.event.change_weekly(w, old_template, self.weekly[w])
+        for d, old_row in enumerate(old_rows):
+            old_template = old_weekly[d % 7]
+            if old_row != self.row(d) or old_template != self.weekly[d % 7]:
+                self.changed(d, old_row, old_template)
+
+    def runs(self):
+        """
+        Return a list of (start, end) pairs of interval indices counted from
+        the start of day 0, one for each maximal block of dated availability.
+        """
+        runs = []
+        for d in self.dated_days():
+            row = self.dated_row(d)
+            offset = d * INTERVALS
+            while row:
+                start, end = first_run(row)
+                if runs and runs[-1][1] == offset + start:
+                    runs[-1] = (runs[-1][0], offset + end)
+                else:
+                    runs.append((offset + start, offset + end))
+                row &= ~interval_mask(start, end)
+
+        return runs
+
+    def run_count(self):
+        """
+        Return the number of maximal blocks of dated availability.
+        """
+        return len(self.runs())
+
+
+class SparseSchedule(Schedule):
     """
-    def __init__(self, username):
+    A Schedule storing only the blocks of time a user has dated
+    availability, which takes less memory than Schedule when there are
+    few blocks.
+
+    Attributes
+    ----------
+    bounds : [int]
+        sorted list of interval indices counted from the start of day 0,
+        where bounds[2i] up to (not including) bounds[2i + 1] is the i-th
+        block of dated availability. Blocks never touch or overlap.
+    rows : [int]
+        (read only) list of MAX_DAYS packed rows, as in Schedule
+    """
+    __slots__ = ("bounds",)
+
+    def __init__(self, username, event=None):
         self.username = username
-        self.times = [[False for _ in range(INTERVALS)]
-                      for _ in range(MAX_DAYS)]
+        self.weekly = EMPTY_WEEK
+        self.cleared = EMPTY_CLEARED
+        self.bounds = []
+        self.event = event
+        self.calendar = None
+
+    def dated_row(self, day):
+        start = day * INTERVALS
+        end = start + INTERVALS
+        bounds = self.bounds
+        i = bisect_right(bounds, start)
+        row = 0
+        if i % 2:
+            i -= 1
+
+        while i < len(bounds) and bounds[i] < end:
+            row |= interval_mask(max(bounds[i], start) - start,
+                                 min(bounds[i + 1], end) - start)
+            i += 2
+
+        return row
+
+    def store_dated(self, day, row):
+        start = day * INTERVALS
+        self.set_run(start, start + INTERVALS, False)
+        while row:
+            first, last = first_run(row)
+            self.set_run(start + first, start + last, True)
+            row &= ~interval_mask(first, last)
+
+    def dated_days(self):
+        days = []
+        for start, end in self.runs():
+            first = start // INTERVALS
+            if days and days[-1] == first:
+                first += 1
+            days.extend(range(first, (end - 1) // INTERVALS + 1))
+
+        return days
+
+    def set_intervals(self, start, end, available):
+        if any(self.weekly) or self.calendar is not None:
+            super().set_intervals(start, end, available)
+            return
+
+        end = min(end, MAX_DAYS * INTERVALS)
+        if start >= end:
+            return
+
+        if self.event is None:
+            self.set_run(start, end, available)
+            return
+
+        days = range(start // INTERVALS, (end - 1) // INTERVALS + 1)
+        old_rows = [self.row(d) for d in days]
+        self.set_run(start, end, available)
+        for d, old_row in zip(days, old_rows):
+            if old_row != self.row(d):
+                self.changed(d, old_row)
+
+    def set_run(self, start, end, available):
+        """
+        Set dated availability for the intervals from start up to (not
+        including) end, merging neighbouring blocks, without updating
+        the event.
+        """
+        i = bisect_left(self.bounds, start)
+        j = bisect_right(self.bounds, end)
+        new_bounds = []
+        if (i % 2 == 0) == available:
+            new_bounds.append(start)
+        if (j % 2 == 0) == available:
+            new_bounds.append(end)
+        self.bounds[i:j] = new_bounds
+
+    def runs(self):
+        return list(zip(self.bounds[::2], self.bounds[1::2]))
+
+    def run_count(self):
+        return len(self.bounds) // 2
+
+
+def convert_schedule(schedule, cls):
+    """
+    Return a copy of schedule stored as a cls (Schedule or SparseSchedule),
+    belonging to the same event.
+    """
+    copy = cls(schedule.username)
+    copy.weekly = schedule.weekly
+    if schedule.cleared:
+        copy.cleared = dict(schedule.cleared)
+    for d in schedule.dated_days():
+        copy.store_dated(d, schedule.dated_row(d))
+    copy.event = schedule.event
+    copy.calendar = schedule.calendar
+    return copy
+
+
+class RWLock:
+    """
+    A lock which can be held by many readers or by one writer at a time.
+    Waiting writers go before new readers. It is not reentrant.
+
+    Attributes
+    ----------
+    condition : threading.Condition
+        condition guarding the counts below
+    readers : int
+        number of readers holding the lock
+    writer : bool
+        True if a writer holds the lock
+    waiting_writers : int
+        number of writers waiting for the lock
+    """
+    __slots__ = ("condition", "readers", "writer", "waiting_writers")
+
+    def __init__(self):
+        self.condition = Condition(Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class MemberSet(MutableSet):
+    """
+    A set-like view of the usernames of an Event's members. Removing a
+    member also removes their schedule.
+
+    Attributes
+    ----------
+    event : Event
+        event being viewed
+    """
+    __slots__ = ("event",)
+
+    def __init__(self, event):
+        self.event = event
+
+    def __contains__(self, username):
+        return username in self.event.members
+
+    def __iter__(self):
+        return iter(self.event.members)
+
+    def __len__(self):
+        return len(self.event.members)
+
+    def add(self, username):
+        self.event.members.setdefault(username, None)
+
+    def discard(self, username):
+        if self.event.members.get(username) is not None:
+            self.event.remove_schedule(username)
+        self.event.members.pop(username, None)
+
+    def __repr__(self):
+        return repr(set(self))
+
+
+class ScheduleMap(MutableMapping):
+    """
+    A dict-like view of the Schedules of an Event's members who have one.
+    Adding a schedule makes its owner a member, and deleting one keeps
+    them a member. Both keep the event's counts up to date.
+
+    Attributes
+    ----------
+    event : Event
+        event being viewed
+    """
+    __slots__ = ("event",)
+
+    def __init__(self, event):
+        self.event = event
+
+    def __getitem__(self, username):
+        schedule = self.event.members.get(username)
+        if schedule is None:
+            raise KeyError(username)
+        return schedule
+
+    def __setitem__(self, username, schedule):
+        self.event.set_schedule(username, schedule)
+
+    def __delitem__(self, username):
+        self[username]
+        self.event.remove_schedule(username)
+
+    def __iter__(self):
+        return (username for username, schedule in self.event.members.items()
+                if schedule is not None)
+
+    def __len__(self):
+        return sum(schedule is not None
+                   for schedule in self.event.members.values())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Counts:
+    """
+    A view of an Event's member counts, indexable like a MAX_DAYS x
+    INTERVALS 2D list of int, resolving each day when it is read.
+
+    Attributes
+    ----------
+    event : Event
+        event being viewed
+    """
+    __slots__ = ("event",)
+
+    def __init__(self, event):
+        self.event = event
+
+    def __len__(self):
+        return MAX_DAYS
+
+    def __getitem__(self, d):
+        if isinstance(d, slice):
+            return [self[i] for i in range(*d.indices(MAX_DAYS))]
+        if d < 0:
+            d += MAX_DAYS
+        if not 0 <= d < MAX_DAYS:
+            raise IndexError("Day index out of range")
+        return self.event.day_counts(d)
+
+    def __iter__(self):
+        return (self.event.day_counts(d) for d in range(MAX_DAYS))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class Event:
@@ -52,11 +890,29 @@ class Event:
         name of the event
     admin_username : str
         username of event creator
-    member_usernames : set of str
-        set of usernames of all event members
-    availabilities : {str : Schedule}
-        dict of username-Schedule pairs representing
+    members : {str : Schedule}
+        dict of username-Schedule pairs of all event members, where the
+        Schedule is None for members without one
+    member_usernames : MemberSet
+        set-like view of the usernames of all event members
+    availabilities : ScheduleMap
+        dict-like view of username-Schedule pairs representing
         each members' available intervals of time
+    counts : Counts
+        (read only) MAX_DAYS x INTERVALS 2D list-like view where
+        counts[d][t] is the number of members available in the t-th
+        30 minute interval of day d
+    weekly_counts : [[int]]
+        list of 7 lists of member counts of the members' weekly templates,
+        where weekly_counts[w] is counted on every day d with d % 7 == w.
+        Weekdays without templates share EMPTY_COUNTS.
+    deltas : {int : [int]}
+        dict of day-counts pairs of the differences of members' rows from
+        their templates, updated on every schedule change, so counts[d]
+        is weekly_counts[d % 7] plus deltas[d]. Days missing from deltas
+        take no memory.
+    version : int
+        incremented whenever the event's best times may have changed
     event_length : int
         length of event in hours
     event_deadline : datetime.date
@@ -67,13 +923,23 @@ class Event:
         desired earliest starting time of event
     max_time : datetime.time
         desired latest ending time of event
+    lock : RWLock
+        lock held by entry points reading or changing the event
     """
+    __slots__ = ("lock", "event_id", "title", "admin_username", "members",
+                 "weekly_counts", "deltas", "version", "event_length", "event_deadline",
+                 "create_time", "min_time", "max_time")
+
     def __init__(self, event_id, title, admin_username):
+        self.lock = RWLock()
         self.event_id = event_id
         self.title = title
         self.admin_username = admin_username
-        self.member_usernames = {admin_username}
-        self.availabilities = {admin_username: Schedule(admin_username)}
+        self.members = {}
+        self.weekly_counts = [EMPTY_COUNTS] * 7
+        self.deltas = {}
+        self.version = 0
+        self.add_schedule(admin_username)
         self.event_length = DEFAULT_LENGTH
         self.event_deadline = None
         self.create_time = datetime.now()
@@ -82,6 +948,236 @@ class Event:
         self.min_time = time(8)
         self.max_time = time(22)
 
+    @property
+    def member_usernames(self):
+        return MemberSet(self)
+
+    @property
+    def counts(self):
+        return Counts(self)
+
+    @property
+    def availabilities(self):
+        return ScheduleMap(self)
+
+    @property
+    def first_day(self):
+        """
+        Date ordinal of day 0 of the event's schedules.
+        """
+        return self.create_time.toordinal()
+
+    def add_schedule(self, username, calendar=None):
+        """
+        Give a member an empty schedule, if they do not have one yet, and
+        lay it over calendar if one is given.
+        """
+        if self.members.get(username) is None:
+            self.members[username] = SparseSchedule(username, self)
+            self.version += 1
+        if calendar is not None:
+            self.members[username].set_calendar(calendar)
+
+    def schedule(self, username, calendar=None):
+        """
+        Return a member's schedule, giving them an empty one first if they
+        do not have one yet. Members are added without a schedule, so one
+        is only made once they edit their availability or their calendar.
+        """
+        self.add_schedule(username, calendar)
+        return self.members[username]
+
+    def add_members(self, usernames):
+        """
+        Add users as members without schedules, returning a list of those
+        who were not members already.
+        """
+        added = []
+        for username in usernames:
+            if username not in self.members:
+                self.members[username] = None
+                added.append(username)
+        return added
+
+    def remove_members(self, usernames):
+        """
+        Remove members, and their availabilities from counts, bumping
+        version once for all of them.
+        """
+        changed = False
+        for username in usernames:
+            schedule = self.members.pop(username)
+            if schedule is not None:
+                self.subtract_schedule(schedule)
+                changed = True
+
+        if changed:
+            self.version += 1
+
+    def day_counts(self, day):
+        """
+        Return the member counts of the given day, resolved from the weekly
+        counts and the day's deltas. The list returned must not be changed.
+        """
+        counts = self.weekly_counts[day % 7]
+        deltas = self.deltas.get(day)
+        if deltas is None:
+            return counts
+        return list(map(add, counts, deltas))
+
+    def day_deltas(self, day):
+        """
+        Return the differences of members' rows of the given day from their
+        templates, as member counts which can be changed.
+        """
+        deltas = self.deltas.get(day)
+        if deltas is None:
+            deltas = self.deltas[day] = [0] * INTERVALS
+        return deltas
+
+    def change_weekly(self, weekday, old_row, new_row):
+        """
+        Update the weekly counts for a member whose template of the given
+        weekday changed from old_row to new_row.
+        """
+        counts = list(self.weekly_counts[weekday])
+        update_counts(counts, old_row, new_row)
+        self.weekly_counts[weekday] = counts if any(counts) else EMPTY_COUNTS
+        self.version += 1
+
+    def choose_storage(self, username):
+        """
+        Store a member's schedule as a SparseSchedule or a Schedule,
+        whichever suits its number of blocks of availability.
+        """
+        schedule = self.members[username]
+        runs = schedule.run_count()
+        if isinstance(schedule, SparseSchedule):
+            if runs > DENSE_MIN_RUNS:
+                schedule = convert_schedule(schedule, Schedule)
+        elif runs <= SPARSE_MAX_RUNS:
+            schedule = convert_schedule(schedule, SparseSchedule)
+
+        self.members[username] = schedule
+
+    def set_schedule(self, username, schedule):
+        """
+        Give a member schedule, replacing any schedule they had, and update
+        counts. Users who are not members become members.
+        """
+        old_schedule = self.members.get(username)
+        if old_schedule is not None:
+            self.subtract_schedule(old_schedule)
+        self.members[username] = schedule
+        self.count_schedule(schedule)
+        self.version += 1
+
+    def remove_schedule(self, username):
+        """
+        Remove a member's schedule, and their availabilities from counts.
+        They stay a member.
+        """
+        schedule = self.members[username]
+        self.members[username] = None
+        self.subtract_schedule(schedule)
+        self.version += 1
+
+    def count_schedule(self, schedule):
+        """
+        Attach a schedule joining the event, and add its availabilities to
+        counts.
+        """
+        schedule.event = self
+        for w, template in enumerate(schedule.weekly):
+            if template:
+                self.change_weekly(w, 0, template)
+        for d in schedule.override_days():
+            template = schedule.weekly[d % 7]
+            if schedule.row(d) != template:
+                update_counts(self.day_deltas(d), template, schedule.row(d))
+
+    def subtract_schedule(self, schedule):
+        """
+        Remove the availabilities of a schedule leaving the event from
+        counts, and detach it from the event.
+        """
+        for d in schedule.override_days():
+            template = schedule.weekly[d % 7]
+            if schedule.row(d) != template:
+                update_counts(self.day_deltas(d), schedule.row(d), template)
+        for w, template in enumerate(schedule.weekly):
+            if template:
+                self.change_weekly(w, template, 0)
+        schedule.event = None
+
+
+class EventIndex:
+    """
+    The IDs of the events a user is a member of, in the order they joined.
+    Each event is kept with its join sequence number, which grows with
+    every join, so the order of the dict is also the order of the numbers.
+    Adding and removing events take O(1) time. The index is changed under
+    the locks of different events, so it has a lock of its own.
+
+    Attributes
+    ----------
+    seqs : {int : int}
+        dict of event_id-join sequence number pairs, in the order joined
+    next_seq : int
+        join sequence number of the next event added
+    lock : threading.Lock
+        lock held while using seqs
+    """
+    __slots__ = ("seqs", "next_seq", "lock")
+
+    def __init__(self, event_ids=()):
+        self.seqs = {}
+        self.next_seq = 0
+        self.lock = Lock()
+        for event_id in event_ids:
+            self.add(event_id)
+
+    def __contains__(self, event_id):
+        return event_id in self.seqs
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.seqs))
+
+    def __repr__(self):
+        return "EventIndex(" + repr(list(self)) + ")"
+
+    def add(self, event_id):
+        """
+        Add an event as the latest joined, if it is not in the index yet.
+        """
+        with self.lock:
+            if event_id not in self.seqs:
+                self.seqs[event_id] = self.next_seq
+                self.next_seq += 1
+
+    def remove(self, event_id):
+        """
+        Remove an event, if it is in the index.
+        """
+        with self.lock:
+            self.seqs.pop(event_id, None)
+
+    def page(self, cursor, limit):
+        """
+        Return a list of (event_id, join sequence number) pairs of up to
+        limit events joined after the one numbered cursor, which may since
+        have been removed, or from the first event if cursor is None.
+        """
+        with self.lock:
+            start = 0
+            if cursor is not None:
+                start = bisect_right(list(self.seqs.values()), cursor)
+            return list(islice(self.seqs.items(), start, start + limit))
+
 
 class User:
     """
@@ -99,20 +1195,119 @@ class User:
         user's first name
     last_name : str
         user's last name
-    joined_event_ids : [int]
-        list of ids of events that the user is a member of,
+    joined_event_ids : EventIndex
+        ids of events that the user is a member of,
         most recently joined event is last
     logged_in : bool
         True if logged in, False otherwise
+    calendar : Calendar or None
+        personal calendar shared by all of the user's events, or None
+        until it is first edited
     """
+    __slots__ = ("username", "hash_pwd", "email", "first_name", "last_name",
+                 "joined_event_ids", "logged_in", "calendar")
+
     def __init__(self, username, hash_pwd, email, first_name, last_name):
         self.username = username
         self.hash_pwd = hash_pwd
         self.email = email
         self.first_name = first_name
         self.last_name = last_name
-        self.joined_event_ids = []
+        self.joined_event_ids = EventIndex()
         self.logged_in = False
+        self.calendar = None
+
+    def add_event(self, event_id):
+        """
+        Record that the user joined an event, if they are not already in it.
+        """
+        self.joined_event_ids.add(event_id)
+
+    def remove_event(self, event_id):
+        """
+        Record that the user is no longer in an event.
+        """
+        self.joined_event_ids.remove(event_id)
+
+
+class LazyDict(dict):
+    """
+    A dict which looks up missing keys with loader, keeping any value found.
+
+    Attributes
+    ----------
+    loader : function
+        called with a missing key, returns its value or None if there is none
+    lock : threading.Lock
+        lock held while loading, so each key is only loaded once
+    """
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+        self.lock = Lock()
+
+    def __missing__(self, key):
+        with self.lock:
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+
+            value = self.loader(key)
+            if value is None:
+                raise KeyError(key)
+
+            self[key] = value
+            return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class Storage:
+    """
+    A persistence backend for Data which stores nothing, so that all data
+    is only kept in memory. Other backends override these methods.
+    Writes made by one entry point are made permanent by commit(), which
+    only covers the writes of the calling thread, as entry points on
+    different events run at the same time.
+    """
+    def load_user(self, username):
+        return None
+
+    def load_email(self, email):
+        return None
+
+    def load_event(self, event_id):
+        return None
+
+    def load_next_event_id(self):
+        return 1
+
+    def save_user(self, user):
+        pass
+
+    def delete_user(self, username):
+        pass
+
+    def save_event(self, event):
+        pass
+
+    def save_schedule(self, event_id, schedule):
+        pass
+
+    def save_calendar(self, username, calendar):
+        pass
+
+    def delete_member(self, event_id, username):
+        pass
+
+    def commit(self):
+        pass
 
 
 class Data:
@@ -127,12 +1322,100 @@ class Data:
         dict of all event_id-Event pairs
     reset_codes : {int : str}
         dict of all password reset codes-username pairs
+    emails : {str : str}
+        dict of all normalised email-username pairs
+    storage : Storage
+        backend that users and events are loaded from and saved to
+    users_lock : threading.Lock
+        lock held while adding, removing or changing the email of users
+    ids_lock : threading.Lock
+        lock held while handing out event IDs
+    calendars_lock : threading.Lock
+        lock held while a calendar changes, and while users join events
+        so that their schedules are laid over their calendars. Taken after
+        any event locks.
     """
     def __init__(self):
         self.users = {}
         self.events = {}
         self.reset_codes = {}
+        self.emails = {}
         self.event_next_id = 1
+        self.users_lock = Lock()
+        self.ids_lock = Lock()
+        self.calendars_lock = Lock()
+        self.storage = Storage()
+
+    def next_event_id(self):
+        """
+        Return a new unique event ID. Safe to call from multiple threads.
+        """
+        with self.ids_lock:
+            event_id = self.event_next_id
+            self.event_next_id += 1
+            return event_id
+
+    def use_storage(self, storage):
+        """
+        Drop all data held in memory and use storage as the backend.
+        Users and events are then loaded from storage when first used.
+        """
+        self.storage = storage
+        self.users = LazyDict(storage.load_user)
+        self.events = LazyDict(storage.load_event)
+        self.emails = LazyDict(storage.load_email)
+        self.reset_codes = {}
+        self.event_next_id = storage.load_next_event_id()
+
+    def add_user(self, user):
+        """
+        Add a new user, raising InputError if their username or email
+        is already in use. Safe to call from multiple threads.
+        """
+        email = normalise_email(user.email)
+        with self.users_lock:
+            if user.username in self.users:
+                raise InputError("Username already in use")
+
+            if email in self.emails:
+                raise InputError("Email already in use")
+
+            self.emails[email] = user.username
+            self.users[user.username] = user
+
+    def change_email(self, username, new_email):
+        """
+        Change a user's email, raising InputError if it is already in use.
+        """
+        email = normalise_email(new_email)
+        with self.users_lock:
+            user = self.users[username]
+            if self.emails.get(email, username) != username:
+                raise InputError("Email already in use")
+
+            self.emails.pop(normalise_email(user.email), None)
+            self.emails[email] = username
+            user.email = new_email
+            self.storage.save_user(user)
+
+    def remove_user(self, username):
+        """
+        Remove a user and free their username and email. Their memberships
+        of events are left behind, so callers should remove them from their
+        events first.
+        """
+        with self.users_lock:
+            user = self.users[username]
+            del self.users[username]
+            self.emails.pop(normalise_email(user.email), None)
+            self.storage.delete_user(username)
+
+
+def normalise_email(email):
+    """
+    Return the form of email used to check that emails are unique.
+    """
+    return email.strip().casefold()
 
 
 data = Data()
@@ -4,10 +4,12 @@ A file containing functions related to admin actions in Events.
 
 
 from datetime import datetime, date
-from data import data, Event, Schedule
+from data import data, Event
 from error import AuthError, InputError
+from locks import writes_event
 from error_checks import (check_username, check_event_id, check_logged_in,
                           check_is_admin, check_is_member)
+from profiling import profiled
 
 
 MAX_TITLE = 100
@@ -16,6 +18,7 @@ MAX_EVENT = 14 * 24
 UNIQUE_ID = 1
 
 
+@profiled
 def create_event(username, title, members,
                  event_length=None, event_deadline=None):
     """
@@ -57,19 +60,25 @@ def create_event(username, title, members,
     if event_deadline and event_deadline < datetime.now().date():
         raise InputError("Event deadline is invalid")
 
-    new_event = Event(data.event_next_id, title, username)
-    data.event_next_id += 1
-
-    for u in members:
-        new_event.member_usernames.add(u)
-
+    new_event = Event(data.next_event_id(), title, username)
     new_event.event_length = event_length
     new_event.event_deadline = event_deadline
 
     data.events[new_event.event_id] = new_event
+    with data.calendars_lock:
+        user = data.users[username]
+        user.add_event(new_event.event_id)
+        new_event.add_schedule(username, user.calendar)
+    join_event(new_event, members)
+    data.storage.save_event(new_event)
+    data.storage.save_schedule(new_event.event_id,
+                               new_event.availabilities[username])
+    data.storage.commit()
     return new_event.event_id
 
 
+@profiled
+@writes_event
 def invite_user(admin_username, member_username, event_id):
     """
     Invite a user to an event.
@@ -91,17 +100,39 @@ def invite_user(admin_username, member_username, event_id):
                 member_username does not exist
                 admin_username does not exist
     """
-    check_username(admin_username)
-    check_event_id(event_id)
-    check_is_admin(admin_username, event_id)
-    check_logged_in(admin_username)
-    check_username(member_username)
+    add_to_event(admin_username, [member_username], event_id)
 
-    event = data.events.get(event_id)
-    event.member_usernames.add(member_username)
-    event.availabilities[member_username] = Schedule(member_username)
+
+@profiled
+@writes_event
+def invite_users(admin_username, member_usernames, event_id):
+    """
+    Invite many users to an event at once. Users who are already members
+    are left as they are. Members are given a schedule once they first
+    edit their availability.
+
+        Parameters:
+            admin_username (str): username of event admin
+            member_usernames ([str]): usernames of invitees
+            event_id (int): unique ID of event
+
+        Returns:
+            None
+
+        Exceptions:
+            AuthError if any of:
+                admin_username is not the event admin's username
+                admin_username is not logged in
+            InputError if any of:
+                event_id does not exist
+                a username in member_usernames does not exist
+                admin_username does not exist
+    """
+    add_to_event(admin_username, member_usernames, event_id)
 
 
+@profiled
+@writes_event
 def remove_user(admin_username, member_username, event_id):
     """
     Remove a user from an event
@@ -124,21 +155,38 @@ def remove_user(admin_username, member_username, event_id):
         Returns:
             None
     """
-    check_username(admin_username)
-    check_event_id(event_id)
-    check_is_admin(admin_username, event_id)
-    check_logged_in(admin_username)
-    check_username(member_username)
-    check_is_member(member_username, event_id)
+    remove_from_event(admin_username, [member_username], event_id)
 
-    if admin_username == member_username:
-        raise InputError("Cannot remove self")
 
-    event = data.events.get(event_id)
-    event.member_usernames.remove(member_username)
-    del event.availabilities[member_username]
+@profiled
+@writes_event
+def remove_users(admin_username, member_usernames, event_id):
+    """
+    Remove many users from an event at once.
 
+        Paramters:
+            admin_username (str): username of event admin
+            member_usernames ([str]): usernames of members being removed
+            event_id (int): unique ID of event
 
+        Exceptions:
+            InputError when any of:
+                admin_username does not exist
+                a username in member_usernames is not in the event
+                admin_username is in member_usernames
+                event_id does not exist
+            AuthError when any of:
+                admin_username is not the event admin
+                admin_username is not logged in
+
+        Returns:
+            None
+    """
+    remove_from_event(admin_username, member_usernames, event_id)
+
+
+@profiled
+@writes_event
 def edit_event_length(admin_username, new_length, event_id):
     """
     Edit an event's length.
@@ -171,8 +219,13 @@ def edit_event_length(admin_username, new_length, event_id):
 
     event = data.events.get(event_id)
     event.event_length = new_length
+    event.version += 1
+    data.storage.save_event(event)
+    data.storage.commit()
 
 
+@profiled
+@writes_event
 def edit_event_deadline(admin_username, new_date, event_id):
     """
     Edit an event's target deadline.
@@ -204,3 +257,76 @@ def edit_event_deadline(admin_username, new_date, event_id):
 
     event = data.events.get(event_id)
     event.event_deadline = new_date
+    event.version += 1
+    data.storage.save_event(event)
+    data.storage.commit()
+
+
+def join_event(event, usernames):
+    """
+    Add users to an event as members, recording the event in each new
+    member's joined events, and save the event's members. New members with
+    a calendar are given a schedule laid over it.
+    """
+    added = event.add_members(usernames)
+    with_calendars = []
+    with data.calendars_lock:
+        for username in added:
+            user = data.users[username]
+            user.add_event(event.event_id)
+            if user.calendar is not None:
+                event.add_schedule(username, user.calendar)
+                with_calendars.append(username)
+
+    if added:
+        data.storage.save_event(event)
+    for username in with_calendars:
+        data.storage.save_schedule(event.event_id,
+                                   event.availabilities[username])
+
+
+def add_to_event(admin_username, member_usernames, event_id):
+    """
+    Check and make the invitations of invite_user and invite_users, whose
+    caller holds the event's write lock.
+    """
+    check_username(admin_username)
+    check_event_id(event_id)
+    check_is_admin(admin_username, event_id)
+    check_logged_in(admin_username)
+    for username in member_usernames:
+        check_username(username)
+
+    join_event(data.events.get(event_id), member_usernames)
+    data.storage.commit()
+
+
+def remove_from_event(admin_username, member_usernames, event_id):
+    """
+    Check and make the removals of remove_user and remove_users, whose
+    caller holds the event's write lock.
+    """
+    check_username(admin_username)
+    check_event_id(event_id)
+    check_is_admin(admin_username, event_id)
+    check_logged_in(admin_username)
+    for username in member_usernames:
+        check_username(username)
+        check_is_member(username, event_id)
+
+    if admin_username in member_usernames:
+        raise InputError("Cannot remove self")
+
+    drop_members(data.events.get(event_id), set(member_usernames))
+    data.storage.commit()
+
+
+def drop_members(event, usernames):
+    """
+    Remove members from an event, removing the event from each one's
+    joined events, and delete them from storage.
+    """
+    event.remove_members(usernames)
+    for username in usernames:
+        data.users[username].remove_event(event.event_id)
+        data.storage.delete_member(event.event_id, username)
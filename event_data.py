@@ -4,16 +4,111 @@ showing event members, etc
 """
 
 
-from datetime import datetime, timedelta
-from data import data
+import os
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from heapq import heappush, heapreplace
+from itertools import accumulate, islice
+from threading import Lock
+from data import (data, SparseSchedule, EMPTY_COUNTS, MAX_DAYS, INTERVALS,
+                  DEFAULT_LENGTH, FULL_DAY, interval_mask)
+from error import InputError
+from locks import reads_event
 from error_checks import (check_event_id, check_is_member, 
                           check_logged_in, check_username)
+from profiling import profiled
+
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 CUTOFF = 3
 SEARCH_DELAY = 2
+# Member count from which find_intersection uses numpy, if installed
+NUMPY_MIN_MEMBERS = 8
+# Number of events whose best times are cached
+CACHE_SIZE = 1024
+# Number of events sent to a worker process at a time
+RECOMPUTE_CHUNK = 256
+# Number of chunks per worker process submitted at a time
+RECOMPUTE_WINDOW = 2
+# Default number of events per page of list_user_events
+PAGE_SIZE = 50
+
+
+# The settings of an event used by find_best_intervals
+EventSettings = namedtuple("EventSettings", ["create_time", "event_length",
+                                             "event_deadline", "min_time",
+                                             "max_time"])
+
+
+class ResultCache:
+    """
+    A least recently used cache holding one result per event.
+
+    Attributes
+    ----------
+    size : int
+        maximum number of events cached
+    entries : OrderedDict {int : (tuple, object)}
+        event_id-(key, result) pairs, least recently used first
+    hits : int
+        number of lookups that found a result
+    misses : int
+        number of lookups that did not find a result
+    lock : threading.Lock
+        lock held while using entries
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, event_id, key):
+        """
+        Return the cached result of event_id if it was stored with key,
+        otherwise None.
+        """
+        with self.lock:
+            entry = self.entries.get(event_id)
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(event_id)
+            return entry[1]
+
+    def put(self, event_id, key, result):
+        """
+        Store the result of event_id under key, evicting the least
+        recently used event if the cache is full.
+        """
+        with self.lock:
+            self.entries[event_id] = (key, result)
+            self.entries.move_to_end(event_id)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
 
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
 
+
+best_times_cache = ResultCache(CACHE_SIZE)
+
+
+@profiled
+@reads_event
 def event_details(username, event_id):
     """
     Give details about the given event, specifically a list of event members,
@@ -44,7 +139,7 @@ def event_details(username, event_id):
     check_logged_in(username)
     event = data.events.get(event_id)
     details = {
-        "members": event.member_usernames,
+        "members": set(event.member_usernames),
         "admin":  event.admin_username,
         "create_time": event.create_time,
         "length": event.event_length,
@@ -54,9 +149,68 @@ def event_details(username, event_id):
     return details
 
 
-def find_best_times(username, event_id):
+@profiled
+def list_user_events(username, cursor=None, limit=PAGE_SIZE):
     """
-    Find the best three closest time intervals for meeting,
+    List the events a user is a member of, in the order they joined, one
+    page at a time. Only the events on the page are read. A cursor is the
+    join sequence number of the last event on its page, so it stays valid
+    if the user leaves that event.
+
+        Parameters:
+            username (str): username of user
+            cursor (int): cursor returned with the previous page, or None
+                          for the first page
+            limit (int): greatest number of events on the page
+
+        Exceptions:
+            InputError when any of:
+                username does not exist
+                cursor is not a cursor given for the user's events
+                limit is less than 1
+            AuthError when:
+                username is not logged in
+
+        Returns:
+            events ([dict]): list of event summaries, each with the
+                             event_id, title, admin, create_time, length
+                             and deadline of an event
+            cursor (int): cursor of the next page, or None if this is the
+                          last page
+    """
+    check_username(username)
+    check_logged_in(username)
+    if limit < 1:
+        raise InputError("Invalid page limit")
+
+    index = data.users[username].joined_event_ids
+    if cursor is not None and not 0 <= cursor < index.next_seq:
+        raise InputError("Invalid cursor")
+
+    page = index.page(cursor, limit + 1)
+    summaries = []
+    for event_id, _ in page[:limit]:
+        event = data.events.get(event_id)
+        with event.lock.read():
+            summaries.append({
+                "event_id": event_id,
+                "title": event.title,
+                "admin": event.admin_username,
+                "create_time": event.create_time,
+                "length": event.event_length,
+                "deadline": event.event_deadline,
+            })
+
+    next_cursor = page[limit - 1][1] if len(page) > limit else None
+    return summaries, next_cursor
+
+
+@profiled
+@reads_event
+def find_best_times(username, event_id, cutoff=CUTOFF):
+    """
+    Find the best 'cutoff' (by default three) closest time intervals
+    for meeting,
     where 'best' is defined to be the date with the most
     members available. 
     If the event length is set, the start of the best time intervals 
@@ -71,6 +225,7 @@ def find_best_times(username, event_id):
         Parameters:
             username (str): username of user
             event_id (int): unique ID of event
+            cutoff (int): number of times to find
 
         Exceptions:
             InputError when any of:
@@ -90,69 +245,487 @@ def find_best_times(username, event_id):
     check_logged_in(username)
 
     event = data.events.get(event_id)
-    schedules = [s.times for s in list(event.availabilities.values())]
-    intersection = find_intersection(schedules)
-    print(event.admin_username)
-    for u in event.availabilities:
-        print(u, event.availabilities[u].times[:9])
-    #print(intersection)
-    best_intervals = find_best_intervals(intersection, CUTOFF, event)
-    return best_intervals
+    search_start = get_search_start()
+    # The event itself is part of the key, so results of an event since
+    # reloaded from storage, whose version starts again, are not used
+    key = (event, event.version, search_start, cutoff)
+    best_intervals = best_times_cache.get(event_id, key)
+    if best_intervals is None:
+        best_intervals = find_best_intervals(event.counts, cutoff, event,
+                                             search_start)
+        best_times_cache.put(event_id, key, best_intervals)
+
+    return list(best_intervals)
+
+
+@profiled
+@reads_event
+def iter_best_times(username, event_id):
+    """
+    Iterate over every start time of the event that find_best_times would
+    consider, from best to worst, with the same order of tied times. The
+    scores are found when called, while the times are grouped by score and
+    each group is only taken out as it is reached, so taking the first few
+    times is cheaper than ranking them all.
+
+        Parameters:
+            username (str): username of user
+            event_id (int): unique ID of event
+
+        Exceptions:
+            InputError when any of:
+                username does not exist
+                event_id does not exist
+                username is not a member of event
+            AuthError when any of:
+                username is not logged in
+
+        Returns:
+            times (generator of datetime.datetime): the start times, from
+            best to worst
+    """
+    check_username(username)
+    check_event_id(event_id)
+    check_is_member(username, event_id)
+    check_logged_in(username)
+
+    event = data.events.get(event_id)
+    length, days = candidate_days(event, get_search_start())
+    # Times with the same score are kept from earliest to latest
+    buckets = {}
+    for d, starts in days:
+        prefix = list(accumulate(event.day_counts(d), initial=0))
+        for t in starts:
+            score = prefix[t + length] - prefix[t]
+            bucket = buckets.get(score)
+            if bucket is None:
+                bucket = buckets[score] = []
+            bucket.append((d, t))
+
+    return ranked_times(buckets, event.create_time.date())
+
+
+def ranked_times(buckets, first_day):
+    """
+    Yield the start times in buckets, a dict of score-[(day, interval)]
+    pairs, from the highest score to the lowest, where day 0 is first_day.
+    """
+    for score in sorted(buckets, reverse=True):
+        for d, t in buckets[score]:
+            yield datetime.combine(first_day + timedelta(days=d),
+                                   index_to_time(t))
+
+
+@profiled
+@reads_event
+def find_earliest_quorum_time(username, event_id, quorum):
+    """
+    Find the earliest start time at which enough members are available for
+    the whole event, out of the times find_best_times considers. Days are
+    searched in order, and the search stops at the first time found.
+
+        Parameters:
+            username (str): username of user
+            event_id (int): unique ID of event
+            quorum (int or [str]): least number of members who must be
+                                   available, or usernames of members who
+                                   must all be available
+
+        Exceptions:
+            InputError when any of:
+                username does not exist
+                event_id does not exist
+                username is not a member of event
+                quorum is a number less than 1 or more than the number
+                of members
+                quorum is an empty list of usernames, or has a username
+                who is not a member of event
+            AuthError when any of:
+                username is not logged in
+
+        Returns:
+            time (datetime.datetime): earliest start time, or None if
+            there is none
+    """
+    check_username(username)
+    check_event_id(event_id)
+    check_is_member(username, event_id)
+    check_logged_in(username)
+
+    event = data.events.get(event_id)
+    if isinstance(quorum, int):
+        if not 1 <= quorum <= len(event.members):
+            raise InputError("Invalid quorum")
+
+        found = earliest_count_quorum(event, quorum)
+    else:
+        required = set(quorum)
+        if not required or any(u not in event.members for u in required):
+            raise InputError("Invalid quorum")
 
+        found = earliest_member_quorum(event, required)
 
+    if found is None:
+        return None
+
+    d, t = found
+    return datetime.combine(event.create_time.date() + timedelta(days=d),
+                            index_to_time(t))
+
+
+def earliest_count_quorum(event, quorum):
+    """
+    Return (day, interval) of the earliest start time at which at least
+    quorum members of event are available for the whole event, or None.
+    A run of intervals with quorum or more members counted is kept while
+    walking each day, and only once it is as long as the event are the
+    members' schedules read, to check that the same members are available
+    throughout.
+    """
+    length, days = candidate_days(event, get_search_start())
+    schedules = list(event.availabilities.values())
+    if len(schedules) < quorum:
+        return None
+
+    for d, starts in days:
+        counts = event.day_counts(d)
+        rows = None
+        running = 0
+        for t in range(starts.start, starts.stop + length - 1):
+            running = running + 1 if counts[t] >= quorum else 0
+            if running < length:
+                continue
+
+            start = t - length + 1
+            if rows is None:
+                rows = [schedule.row(d) for schedule in schedules]
+            mask = interval_mask(start, t + 1)
+            if sum(row & mask == mask for row in rows) >= quorum:
+                return d, start
+
+    return None
+
+
+def earliest_member_quorum(event, required):
+    """
+    Return (day, interval) of the earliest start time at which all members
+    of event in required are available for the whole event, or None.
+    """
+    length, days = candidate_days(event, get_search_start())
+    schedules = [event.members[username] for username in required]
+    if None in schedules:
+        return None
+
+    for d, starts in days:
+        row = FULL_DAY
+        for schedule in schedules:
+            row &= schedule.row(d)
+            if not row:
+                break
+
+        # Bit t is set if everyone is available from t for the event length
+        free = row
+        for k in range(1, length):
+            free &= row >> k
+        free &= ~((1 << starts.start) - 1)
+        if free:
+            t = (free & -free).bit_length() - 1
+            if t < starts.stop:
+                return d, t
+
+    return None
+
+
+@profiled
+def recompute_all_best_times(event_ids, workers=None, cutoff=CUTOFF):
+    """
+    Find the best times of many events at once, sharing the work between
+    worker processes, and cache the results for find_best_times.
+    Each event is sent to a worker as its settings and the member counts
+    of the days anyone is available on, and events are read only as
+    workers become free.
+
+        Parameters:
+            event_ids ([int]): unique IDs of events
+            workers (int): number of worker processes, by default one per
+                           CPU; with 1 or fewer no processes are started
+            cutoff (int): number of times to find per event
+
+        Exceptions:
+            InputError when any of:
+                an event_id does not exist
+
+        Returns:
+            best_times ({int : [datetime.datetime]}): dict of
+            event_id-best times pairs, from best to worst
+    """
+    for event_id in event_ids:
+        check_event_id(event_id)
+
+    search_start = get_search_start()
+    events = {}
+    payloads = event_payloads(event_ids, cutoff, search_start, events)
+    if workers is not None and workers <= 1:
+        results = map(find_payload_best_times, payloads)
+    else:
+        results = map_payload_chunks(payloads, workers)
+
+    best_times = {}
+    for event_id, times in results:
+        best_times[event_id] = times
+        best_times_cache.put(event_id,
+                             events[event_id] + (search_start, cutoff), times)
+
+    return best_times
+
+
+def event_payloads(event_ids, cutoff, search_start, events):
+    """
+    Yield a payload for find_payload_best_times per event, holding its
+    settings and the counts of only the days anyone is available on, as
+    (day index, counts bytes) pairs. Payloads are made as they are taken,
+    and each event is put in events with its version, as (event, version).
+    """
+    for event_id in event_ids:
+        event = data.events.get(event_id)
+        if event is None:
+            # Removed since its ID was checked
+            continue
+        with event.lock.read():
+            events[event_id] = (event, event.version)
+            days = tuple((d, array("I", counts).tobytes())
+                         for d, counts in enumerate(event.counts)
+                         if counts is not EMPTY_COUNTS and any(counts))
+            settings = EventSettings(event.create_time, event.event_length,
+                                     event.event_deadline, event.min_time,
+                                     event.max_time)
+        yield event_id, days, settings, cutoff, search_start
+
+
+def map_payload_chunks(payloads, workers):
+    """
+    Yield the results of find_payload_best_times for payloads, in order,
+    found by worker processes RECOMPUTE_CHUNK payloads at a time. Chunks are
+    only taken from payloads as earlier ones finish, so no more than
+    RECOMPUTE_WINDOW chunks per worker are held at once.
+    """
+    window = RECOMPUTE_WINDOW * (workers or os.cpu_count() or 1)
+    chunks = iter(lambda: list(islice(payloads, RECOMPUTE_CHUNK)), [])
+    with ProcessPoolExecutor(workers) as executor:
+        futures = deque()
+        for chunk in chunks:
+            if len(futures) >= window:
+                yield from futures.popleft().result()
+            futures.append(executor.submit(find_chunk_best_times, chunk))
+        while futures:
+            yield from futures.popleft().result()
+
+
+def find_chunk_best_times(payloads):
+    """
+    Return find_payload_best_times for each of payloads. Runs in worker
+    processes.
+    """
+    return [find_payload_best_times(payload) for payload in payloads]
+
+
+def find_payload_best_times(payload):
+    """
+    Given a payload made by event_payloads, return its event ID and best
+    times.
+    """
+    event_id, days, settings, cutoff, search_start = payload
+    times = [EMPTY_COUNTS] * MAX_DAYS
+    for d, counts in days:
+        times[d] = array("I", counts)
+    return event_id, find_best_intervals(times, cutoff, settings,
+                                         search_start)
+
+
+@profiled
 def find_intersection(lists):
     """
-    Given lists, a list of 2D lists, return another list 'result' of same
-    dimensions as the 2D lists where each entry result[x][y] equals the sum
-    of True l[x][y] entries for all l in lists. Assume lists is non-empty.
+    Given lists, a list of Schedule.times grids, return a new MAX_DAYS x
+    INTERVALS 2D list 'result' where each entry result[x][y] equals the sum
+    of True l[x][y] entries for all l in lists. The grids are not modified.
+    Weekly templates are summed per weekday before being added to each
+    day, unless a schedule is laid over a calendar. Days no member is
+    available on are skipped, and share EMPTY_COUNTS in result. Uses numpy
+    if it is installed and there are enough grids.
     """
-    result = lists[0][:]
-    x = len(result)
-    y = len(result[0])
-    for d in range(x):
-        for t in range(y):
-            result[d][t] = [l[d][t] for l in lists].count(True)
+    if np is not None and len(lists) >= NUMPY_MIN_MEMBERS:
+        return find_intersection_numpy(lists)
+
+    result = [EMPTY_COUNTS] * MAX_DAYS
+    # Counts of the weekly templates, by day index modulo 7
+    weekly = [0] * 7
+    # Changes in counts at the bounds of sparse schedules' blocks
+    diff = None
+    for times in lists:
+        schedule = times.schedule
+        if schedule.calendar is not None:
+            # Pinned intervals break the layers' rules, so days are added
+            # as resolved rows
+            for d in schedule.touched_days():
+                add_bits(day_result(result, d), schedule.row(d), 1)
+            continue
+
+        if any(schedule.weekly):
+            for w, template in enumerate(schedule.weekly):
+                if template:
+                    if not weekly[w]:
+                        weekly[w] = [0] * INTERVALS
+                    add_bits(weekly[w], template, 1)
+            for d, row in schedule.cleared.items():
+                add_bits(day_result(result, d), row, -1)
+
+        if isinstance(schedule, SparseSchedule):
+            if diff is None:
+                diff = [0] * (MAX_DAYS * INTERVALS + 1)
+            for start, end in schedule.runs():
+                diff[start] += 1
+                diff[end] -= 1
+            continue
+
+        for d in schedule.dated_days():
+            add_bits(day_result(result, d), schedule.dated_row(d), 1)
+
+    for d in range(MAX_DAYS):
+        if weekly[d % 7]:
+            counts = day_result(result, d)
+            for t, count in enumerate(weekly[d % 7]):
+                counts[t] += count
+
+    if diff is not None:
+        running = 0
+        for i in range(MAX_DAYS * INTERVALS):
+            running += diff[i]
+            if running:
+                d, t = divmod(i, INTERVALS)
+                day_result(result, d)[t] += running
 
     return result
 
 
+def day_result(result, day):
+    """
+    Return result[day] of find_intersection, as a list which can be changed.
+    """
+    if result[day] is EMPTY_COUNTS:
+        result[day] = [0] * INTERVALS
+    return result[day]
+
+
+def add_bits(counts, row, amount):
+    """
+    Add amount to counts[t] for every bit t set in the packed row.
+    """
+    while row:
+        low = row & -row
+        counts[low.bit_length() - 1] += amount
+        row ^= low
+
+
+@profiled
+def find_intersection_numpy(lists):
+    """
+    Same as find_intersection, but unpacks the grids into a
+    (members, days, INTERVALS) numpy array, over only the days any member
+    is available on, and sums over members. Requires numpy.
+    """
+    days = sorted(set().union(*(times.schedule.touched_days()
+                                for times in lists)))
+    result = [EMPTY_COUNTS] * MAX_DAYS
+    if not days:
+        return result
+
+    rows = np.array([[times.schedule.row(d) for d in days]
+                     for times in lists], dtype=np.uint64)
+    shifts = np.arange(INTERVALS, dtype=np.uint64)
+    bits = (rows[:, :, np.newaxis] >> shifts) & np.uint64(1)
+    for d, counts in zip(days, bits.sum(axis=0).tolist()):
+        result[d] = counts
+    return result
+
+
 def time_to_index(time):
     return time.hour * 2 + time.minute // 30
 
 
-def find_best_intervals(times, cutoff, event):
-    search_start = datetime.now() + timedelta(hours=SEARCH_DELAY)
-    min_day_index = (search_start.date() - event.create_time.date()).days
-    min_first_day_time_index = search_start.hour * 2
-    min_time_index = time_to_index(event.min_time)
-    max_time_index = time_to_index(event.max_time)
-    max_day_index = (event.event_deadline - event.create_time.date()).days
+def index_to_time(index):
+    return time(index // 2, index % 2 * 30)
 
-    best_scores = {}
-    for d, day in enumerate(times):
-        if d < min_day_index or d > max_day_index:
-            continue
 
-        for tim in range(min_time_index, max_time_index - event.event_length * 2 + 1):
-            if d == min_day_index and tim < min_first_day_time_index:
-                continue
-
-            score = sum(day[tim:(tim + event.event_length)])
-            if len(best_scores) < cutoff:
-                best_scores[score] = (d, tim)
-            else:
-                min_best_score = min(list(best_scores.keys()))
-                if score > min_best_score:
-                    del best_scores[min_best_score]
-                    best_scores[score] = (d, tim)
+def get_search_start():
+    """
+    Return the earliest time a meeting can be found for, which is
+    SEARCH_DELAY hours from now rounded up to the next 30 minutes.
+    """
+    earliest = datetime.now() + timedelta(hours=SEARCH_DELAY)
+    start = earliest.replace(minute=earliest.minute // 30 * 30,
+                             second=0, microsecond=0)
+    if start < earliest:
+        start += timedelta(minutes=30)
 
-    highscores = sorted(list(best_scores.keys()), reverse=True)
-    return [best_scores[hs] for hs in highscores]
+    return start
 
 
-def find_best_interval_starts(times, cutoff, event_id):
+@profiled
+def find_best_intervals(times, cutoff, event, search_start=None):
     """
     Given times (a 2D list where times[d][t] is the number of people available
     at the corresponding time), find the best 'cutoff' starting times of best
-    intervals to meet, depending on event settings.
-    """
\ No newline at end of file
+    intervals to meet, depending on event settings, that start no earlier
+    than search_start (by default get_search_start()). An interval's score is
+    the sum of times[d][t] over its 30 minute intervals. Intervals with equal
+    scores are ordered from earliest to latest.
+    """
+    if search_start is None:
+        search_start = get_search_start()
+
+    length, days = candidate_days(event, search_start)
+    # Min-heap of (score, -day, -interval), so the root is the worst
+    # candidate kept, and the latest of any tied candidates
+    best = []
+    for d, starts in days:
+        prefix = list(accumulate(times[d], initial=0))
+        for tim in starts:
+            candidate = (prefix[tim + length] - prefix[tim], -d, -tim)
+            if len(best) < cutoff:
+                heappush(best, candidate)
+            elif candidate > best[0]:
+                heapreplace(best, candidate)
+
+    first_day = event.create_time.date()
+    best.sort(reverse=True)
+    return [datetime.combine(first_day + timedelta(days=-d), index_to_time(-t))
+            for _, d, t in best]
+
+
+def candidate_days(event, search_start):
+    """
+    Return (length, days), where length is the event length in 30 minute
+    intervals and days is a list of (day index, range of start interval
+    indices) pairs of the start times that can be chosen for the event,
+    from earliest to latest.
+    """
+    first_day = event.create_time.date()
+    min_day_index = max((search_start.date() - first_day).days, 0)
+    min_first_day_time_index = time_to_index(search_start)
+    min_time_index = time_to_index(event.min_time)
+    max_time_index = time_to_index(event.max_time)
+    length = (event.event_length or DEFAULT_LENGTH) * 2
+
+    max_day_index = MAX_DAYS - 1
+    if event.event_deadline:
+        max_day_index = min((event.event_deadline - first_day).days,
+                            max_day_index)
+
+    days = []
+    for d in range(min_day_index, max_day_index + 1):
+        first = min_time_index
+        if d == min_day_index:
+            first = max(first, min_first_day_time_index)
+        days.append((d, range(first, max_time_index - length + 1)))
+
+    return length, days
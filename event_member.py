@@ -12,14 +12,25 @@ FRI = 4
 SAT = 5
 SUN = 6
 
+# Edit types for edit_availability_batch
+WEEKLY = "weekly"
+SPECIAL = "special"
+DAILY = "daily"
+
 
 from datetime import timedelta
-from data import data, MAX_DAYS, INTERVALS
+from data import (data, MAX_DAYS, INTERVALS, FULL_DAY, apply_mask,
+                  day_masks, interval_mask)
 from error import AuthError, InputError
+from locks import writes_event
+from event_admin import drop_members
 from error_checks import (check_event_id, check_username, check_logged_in,
                           check_is_member)
+from profiling import profiled
 
 
+@profiled
+@writes_event
 def leave_event(username, event_id):
     """
     Leave an event.
@@ -49,10 +60,12 @@ def leave_event(username, event_id):
     if username == event.admin_username:
         raise InputError("Admin cannot leave event")
 
-    event.member_usernames.remove(username)
-    del event.availabilities[username]
+    drop_members(event, [username])
+    data.storage.commit()
 
 
+@profiled
+@writes_event
 def edit_availability_weekly(username, event_id, edit_mode, day, start, end):
     """
     Add a weekly schedule of availabilities
@@ -84,23 +97,15 @@ def edit_availability_weekly(username, event_id, edit_mode, day, start, end):
     check_is_member(username, event_id)
     check_logged_in(username)
 
-    if not MON <= day <= SUN:
-        raise InputError("Invalid week day")
-
-    if end <= start:
-        raise InputError("Invalid time interval")
-
     event = data.events.get(event_id)
-    schedule = event.availabilities[username]
-    offset = (day - event.create_time.weekday() + 7) % 7
-    start = start.hour * 2 + start.minute // 30
-    end = end.hour * 2 + end.minute // 30
-
-    for d in range(offset, MAX_DAYS, 7):
-        for t in range(start, end):
-            schedule.times[d][t] = edit_mode
+    weekday, mask = weekly_changes(event, day, start, end)
+    event.schedule(username).set_weekly(weekday, mask, edit_mode)
+    event.choose_storage(username)
+    save_schedule(event, username)
 
 
+@profiled
+@writes_event
 def edit_availability_special(username, event_id, edit_mode, start, end):
     """
     Set availability for a non-repeating specific time interval.
@@ -133,36 +138,15 @@ def edit_availability_special(username, event_id, edit_mode, start, end):
     check_is_member(username, event_id)
     check_logged_in(username)
 
-    if end <= start:
-        raise InputError("Invalid time range")
-
     event = data.events.get(event_id)
-    if start < event.create_time or end < event.create_time:
-        raise InputError("Start or end time is in the past")
-
-    if (start > timedelta(days=60) + event.create_time or
-        end > timedelta(days=60) + event.create_time):
-        raise InputError("Start or end time is too late")
-
-    start_index = (start.date() - event.create_time.date()).days
-    end_index = (end.date() - event.create_time.date()).days
-
-    schedule = event.availabilities[username].times
-    current_interval = start.hour * 2 + start.minute // 30
-    current_day_index = start_index
-    current = start
-
-    while current < end:
-        schedule[current_day_index][current_interval] = edit_mode
-
-        current_interval += 1
-        if current_interval == INTERVALS:
-            current_interval = 0
-            current_day_index += 1
-
-        current += timedelta(seconds=(60 * 30))
+    start, end = special_range(event, start, end)
+    event.schedule(username).set_intervals(start, end, edit_mode)
+    event.choose_storage(username)
+    save_schedule(event, username)
 
 
+@profiled
+@writes_event
 def edit_availability_daily(username, event_id, edit_mode, day):
     """
     Set availability for a full day.
@@ -192,12 +176,172 @@ def edit_availability_daily(username, event_id, edit_mode, day):
     check_logged_in(username)
 
     event = data.events.get(event_id)
+    changes = daily_changes(event, day)
+    apply_changes(event.schedule(username), changes, edit_mode)
+    event.choose_storage(username)
+    save_schedule(event, username)
+
+
+@profiled
+@writes_event
+def edit_availability_batch(username, event_id, edits):
+    """
+    Apply a list of weekly, special and daily availability edits in order.
+    Either all edits are applied, or none are if any edit is invalid.
+
+        Parameters:
+            username (str): username of editor
+            event_id (int): unique ID of event
+            edits ([tuple]): list of edits, each one of:
+                (WEEKLY, edit_mode, day, start, end)
+                (SPECIAL, edit_mode, start, end)
+                (DAILY, edit_mode, day)
+                with the same arguments as edit_availability_weekly,
+                edit_availability_special and edit_availability_daily
+
+        Exceptions:
+            AuthError when any of:
+                username is not logged in
+            InputError when any of:
+                username does not exist
+                event_id does not exist
+                username is not part of the event
+                an edit type is not WEEKLY, SPECIAL or DAILY
+                an edit is invalid for its type
+
+        Returns:
+            None
+    """
+    check_username(username)
+    check_event_id(event_id)
+    check_is_member(username, event_id)
+    check_logged_in(username)
+
+    event = data.events.get(event_id)
+    changes = []
+    for kind, edit_mode, *args in edits:
+        if kind not in EDIT_CHANGES:
+            raise InputError("Invalid edit type")
+
+        changes.append((kind, edit_mode, EDIT_CHANGES[kind](event, *args)))
+
+    # Dated changes are gathered into rows, which are written before each
+    # weekly change and at the end, along with the masks of the intervals
+    # they set
+    schedule = event.schedule(username)
+    rows = {}
+    masks = {}
+    for kind, edit_mode, change in changes:
+        if kind == WEEKLY:
+            write_rows(schedule, rows, masks)
+            rows = {}
+            masks = {}
+            schedule.set_weekly(*change, edit_mode)
+            continue
+
+        for d, mask in change:
+            rows[d] = apply_mask(rows.get(d, schedule.row(d)), mask, edit_mode)
+            masks[d] = masks.get(d, 0) | mask
+
+    write_rows(schedule, rows, masks)
+    event.choose_storage(username)
+    save_schedule(event, username)
+
+
+def write_rows(schedule, rows, masks):
+    """
+    Write rows, a dict of day-packed row pairs, to schedule, pinning the
+    intervals in masks, a dict of day-packed mask pairs.
+    """
+    for d, row in rows.items():
+        schedule.set_row(d, row)
+        schedule.pin(d, masks[d])
+
+
+def save_schedule(event, username):
+    """
+    Write a member's schedule to storage.
+    """
+    data.storage.save_schedule(event.event_id, event.availabilities[username])
+    data.storage.commit()
+
+
+def weekly_changes(event, day, start, end):
+    """
+    Check a weekly edit of event, and return (weekday, mask), where the
+    edit sets the intervals in mask of every day index d with
+    d % 7 == weekday.
+    """
+    if not MON <= day <= SUN:
+        raise InputError("Invalid week day")
+
+    if end <= start:
+        raise InputError("Invalid time interval")
+
+    weekday = (day - event.create_time.weekday() + 7) % 7
+    mask = interval_mask(start.hour * 2 + start.minute // 30,
+                         end.hour * 2 + end.minute // 30)
+    return weekday, mask
+
+
+def special_changes(event, start, end):
+    """
+    Check a special edit of event, and return the (day index, mask) pairs
+    of the intervals it sets.
+    """
+    return day_masks(*special_range(event, start, end))
+
+
+def special_range(event, start, end):
+    """
+    Check a special edit of event, and return the interval indices counted
+    from the start of day 0 that it sets, from start up to (not including)
+    end.
+    """
+    if end <= start:
+        raise InputError("Invalid time range")
+
+    if start < event.create_time or end < event.create_time:
+        raise InputError("Start or end time is in the past")
+
+    if (start > timedelta(days=60) + event.create_time or
+        end > timedelta(days=60) + event.create_time):
+        raise InputError("Start or end time is too late")
+
+    start_index = (start.date() - event.create_time.date()).days
+    end_index = (end.date() - event.create_time.date()).days
+    start_interval = start.hour * 2 + start.minute // 30
+    end_interval = end.hour * 2 + (end.minute + 29) // 30
+
+    return (start_index * INTERVALS + start_interval,
+            end_index * INTERVALS + end_interval)
+
+
+def daily_changes(event, day):
+    """
+    Check a daily edit of event, and return the (day index, mask) pairs
+    of the intervals it sets.
+    """
     if day < event.create_time.date():
         raise InputError("Date cannot be in the past")
 
     if day >= event.create_time.date() + timedelta(days=MAX_DAYS):
         raise InputError("Date is too far into future")
 
-    schedule = event.availabilities[username].times
-    offset = (day - event.create_time.date()).days
-    schedule[offset] = [edit_mode for _ in range(INTERVALS)]
+    return [((day - event.create_time.date()).days, FULL_DAY)]
+
+
+def apply_changes(schedule, changes, edit_mode):
+    """
+    Set the intervals of schedule given by changes, a list of
+    (day index, mask) pairs, to edit_mode.
+    """
+    for d, mask in changes:
+        schedule.set_masked(d, mask, edit_mode)
+
+
+EDIT_CHANGES = {
+    WEEKLY: weekly_changes,
+    SPECIAL: special_changes,
+    DAILY: daily_changes,
+}
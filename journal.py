@@ -0,0 +1,401 @@
+"""
+A file containing a journal storage backend, which appends every change to
+user/event data to a log and compacts it into snapshots
+"""
+
+
+import os
+import pickle
+import struct
+import zlib
+from threading import Condition, RLock, Thread, local
+from time import monotonic
+from data import Storage, normalise_email
+from storage import (pack_schedule, pack_calendar, user_record,
+                     record_user, event_record, record_event)
+
+
+# Each log record is a header of (payload length, payload crc32)
+# followed by a pickled tuple
+HEADER = struct.Struct("<II")
+# Committed records are fsynced by a background thread, at the latest
+# FSYNC_SECONDS seconds after the first of them was committed, or sooner
+# once FSYNC_COMMITS commits are waiting
+FSYNC_COMMITS = 32
+FSYNC_SECONDS = 0.05
+# A snapshot is written once the log holds SNAPSHOT_RECORDS records
+SNAPSHOT_RECORDS = 10000
+
+LOG_FILE = "journal.log"
+# The log being compacted into a snapshot
+PREVIOUS_LOG_FILE = "journal.log.previous"
+SNAPSHOT_FILE = "journal.snapshot"
+
+
+class JournalStorage(Storage):
+    """
+    A persistence backend which appends every change to a binary log.
+    Once the log grows long, a new log is started and all data is written
+    to a snapshot, so recovery loads the snapshot and replays only the
+    changes made since. Fsyncs and snapshots are made by a background
+    thread, so entry points committing changes never wait for them.
+
+    Attributes
+    ----------
+    directory : str
+        directory holding the log and snapshot files
+    users : {str : tuple}
+        dict of username-user record pairs
+    emails : {str : str}
+        dict of normalised email-username pairs
+    events : {int : tuple}
+        dict of event_id-event record pairs
+    members : {int : {str : bytes}}
+        dict of event_id-(username-packed schedule) pairs, where the packed
+        schedule is None for members without a schedule
+    user_events : {str : {int : None}}
+        dict of username-(event_id-None) pairs of the events each user is a
+        member of, in the order they joined
+    calendars : {str : bytes}
+        dict of username-packed calendar pairs of users with a calendar
+    log : file
+        log file opened for appending
+    local : threading.local
+        holds pending, the list of (record, bytes) pairs written by the
+        thread since its last commit. Records are only applied once
+        committed, so each commit holds only its own entry point's
+        changes, and snapshots only committed ones.
+    log_records : int
+        number of records in the log
+    unsynced : int
+        number of commits since the log was last fsynced
+    first_unsynced : float
+        time.monotonic() of the first commit since the log was last fsynced
+    snapshot_due : bool
+        True if the log has grown long enough to be compacted
+    closed : bool
+        True once close() has been called
+    lock : threading.RLock
+        lock serialising changes
+    wake : threading.Condition
+        condition of lock, notified when the flusher has work, or has
+        finished some
+    flusher : threading.Thread
+        background thread making fsyncs and snapshots
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.users = {}
+        self.emails = {}
+        self.events = {}
+        self.members = {}
+        self.user_events = {}
+        self.calendars = {}
+        self.local = local()
+        self.log_records = 0
+        self.unsynced = 0
+        self.first_unsynced = monotonic()
+        self.snapshot_due = False
+        self.closed = False
+        self.lock = RLock()
+        self.wake = Condition(self.lock)
+
+        os.makedirs(directory, exist_ok=True)
+        self.recover()
+        if os.path.exists(self.path(PREVIOUS_LOG_FILE)):
+            # A crash came while a snapshot was being written, so both logs
+            # are compacted into a new one
+            self.write_snapshot(self.snapshot_data())
+            open(self.path(LOG_FILE), "wb").close()
+            self.log_records = 0
+        self.log = open(self.path(LOG_FILE), "ab")
+
+        self.flusher = Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def recover(self):
+        """
+        Load the latest snapshot, then replay the logs written after it.
+        A record cut short by a crash ends the log and is removed.
+        The previous log may already be held by the snapshot, if a crash
+        came before it was removed. Replaying it again leaves the data as
+        it is, as every record sets data to a value.
+        """
+        try:
+            with open(self.path(SNAPSHOT_FILE), "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            snapshot = None
+
+        if snapshot:
+            (self.users, self.events, self.members, self.user_events,
+             self.calendars) = snapshot
+
+        for record in self.users.values():
+            self.emails[normalise_email(record[2])] = record[0]
+
+        self.replay(PREVIOUS_LOG_FILE)
+        self.replay(LOG_FILE)
+
+    def replay(self, name):
+        """
+        Apply the records of the log file with the given name, if it exists.
+        """
+        try:
+            with open(self.path(name), "rb") as f:
+                log = f.read()
+        except FileNotFoundError:
+            return
+
+        end = 0
+        while end + HEADER.size <= len(log):
+            length, crc = HEADER.unpack_from(log, end)
+            payload = log[end + HEADER.size:end + HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+
+            self.apply(pickle.loads(payload))
+            self.log_records += 1
+            end += HEADER.size + length
+
+        if end < len(log):
+            with open(self.path(name), "r+b") as f:
+                f.truncate(end)
+
+    def apply(self, record):
+        """
+        Apply one log record to the stored data.
+        """
+        kind, *args = record
+        if kind == "user":
+            user, = args
+            old = self.users.get(user[0])
+            if old:
+                self.emails.pop(normalise_email(old[2]), None)
+            self.users[user[0]] = user
+            self.emails[normalise_email(user[2])] = user[0]
+        elif kind == "delete_user":
+            username, = args
+            old = self.users.pop(username, None)
+            if old:
+                self.emails.pop(normalise_email(old[2]), None)
+            self.calendars.pop(username, None)
+        elif kind == "event":
+            event, usernames = args
+            self.events[event[0]] = event
+            members = self.members.setdefault(event[0], {})
+            for username in usernames:
+                if username not in members:
+                    self.add_member(event[0], username, None)
+        elif kind == "schedule":
+            event_id, username, blob = args
+            self.add_member(event_id, username, blob)
+        elif kind == "delete_member":
+            event_id, username = args
+            self.members.get(event_id, {}).pop(username, None)
+            self.user_events.get(username, {}).pop(event_id, None)
+        elif kind == "calendar":
+            username, blob = args
+            self.calendars[username] = blob
+
+    def add_member(self, event_id, username, blob):
+        self.members.setdefault(event_id, {})[username] = blob
+        self.user_events.setdefault(username, {})[event_id] = None
+
+    def write(self, record):
+        """
+        Hold a record until the calling thread commits.
+        """
+        payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        header = HEADER.pack(len(payload), zlib.crc32(payload))
+        pending = getattr(self.local, "pending", None)
+        if pending is None:
+            pending = self.local.pending = []
+        pending.append((record, header + payload))
+
+    def load_user(self, username):
+        record = self.users.get(username)
+        if not record:
+            return None
+
+        return record_user(record, self.user_events.get(username, ()),
+                           self.calendars.get(username))
+
+    def load_email(self, email):
+        return self.emails.get(email)
+
+    def load_event(self, event_id):
+        record = self.events.get(event_id)
+        if not record:
+            return None
+
+        return record_event(record, self.members[event_id].items())
+
+    def load_next_event_id(self):
+        return max(self.events, default=0) + 1
+
+    def save_user(self, user):
+        self.write(("user", user_record(user)))
+
+    def delete_user(self, username):
+        self.write(("delete_user", username))
+
+    def save_event(self, event):
+        self.write(("event", event_record(event),
+                    tuple(event.member_usernames)))
+
+    def save_schedule(self, event_id, schedule):
+        self.write(("schedule", event_id, schedule.username,
+                    pack_schedule(schedule)))
+
+    def save_calendar(self, username, calendar):
+        self.write(("calendar", username, pack_calendar(calendar)))
+
+    def delete_member(self, event_id, username):
+        self.write(("delete_member", event_id, username))
+
+    def commit(self):
+        """
+        Apply and append to the log the records written by the calling
+        thread since its last commit, and wake the flusher if the commits
+        waiting for an fsync have just started or grown many, or if the log
+        has grown long.
+        """
+        pending = getattr(self.local, "pending", None)
+        if not pending:
+            return
+
+        self.local.pending = []
+        with self.lock:
+            for record, _ in pending:
+                self.apply(record)
+            self.log.write(b"".join(entry for _, entry in pending))
+            self.log_records += len(pending)
+            self.log.flush()
+            if not self.unsynced:
+                self.first_unsynced = monotonic()
+            self.unsynced += 1
+            if (self.unsynced == 1 or self.unsynced == FSYNC_COMMITS or
+                (self.log_records >= SNAPSHOT_RECORDS and
+                 not self.snapshot_due)):
+                self.snapshot_due = self.log_records >= SNAPSHOT_RECORDS
+                self.wake.notify_all()
+
+    def flush_loop(self):
+        """
+        Run by the flusher until the storage is closed: fsync committed
+        records as a group once the first of them has waited FSYNC_SECONDS
+        seconds, or FSYNC_COMMITS commits are waiting, and write snapshots
+        when due.
+        """
+        while True:
+            with self.lock:
+                while not self.closed and not self.snapshot_due:
+                    if not self.unsynced:
+                        self.wake.wait()
+                        continue
+
+                    delay = self.first_unsynced + FSYNC_SECONDS - monotonic()
+                    if delay <= 0 or self.unsynced >= FSYNC_COMMITS:
+                        break
+                    self.wake.wait(delay)
+
+                if self.closed:
+                    return
+                snapshot_due = self.snapshot_due
+
+            if snapshot_due:
+                self.snapshot()
+            else:
+                self.sync()
+
+    def sync(self):
+        """
+        Make all committed records durable. The lock is not held while the
+        log is fsynced, so commits can go on meanwhile.
+        """
+        with self.lock:
+            self.log.flush()
+            log = self.log
+            synced = self.unsynced
+
+        os.fsync(log.fileno())
+        with self.lock:
+            # Commits made during the fsync keep the older first_unsynced,
+            # so they are fsynced straight away
+            self.unsynced -= synced
+            self.wake.notify_all()
+
+    def snapshot(self):
+        """
+        Start a new log, write all stored data to a new snapshot, then
+        remove the previous log. The lock is only held to start the new log
+        and copy the data, so commits can go on while the snapshot is
+        written.
+        """
+        with self.lock:
+            self.log.flush()
+            previous = self.log
+            os.replace(self.path(LOG_FILE), self.path(PREVIOUS_LOG_FILE))
+            self.log = open(self.path(LOG_FILE), "ab")
+            self.log_records = 0
+            self.unsynced = 0
+            data = self.snapshot_data()
+
+        os.fsync(previous.fileno())
+        previous.close()
+        self.write_snapshot(data)
+        with self.lock:
+            self.snapshot_due = False
+            self.wake.notify_all()
+
+    def snapshot_data(self):
+        """
+        Return a copy of all stored data, as written to snapshots.
+        """
+        return (dict(self.users), dict(self.events),
+                {event_id: dict(members)
+                 for event_id, members in self.members.items()},
+                {username: dict(events)
+                 for username, events in self.user_events.items()},
+                dict(self.calendars))
+
+    def write_snapshot(self, data):
+        """
+        Replace the snapshot with data, made by snapshot_data(), then
+        remove the previous log, which data holds.
+        """
+        temp = self.path(SNAPSHOT_FILE + ".tmp")
+        with open(temp, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path(SNAPSHOT_FILE))
+
+        try:
+            os.remove(self.path(PREVIOUS_LOG_FILE))
+        except FileNotFoundError:
+            pass
+
+    def flush(self):
+        """
+        Wait until every committed record is fsynced, and any snapshot due
+        is written.
+        """
+        with self.lock:
+            while not self.closed and (self.unsynced or self.snapshot_due):
+                self.wake.wait()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.wake.notify_all()
+        self.flusher.join()
+
+        with self.lock:
+            self.commit()
+            self.sync()
+            self.log.close()
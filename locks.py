@@ -0,0 +1,42 @@
+"""
+Decorators making entry points that use an event safe to call from
+multiple threads
+"""
+
+
+from functools import wraps
+from inspect import signature
+from data import data
+
+
+def reads_event(f):
+    """
+    Hold the read lock of the event given by f's event_id argument while
+    f runs, so other readers of the event can run at the same time.
+    """
+    return locks_event(f, write=False)
+
+
+def writes_event(f):
+    """
+    Hold the write lock of the event given by f's event_id argument while
+    f runs, so no other entry point uses the event at the same time.
+    """
+    return locks_event(f, write=True)
+
+
+def locks_event(f, write):
+    index = list(signature(f).parameters).index("event_id")
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        event_id = kwargs["event_id"] if "event_id" in kwargs else args[index]
+        event = data.events.get(event_id)
+        if event is None:
+            # f checks the event ID and raises an error
+            return f(*args, **kwargs)
+
+        with event.lock.write() if write else event.lock.read():
+            return f(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,216 @@
+"""
+A file containing functions for editing a user's personal calendar, which
+all of the user's events are laid over.
+"""
+
+
+from contextlib import ExitStack
+from datetime import date, timedelta
+from data import (data, Calendar, MON, SUN, MAX_DAYS, INTERVALS, FULL_DAY,
+                  day_masks, interval_mask)
+from error import InputError
+from error_checks import check_username, check_logged_in
+from profiling import profiled
+
+
+# Number of days from today that a calendar can be edited for
+CALENDAR_DAYS = 366
+
+
+@profiled
+def edit_calendar_weekly(username, edit_mode, day, start, end):
+    """
+    Set availability on one day of every week of a user's calendar. The
+    change is made in every event the user is a member of, apart from
+    intervals the user has changed for the event itself.
+
+        Parameters:
+            username (str): username of editor
+            edit_mode (bool): True for available, False for unavailable
+            day (int): day of week in calendar, 0 is Mon, 6 is Sun
+            start (datetime.time): start time in day of week
+            end (datetime.time): end time in day of week
+            (start and end are in intervals of 30 minutes)
+
+        Exceptions:
+            InputError when any of:
+                username does not exist
+                day is not valid
+                end is at or before start
+            AuthError when any of:
+                username is not logged in
+
+        Returns:
+            None
+    """
+    check_username(username)
+    check_logged_in(username)
+
+    if not MON <= day <= SUN:
+        raise InputError("Invalid week day")
+
+    if end <= start:
+        raise InputError("Invalid time interval")
+
+    mask = interval_mask(start.hour * 2 + start.minute // 30,
+                         end.hour * 2 + end.minute // 30)
+
+    def event_days(first):
+        # Date ordinal 1 is a Monday
+        return range((day + 1 - first) % 7, MAX_DAYS, 7)
+
+    update_calendar(username, event_days,
+                    lambda calendar: calendar.set_weekly(day, mask, edit_mode))
+
+
+@profiled
+def edit_calendar_special(username, edit_mode, start, end):
+    """
+    Set availability in a user's calendar for a non-repeating time interval.
+    The change is made in every event the user is a member of, apart from
+    intervals the user has changed for the event itself.
+
+        Parameters:
+            username (str): username of editor
+            edit_mode (bool): True for available, False for unavailable
+            start (datetime.datetime): start time
+            end (datetime.datetime): end time
+            (start and end are in intervals of 30 minutes)
+
+        Exceptions:
+            InputError when any of:
+                username does not exist
+                end is before or the same as start
+                start is before today
+                end is more than 366 days after today
+            AuthError when any of:
+                username is not logged in
+
+        Returns:
+            None
+    """
+    check_username(username)
+    check_logged_in(username)
+
+    if end <= start:
+        raise InputError("Invalid time range")
+
+    if start.date() < date.today():
+        raise InputError("Start or end time is in the past")
+
+    if end.date() > date.today() + timedelta(days=CALENDAR_DAYS):
+        raise InputError("Start or end time is too late")
+
+    first = start.toordinal()
+    end_index = ((end.toordinal() - first) * INTERVALS +
+                 end.hour * 2 + (end.minute + 29) // 30)
+    changes = [(first + d, mask) for d, mask in
+               day_masks(start.hour * 2 + start.minute // 30, end_index,
+                         CALENDAR_DAYS + 1)]
+    update_dates(username, changes, edit_mode)
+
+
+@profiled
+def edit_calendar_daily(username, edit_mode, day):
+    """
+    Set availability in a user's calendar for a full day. The change is
+    made in every event the user is a member of, apart from intervals the
+    user has changed for the event itself.
+
+        Parameters:
+            username (str): username of editor
+            edit_mode (bool): True for available, False for unavailable
+            day (datetime.date): day chosen
+
+        Exceptions:
+            InputError when any of:
+                username does not exist
+                day is a date before today
+                day is a date 366 or more days after today
+            AuthError when any of:
+                username is not logged in
+
+        Returns:
+            None
+    """
+    check_username(username)
+    check_logged_in(username)
+
+    if day < date.today():
+        raise InputError("Date cannot be in the past")
+
+    if day >= date.today() + timedelta(days=CALENDAR_DAYS):
+        raise InputError("Date is too far into future")
+
+    update_dates(username, [(day.toordinal(), FULL_DAY)], edit_mode)
+
+
+def update_dates(username, changes, edit_mode):
+    """
+    Set the intervals of a user's calendar given by changes, a list of
+    (date ordinal, mask) pairs, to edit_mode.
+    """
+    def event_days(first):
+        return [ordinal - first for ordinal, _ in changes
+                if 0 <= ordinal - first < MAX_DAYS]
+
+    def edit(calendar):
+        for ordinal, mask in changes:
+            calendar.set_masked(ordinal, mask, edit_mode)
+
+    update_calendar(username, event_days, edit)
+
+
+def update_calendar(username, event_days, edit):
+    """
+    Change a user's calendar with edit(calendar), and update each event the
+    user is a member of. event_days(first_day) gives the days of an event
+    the change can affect, where first_day is the date ordinal of its day 0.
+    The user's events are write locked, in order of event ID, while the
+    calendar changes.
+    """
+    user = data.users[username]
+    while True:
+        event_ids = sorted(user.joined_event_ids)
+        events = [data.events.get(event_id) for event_id in event_ids]
+        with ExitStack() as stack:
+            for event in events:
+                stack.enter_context(event.lock.write())
+            stack.enter_context(data.calendars_lock)
+
+            # Lock the events again if the user joined or left one meanwhile
+            if sorted(user.joined_event_ids) == event_ids:
+                change_calendar(user, events, event_days, edit)
+                return
+
+
+def change_calendar(user, events, event_days, edit):
+    """
+    Make the change of update_calendar, whose caller holds the locks.
+    """
+    if user.calendar is None:
+        user.calendar = Calendar()
+    calendar = user.calendar
+
+    changes = []
+    for event in events:
+        schedule = event.members[user.username]
+        # Schedules not yet laid over the calendar are saved even if the
+        # change leaves them as they were
+        unsaved = schedule is None or schedule.calendar is not calendar
+        schedule = event.schedule(user.username, calendar)
+        days = event_days(event.first_day)
+        changes.append((schedule, unsaved, days,
+                        [schedule.row(d) for d in days]))
+
+    edit(calendar)
+    for schedule, unsaved, days, old_rows in changes:
+        for d, old_row in zip(days, old_rows):
+            if old_row != schedule.row(d):
+                schedule.changed(d, old_row)
+                unsaved = True
+        if unsaved:
+            data.storage.save_schedule(schedule.event.event_id, schedule)
+
+    data.storage.save_calendar(user.username, calendar)
+    data.storage.commit()
@@ -0,0 +1,164 @@
+"""
+Opt-in profiling of the Meeter entry points. Public functions are marked
+with @profiled, which does nothing but check one flag until profiling is
+enabled with enable().
+"""
+
+
+import cProfile
+import json
+import os
+import pstats
+import random
+from functools import wraps
+from threading import Lock, local
+from time import perf_counter
+
+
+class Profiler:
+    """
+    A class holding profiling settings and the data collected.
+
+    Attributes
+    ----------
+    enabled : bool
+        True if profiling is on
+    functions : {str} or None
+        names of functions to profile, either bare ("find_best_times") or
+        with their module ("event_data.find_best_times"), or None for all
+    sample_rate : float
+        fraction of outermost profiled calls that are profiled
+    use_cprofile : bool
+        True to collect cProfile statistics as well as wall clock spans
+    spans : {str : [int, float, float]}
+        dict of function name-[calls, total seconds, max seconds]
+    stats : {str : pstats.Stats}
+        dict of function name-cProfile statistics of its calls made while
+        no other profiled call was collecting them
+    lock : threading.Lock
+        lock held while adding to spans and stats
+    state : threading.local
+        per thread depth of profiled calls, whether the outermost call
+        is being sampled, and whether a cProfile profile is running
+    """
+    def __init__(self):
+        self.enabled = False
+        self.functions = None
+        self.sample_rate = 1.0
+        self.use_cprofile = False
+        self.lock = Lock()
+        self.state = local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}
+            self.stats = {}
+
+    def wants(self, name):
+        return (self.functions is None or name in self.functions or
+                name.rsplit(".", 1)[-1] in self.functions)
+
+    def record(self, name, seconds, profile=None):
+        with self.lock:
+            span = self.spans.setdefault(name, [0, 0.0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+            if profile is not None:
+                if name in self.stats:
+                    self.stats[name].add(profile)
+                else:
+                    self.stats[name] = pstats.Stats(profile)
+
+
+profiler = Profiler()
+
+
+def enable(functions=None, sample_rate=1.0, use_cprofile=False):
+    """
+    Start profiling.
+
+        Parameters:
+            functions ([str]): names of functions to profile, bare or with
+                               their module, or None to profile all
+            sample_rate (float): fraction of outermost profiled calls,
+                                 with the profiled calls they make, to profile
+            use_cprofile (bool): also collect cProfile statistics of
+                                 profiled calls, attributed to the
+                                 outermost one
+
+        Returns:
+            None
+    """
+    profiler.functions = set(functions) if functions is not None else None
+    profiler.sample_rate = sample_rate
+    profiler.use_cprofile = use_cprofile
+    profiler.enabled = True
+
+
+def disable():
+    """
+    Stop profiling, keeping the data collected.
+    """
+    profiler.enabled = False
+
+
+def dump(directory):
+    """
+    Write the data collected to directory: wall clock spans to spans.json,
+    and cProfile statistics to one <function name>.prof file per function.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with profiler.lock:
+        spans = {name: {"calls": calls, "total_s": total, "max_s": longest,
+                        "mean_s": total / calls}
+                 for name, (calls, total, longest) in profiler.spans.items()}
+        with open(os.path.join(directory, "spans.json"), "w") as f:
+            json.dump(spans, f, indent=2, sort_keys=True)
+
+        for name, stats in profiler.stats.items():
+            stats.dump_stats(os.path.join(directory, name + ".prof"))
+
+
+def profiled(f):
+    """
+    Record wall clock spans, and optionally cProfile statistics, of calls
+    to f while profiling is enabled.
+    """
+    name = f.__module__ + "." + f.__qualname__
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return f(*args, **kwargs)
+
+        state = profiler.state
+        depth = getattr(state, "depth", 0)
+        if not depth:
+            state.sampled = random.random() < profiler.sample_rate
+        if not state.sampled or not profiler.wants(name):
+            state.depth = depth + 1
+            try:
+                return f(*args, **kwargs)
+            finally:
+                state.depth = depth
+
+        profile = None
+        if profiler.use_cprofile and not getattr(state, "profiling", False):
+            profile = cProfile.Profile()
+            state.profiling = True
+
+        state.depth = depth + 1
+        start = perf_counter()
+        try:
+            if profile is None:
+                return f(*args, **kwargs)
+            return profile.runcall(f, *args, **kwargs)
+        finally:
+            profiler.record(name, perf_counter() - start, profile)
+            state.depth = depth
+            if profile is not None:
+                state.profiling = False
+
+    return wrapper
@@ -0,0 +1,287 @@
+"""
+A file containing a binary format holding the schedules of all events,
+which can be memory mapped so one event's schedules are read without
+loading the rest.
+
+All integers are little-endian. A file is laid out as:
+
+    header      HEADER: magic b"MEETSCHD", format VERSION, number of
+                events E, number of members M, 0, offset of the rows region
+    events      E x EVENT, sorted by event_id: event_id, index of the
+                event's first member, number of members, creation date
+                (proleptic Gregorian ordinal), creation time (seconds
+                after midnight), event length in hours (0 if unset),
+                deadline (ordinal, 0 if unset), earliest and latest
+                desired times (interval indices)
+    members     M x MEMBER: offset and length of the member's UTF-8
+                username in the names region. An event's members are
+                consecutive, in the order of their rows.
+    names       usernames of all members, one after another
+    rows        M x ROW_STRIDE bytes, 8-byte aligned. Member i's schedule
+                starts at rows offset + i * ROW_STRIDE and holds MAX_DAYS
+                packed rows of ROW_BYTES bytes each, as made by
+                storage.pack_rows.
+"""
+
+
+import mmap
+import struct
+from datetime import date, datetime, timedelta
+from data import Times, EMPTY_WEEK, EMPTY_CLEARED, MAX_DAYS
+from storage import ROW_BYTES, pack_rows
+from event_data import (find_intersection, find_best_intervals,
+                        time_to_index, index_to_time, np, CUTOFF)
+
+
+MAGIC = b"MEETSCHD"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIQ")
+EVENT = struct.Struct("<qIIIIIIHH4x")
+MEMBER = struct.Struct("<QH6x")
+ROW_STRIDE = MAX_DAYS * ROW_BYTES
+
+
+def write_schedules(path, events):
+    """
+    Write the schedules of all given events to a new file at path.
+
+        Parameters:
+            path (str): path of file to write
+            events ([Event]): events to write
+
+        Returns:
+            None
+    """
+    events = sorted(events, key=lambda e: e.event_id)
+    event_entries = []
+    member_entries = []
+    names = bytearray()
+    rows = []
+    for event in events:
+        create = event.create_time
+        deadline = event.event_deadline
+        event_entries.append(EVENT.pack(
+            event.event_id, len(rows), len(event.availabilities),
+            create.toordinal(),
+            create.hour * 3600 + create.minute * 60 + create.second,
+            event.event_length or 0, deadline.toordinal() if deadline else 0,
+            time_to_index(event.min_time), time_to_index(event.max_time)))
+
+        for username, schedule in event.availabilities.items():
+            name = username.encode()
+            member_entries.append(MEMBER.pack(len(names), len(name)))
+            names += name
+            rows.append(pack_rows(schedule.rows))
+
+    rows_offset = (HEADER.size + EVENT.size * len(event_entries) +
+                   MEMBER.size * len(member_entries) + len(names))
+    padding = -rows_offset % 8
+    rows_offset += padding
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(event_entries),
+                            len(member_entries), 0, rows_offset))
+        f.writelines(event_entries)
+        f.writelines(member_entries)
+        f.write(names)
+        f.write(bytes(padding))
+        f.writelines(rows)
+
+
+class MappedSchedule:
+    """
+    A read only Schedule whose rows are read from a mapped schedule file.
+
+    Attributes
+    ----------
+    username : str
+        username of schedule owner
+    map : mmap.mmap
+        mapping of the schedule file
+    offset : int
+        offset of the schedule's rows in the file
+    weekly : (int)
+        EMPTY_WEEK, as all rows are stored as dated rows
+    cleared : {int : int}
+        EMPTY_CLEARED, as there is no weekly template
+    calendar : Calendar
+        None, as the rows include the user's calendar
+    """
+    weekly = EMPTY_WEEK
+    cleared = EMPTY_CLEARED
+    calendar = None
+
+    def __init__(self, username, map, offset):
+        self.username = username
+        self.map = map
+        self.offset = offset
+
+    @property
+    def times(self):
+        return Times(self)
+
+    @property
+    def rows(self):
+        return [self.row(d) for d in range(MAX_DAYS)]
+
+    def row(self, day):
+        start = self.offset + day * ROW_BYTES
+        return int.from_bytes(self.map[start:start + ROW_BYTES], "little")
+
+    def touched_days(self):
+        return [d for d in range(MAX_DAYS) if self.row(d)]
+
+    def base_days(self):
+        return []
+
+    dated_row = row
+    dated_days = touched_days
+
+
+class MappedEvent:
+    """
+    The settings of an event in a mapped schedule file, as needed to find
+    its best times.
+
+    Attributes
+    ----------
+    event_id : int
+        unique ID of event
+    availabilities : {str : MappedSchedule}
+        dict of username-MappedSchedule pairs of the event's members
+    rows_offset : int
+        offset in the file of the first member's rows, which are followed
+        by the rows of every other member
+    event_length : int
+        length of event in hours, or None
+    event_deadline : datetime.date
+        latest planned date of event, or None
+    create_time : datetime.datetime
+        creation date and time of event
+    min_time : datetime.time
+        desired earliest starting time of event
+    max_time : datetime.time
+        desired latest ending time of event
+    """
+    def __init__(self, event_id, availabilities, rows_offset, event_length,
+                 event_deadline, create_time, min_time, max_time):
+        self.event_id = event_id
+        self.availabilities = availabilities
+        self.rows_offset = rows_offset
+        self.event_length = event_length
+        self.event_deadline = event_deadline
+        self.create_time = create_time
+        self.min_time = min_time
+        self.max_time = max_time
+
+
+class ScheduleFile:
+    """
+    A memory mapped schedule file, made by write_schedules.
+
+    Attributes
+    ----------
+    map : mmap.mmap
+        read only mapping of the file
+    event_count : int
+        number of events in the file
+    member_count : int
+        number of members in the file
+    members_offset : int
+        offset of the members region
+    names_offset : int
+        offset of the names region
+    rows_offset : int
+        offset of the rows region
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.event_count, self.member_count,
+         _, self.rows_offset) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a schedule file")
+
+        self.members_offset = HEADER.size + EVENT.size * self.event_count
+        self.names_offset = (self.members_offset +
+                             MEMBER.size * self.member_count)
+
+    def find_event_entry(self, event_id):
+        """
+        Binary search the event table for event_id, returning its fields,
+        or None if it is not in the file.
+        """
+        low, high = 0, self.event_count
+        while low < high:
+            middle = (low + high) // 2
+            entry = EVENT.unpack_from(self.map,
+                                      HEADER.size + middle * EVENT.size)
+            if entry[0] == event_id:
+                return entry
+            if entry[0] < event_id:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def get_event(self, event_id):
+        """
+        Return the MappedEvent of event_id, or None if it is not in the file.
+        Only the event's own entries are read.
+        """
+        entry = self.find_event_entry(event_id)
+        if entry is None:
+            return None
+
+        (_, first, count, create_ordinal, create_seconds, length,
+         deadline, min_time, max_time) = entry
+        availabilities = {}
+        for i in range(first, first + count):
+            name_offset, name_length = MEMBER.unpack_from(
+                self.map, self.members_offset + i * MEMBER.size)
+            start = self.names_offset + name_offset
+            username = self.map[start:start + name_length].decode()
+            availabilities[username] = MappedSchedule(
+                username, self.map, self.rows_offset + i * ROW_STRIDE)
+
+        create_time = (datetime.fromordinal(create_ordinal) +
+                       timedelta(seconds=create_seconds))
+        return MappedEvent(event_id, availabilities,
+                           self.rows_offset + first * ROW_STRIDE,
+                           length or None,
+                           deadline and date.fromordinal(deadline),
+                           create_time, index_to_time(min_time),
+                           index_to_time(max_time))
+
+    def tally(self, event):
+        """
+        Return the member counts of a MappedEvent, as find_intersection
+        would. With numpy, the rows are counted in place without copying.
+        """
+        if np is None or not event.availabilities:
+            return find_intersection([s.times for s in
+                                      event.availabilities.values()])
+
+        rows = np.frombuffer(self.map, dtype=np.uint8,
+                             count=len(event.availabilities) * ROW_STRIDE,
+                             offset=event.rows_offset)
+        rows = rows.reshape(len(event.availabilities), MAX_DAYS, ROW_BYTES)
+        bits = np.unpackbits(rows, axis=2, bitorder="little")
+        return bits.sum(axis=0, dtype=np.int64).tolist()
+
+    def find_best_times(self, event_id, cutoff=CUTOFF):
+        """
+        Find the best times of event_id as event_data.find_best_times
+        would, reading only that event from the file. Returns None if the
+        event is not in the file.
+        """
+        event = self.get_event(event_id)
+        if event is None:
+            return None
+
+        return find_best_intervals(self.tally(event), cutoff, event)
+
+    def close(self):
+        self.map.close()
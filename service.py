@@ -0,0 +1,107 @@
+"""
+An asyncio interface to the Meeter functions, for serving many clients
+from one event loop
+"""
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from weakref import WeakValueDictionary
+import auth
+import event_admin
+import event_data
+import event_member
+
+
+class MeeterService:
+    """
+    Coroutine versions of the auth, event_admin, event_member and
+    event_data functions. Each call runs in an executor so the event loop
+    is never blocked. Calls for the same event run one at a time, in the
+    order they were made, while calls for different events run at the
+    same time.
+
+    Attributes
+    ----------
+    executor : concurrent.futures.Executor
+        executor the functions run in
+    event_locks : WeakValueDictionary {int : asyncio.Lock}
+        event_id-lock pairs for events with calls running or waiting
+    """
+    def __init__(self, executor=None):
+        self.executor = executor or ThreadPoolExecutor()
+        self.event_locks = WeakValueDictionary()
+
+    async def run(self, f, *args, **kwargs):
+        """
+        Run f(*args, **kwargs) in the executor and return its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          partial(f, *args, **kwargs))
+
+    async def run_for_event(self, event_id, f, *args, **kwargs):
+        """
+        Run f(*args, **kwargs) in the executor once all earlier calls for
+        event_id have finished, and return its result.
+        """
+        lock = self.event_locks.get(event_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.event_locks[event_id] = lock
+
+        async with lock:
+            return await self.run(f, *args, **kwargs)
+
+    async def register(self, username, password, first_name, last_name,
+                       email):
+        return await self.run(auth.register, username, password,
+                              first_name, last_name, email)
+
+    async def log_in(self, username, password):
+        return await self.run(auth.log_in, username, password)
+
+    async def log_out(self, username):
+        return await self.run(auth.log_out, username)
+
+    async def create_event(self, username, title, members,
+                           event_length=None, event_deadline=None):
+        return await self.run(event_admin.create_event, username, title,
+                              members, event_length, event_deadline)
+
+    async def invite_user(self, admin_username, member_username, event_id):
+        return await self.run_for_event(event_id, event_admin.invite_user,
+                                        admin_username, member_username,
+                                        event_id)
+
+    async def edit_availability_weekly(self, username, event_id, edit_mode,
+                                       day, start, end):
+        return await self.run_for_event(
+            event_id, event_member.edit_availability_weekly,
+            username, event_id, edit_mode, day, start, end)
+
+    async def edit_availability_special(self, username, event_id, edit_mode,
+                                        start, end):
+        return await self.run_for_event(
+            event_id, event_member.edit_availability_special,
+            username, event_id, edit_mode, start, end)
+
+    async def edit_availability_daily(self, username, event_id, edit_mode,
+                                      day):
+        return await self.run_for_event(
+            event_id, event_member.edit_availability_daily,
+            username, event_id, edit_mode, day)
+
+    async def edit_availability_batch(self, username, event_id, edits):
+        return await self.run_for_event(
+            event_id, event_member.edit_availability_batch,
+            username, event_id, edits)
+
+    async def find_best_times(self, username, event_id,
+                              cutoff=event_data.CUTOFF):
+        return await self.run_for_event(event_id, event_data.find_best_times,
+                                        username, event_id, cutoff)
+
+    def close(self):
+        self.executor.shutdown()
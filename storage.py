@@ -0,0 +1,315 @@
+"""
+A file containing persistent storage backends for user/event data
+"""
+
+
+import sqlite3
+from datetime import datetime, date, time
+from threading import RLock, local
+from data import (data, Storage, User, Event, EventIndex, Calendar,
+                  MAX_DAYS, INTERVALS, normalise_email)
+
+
+ROW_BYTES = INTERVALS // 8
+ORDINAL_BYTES = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    hash_pwd TEXT NOT NULL,
+    email TEXT NOT NULL,
+    email_key TEXT NOT NULL UNIQUE,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    logged_in INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    admin_username TEXT NOT NULL,
+    event_length INTEGER,
+    event_deadline TEXT,
+    create_time TEXT NOT NULL,
+    min_time TEXT NOT NULL,
+    max_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS members (
+    event_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    rows BLOB,
+    PRIMARY KEY (event_id, username)
+);
+CREATE TABLE IF NOT EXISTS calendars (
+    username TEXT PRIMARY KEY,
+    calendar BLOB NOT NULL
+);
+"""
+
+
+def pack_rows(rows):
+    """
+    Pack a list of MAX_DAYS schedule rows into MAX_DAYS * ROW_BYTES bytes.
+    """
+    return b"".join(row.to_bytes(ROW_BYTES, "little") for row in rows)
+
+
+def unpack_rows(blob, days=MAX_DAYS):
+    """
+    Unpack bytes made by pack_rows into a list of MAX_DAYS (or the given
+    number of) schedule rows.
+    """
+    return [int.from_bytes(blob[d * ROW_BYTES:(d + 1) * ROW_BYTES], "little")
+            for d in range(days)]
+
+
+def pack_schedule(schedule):
+    """
+    Pack a schedule's rows with pack_rows or, if it is laid over a calendar,
+    its own dated rows, cleared rows and weekly template, so that the
+    calendar is stored once with its user.
+    """
+    if schedule.calendar is None:
+        return pack_rows(schedule.rows)
+
+    return (pack_rows([schedule.dated_row(d) for d in range(MAX_DAYS)]) +
+            pack_rows([schedule.cleared.get(d, 0) for d in range(MAX_DAYS)]) +
+            pack_rows(schedule.weekly))
+
+
+def unpack_schedule(blob, schedule):
+    """
+    Set the rows of schedule, which is laid over its user's calendar if
+    they have one, from bytes made by pack_schedule.
+    """
+    rows = unpack_rows(blob, len(blob) // ROW_BYTES)
+    if len(rows) > MAX_DAYS:
+        dated = rows[:MAX_DAYS]
+        cleared = rows[MAX_DAYS:2 * MAX_DAYS]
+        weekly = rows[2 * MAX_DAYS:]
+        if schedule.calendar is not None:
+            schedule.set_layers(weekly, dated, cleared)
+            return
+
+        rows = [dated[d] | weekly[d % 7] & ~cleared[d]
+                for d in range(MAX_DAYS)]
+
+    for d, row in enumerate(rows):
+        if row:
+            schedule.set_row(d, row)
+
+
+def pack_calendar(calendar):
+    """
+    Pack a Calendar into bytes: its 7 weekly rows, then the date ordinal
+    and row of each of its dated rows.
+    """
+    return pack_rows(calendar.weekly) + b"".join(
+        ordinal.to_bytes(ORDINAL_BYTES, "little") +
+        row.to_bytes(ROW_BYTES, "little")
+        for ordinal, row in sorted(calendar.days.items()))
+
+
+def unpack_calendar(blob):
+    """
+    Unpack bytes made by pack_calendar into a Calendar.
+    """
+    calendar = Calendar()
+    weekly = tuple(unpack_rows(blob, 7))
+    if any(weekly):
+        calendar.weekly = weekly
+    size = ORDINAL_BYTES + ROW_BYTES
+    for start in range(7 * ROW_BYTES, len(blob), size):
+        ordinal = int.from_bytes(blob[start:start + ORDINAL_BYTES], "little")
+        calendar.days[ordinal] = int.from_bytes(
+            blob[start + ORDINAL_BYTES:start + size], "little")
+    return calendar
+
+
+def user_record(user):
+    """
+    Return a tuple of the fields of user, as stored by backends.
+    """
+    return (user.username, user.hash_pwd, user.email, user.first_name,
+            user.last_name, int(user.logged_in))
+
+
+def record_user(record, event_ids=(), calendar=None):
+    """
+    Return the User stored as record, made by user_record, who is a member
+    of the given events, in the order they joined, and whose calendar is
+    packed as calendar, or who has none if it is None.
+    """
+    username, hash_pwd, email, first_name, last_name, logged_in = record
+    user = User(username, hash_pwd, email, first_name, last_name)
+    user.logged_in = bool(logged_in)
+    user.joined_event_ids = EventIndex(event_ids)
+    if calendar is not None:
+        user.calendar = unpack_calendar(calendar)
+    return user
+
+
+def event_record(event):
+    """
+    Return a tuple of the fields of event, excluding members, as stored by
+    backends.
+    """
+    deadline = event.event_deadline and event.event_deadline.isoformat()
+    return (event.event_id, event.title, event.admin_username,
+            event.event_length, deadline, event.create_time.isoformat(),
+            event.min_time.isoformat(), event.max_time.isoformat())
+
+
+def record_event(record, members):
+    """
+    Return the Event stored as record, made by event_record, whose members
+    are given as (username, packed schedule) pairs. A member whose packed
+    schedule is None is given no schedule. Schedules are laid over their
+    users' calendars.
+    """
+    (event_id, title, admin_username, event_length, event_deadline,
+     create_time, min_time, max_time) = record
+    event = Event(event_id, title, admin_username)
+    event.event_length = event_length
+    event.event_deadline = (event_deadline and
+                            date.fromisoformat(event_deadline))
+    event.create_time = datetime.fromisoformat(create_time)
+    event.min_time = time.fromisoformat(min_time)
+    event.max_time = time.fromisoformat(max_time)
+
+    for username, blob in members:
+        event.member_usernames.add(username)
+        if blob is None:
+            continue
+
+        user = data.users.get(username)
+        event.add_schedule(username, user and user.calendar)
+        unpack_schedule(blob, event.availabilities[username])
+        event.choose_storage(username)
+
+    event.version = 0
+    return event
+
+
+class SQLiteStorage(Storage):
+    """
+    A persistence backend keeping all data in a SQLite database.
+    Each member's schedule is stored as one packed blob, and each calendar
+    as another.
+
+    Attributes
+    ----------
+    connection : sqlite3.Connection
+        connection to the database, shared by all threads
+    lock : threading.RLock
+        lock serialising use of the connection
+    local : threading.local
+        holds pending, the list of (sql, params) writes made by the thread
+        since its last commit, so that each commit is one transaction of
+        only its own entry point's writes
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = RLock()
+        self.local = local()
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def write(self, sql, params=()):
+        """
+        Hold a write until the calling thread commits.
+        """
+        pending = getattr(self.local, "pending", None)
+        if pending is None:
+            pending = self.local.pending = []
+        pending.append((sql, params))
+
+    def load_user(self, username):
+        rows = self.execute("SELECT username, hash_pwd, email, first_name, "
+                            "last_name, logged_in FROM users "
+                            "WHERE username = ?", (username,))
+        if not rows:
+            return None
+
+        # Members keep their rowid, so rowids are in the order they joined
+        events = self.execute("SELECT event_id FROM members "
+                              "WHERE username = ? ORDER BY rowid",
+                              (username,))
+        calendars = self.execute("SELECT calendar FROM calendars "
+                                 "WHERE username = ?", (username,))
+        return record_user(rows[0], [event_id for event_id, in events],
+                           calendars[0][0] if calendars else None)
+
+    def load_email(self, email):
+        rows = self.execute("SELECT username FROM users WHERE email_key = ?",
+                            (email,))
+        return rows[0][0] if rows else None
+
+    def load_event(self, event_id):
+        rows = self.execute("SELECT * FROM events WHERE event_id = ?",
+                            (event_id,))
+        if not rows:
+            return None
+
+        members = self.execute("SELECT username, rows FROM members "
+                               "WHERE event_id = ?", (event_id,))
+        return record_event(rows[0], members)
+
+    def load_next_event_id(self):
+        return self.execute("SELECT COALESCE(MAX(event_id), 0) + 1 "
+                            "FROM events")[0][0]
+
+    def save_user(self, user):
+        self.write("INSERT OR REPLACE INTO users (username, hash_pwd, "
+                   "email, first_name, last_name, logged_in, email_key) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   user_record(user) + (normalise_email(user.email),))
+
+    def delete_user(self, username):
+        self.write("DELETE FROM users WHERE username = ?", (username,))
+        self.write("DELETE FROM calendars WHERE username = ?", (username,))
+
+    def save_event(self, event):
+        """
+        Save an event's details and its members, without their schedules.
+        """
+        self.write("INSERT OR REPLACE INTO events "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", event_record(event))
+        for username in event.member_usernames:
+            self.write("INSERT OR IGNORE INTO members (event_id, username) "
+                       "VALUES (?, ?)", (event.event_id, username))
+
+    def save_schedule(self, event_id, schedule):
+        self.write("INSERT INTO members VALUES (?, ?, ?) "
+                   "ON CONFLICT (event_id, username) "
+                   "DO UPDATE SET rows = excluded.rows",
+                   (event_id, schedule.username, pack_schedule(schedule)))
+
+    def save_calendar(self, username, calendar):
+        self.write("INSERT OR REPLACE INTO calendars VALUES (?, ?)",
+                   (username, pack_calendar(calendar)))
+
+    def delete_member(self, event_id, username):
+        self.write("DELETE FROM members WHERE event_id = ? AND username = ?",
+                   (event_id, username))
+
+    def commit(self):
+        """
+        Make the writes of the calling thread since its last commit in one
+        transaction.
+        """
+        pending = getattr(self.local, "pending", None)
+        if not pending:
+            return
+
+        self.local.pending = []
+        with self.lock:
+            try:
+                for sql, params in pending:
+                    self.connection.execute(sql, params)
+            except sqlite3.Error:
+                self.connection.rollback()
+                raise
+            self.connection.commit()
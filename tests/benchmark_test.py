@@ -0,0 +1,36 @@
+"""
+Tests for the benchmark suite
+"""
+
+
+import pytest
+from benchmark import run_benchmark, compare, ENTRY_POINTS
+
+
+def test_run_benchmark():
+    """
+    Test a small benchmark run reports every entry point, and that runs
+    with the same seed make the same calls.
+    """
+    first = run_benchmark(members=[3], events=2, fill=0.05, seed=7)
+    second = run_benchmark(members=[3], events=2, fill=0.05, seed=7)
+
+    assert set(first["results"]["3"]) == set(ENTRY_POINTS)
+    for name in ENTRY_POINTS:
+        assert (first["results"]["3"][name]["calls"] ==
+                second["results"]["3"][name]["calls"])
+
+
+def test_compare():
+    """
+    Test that only p50 latencies that grew past the threshold are reported.
+    """
+    config = {"members": [3], "events": 1, "fill": 0.1, "seed": 1}
+    old = {"config": config, "results": {"3": {"register": {"p50_ms": 1.0},
+                                               "invite_user": {"p50_ms": 1.0}}}}
+    new = {"config": config, "results": {"3": {"register": {"p50_ms": 1.1},
+                                               "invite_user": {"p50_ms": 2.0}}}}
+    assert compare(old, new) == [(3, "invite_user", 1.0, 2.0)]
+
+    with pytest.raises(ValueError):
+        compare(old, dict(new, config=dict(config, seed=2)))
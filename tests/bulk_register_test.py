@@ -0,0 +1,87 @@
+"""
+Tests for bulk_register()
+"""
+
+
+import csv
+import io
+import auth
+from auth import bulk_register, log_in, hash_password
+from data import data
+from helpers import create_bot
+
+
+def make_rows(n, start=0):
+    return (("user" + str(i), "abcdef", "Bob", "Smith",
+             "user" + str(i) + "@mail.com") for i in range(start, start + n))
+
+
+def test_success_bulk_register():
+    """
+    Test importing a generator of rows, without logging the users in.
+    """
+    imported, errors = bulk_register(make_rows(50), workers=1)
+    assert (imported, errors) == (50, [])
+    assert len(data.users) == 50
+
+    user = data.users["user7"]
+    assert user.email == "user7@mail.com" and not user.logged_in
+    assert user.hash_pwd == hash_password("abcdef")
+    assert data.emails["user7@mail.com"] == "user7"
+    log_in("user7", "abcdef")
+
+
+def test_row_errors():
+    """
+    Test that invalid and duplicate rows are reported by index without
+    stopping the import.
+    """
+    bot = create_bot()
+    rows = [
+        ("a1", "abcdef", "Bob", "Smith", "a1@mail.com"),
+        ("a2", "abc", "Bob", "Smith", "a2@mail.com"),
+        ("a1", "abcdef", "Bob", "Smith", "other@mail.com"),
+        ("a3", "abcdef", "Bob", "Smith", " A1@MAIL.COM"),
+        (bot.username, "abcdef", "Bob", "Smith", "a4@mail.com"),
+        ("a5", "abcdef", "Bob", "Smith", bot.email),
+        ("a6", "abcdef", "Bob1", "Smith", "a6@mail.com"),
+        ("a7", "abcdef"),
+        ("a8", "abcdef", "Bob", "Smith", "a8@mail.com"),
+    ]
+    imported, errors = bulk_register(rows, workers=1)
+
+    assert imported == 2
+    assert [i for i, _ in errors] == [1, 2, 3, 4, 5, 6, 7]
+    assert str(errors[1][1]) == "Username already in use"
+    assert str(errors[2][1]) == "Email already in use"
+    assert set(data.users) == {bot.username, "a1", "a8"}
+
+
+def test_chunks(monkeypatch):
+    """
+    Test that duplicates are found across chunks, and that row indexes
+    count from the first row.
+    """
+    monkeypatch.setattr(auth, "BULK_CHUNK", 4)
+    rows = list(make_rows(10)) + list(make_rows(3, start=2))
+    imported, errors = bulk_register(rows, workers=1)
+
+    assert imported == 10
+    assert [i for i, _ in errors] == [10, 11, 12]
+
+
+def test_csv_stream():
+    """
+    Test importing a CSV stream with a header through worker processes.
+    """
+    stream = io.StringIO()
+    writer = csv.writer(stream)
+    writer.writerow(auth.BULK_FIELDS)
+    writer.writerows(make_rows(30))
+    writer.writerow(["late", "abcdef", "Bob"])
+    stream.seek(0)
+
+    imported, errors = bulk_register(csv.DictReader(stream), workers=2)
+    assert imported == 30
+    assert [i for i, _ in errors] == [30]
+    assert data.users["user29"].hash_pwd == hash_password("abcdef")
@@ -5,6 +5,7 @@ Fixtures used for testing
 
 import pytest
 from data import data
+from event_data import best_times_cache
 from helpers import create_bot
 from event_admin import create_event, invite_user
 
@@ -17,6 +18,8 @@ def clear():
     data.users = {}
     data.events = {}
     data.reset_codes = {}
+    data.emails = {}
+    best_times_cache.clear()
 
 
 @pytest.fixture
@@ -57,3 +60,16 @@ def event_member():
     event_id = create_event(admin.username, "ABC", [member.username])
     invite_user(admin.username, member.username, event_id)
     return admin, member, event_id
+
+
+@pytest.fixture
+def event_members(request):
+    """
+    Return a new event's ID, its admin, as well as a list of members, by
+    default two. Parametrize indirectly to choose the number of members.
+    """
+    admin = create_bot()
+    members = [create_bot() for _ in range(getattr(request, "param", 2))]
+    event_id = create_event(admin.username, "ABC",
+                            [member.username for member in members])
+    return admin, members, event_id
@@ -0,0 +1,91 @@
+"""
+Tests for the live member counts kept by each Event
+"""
+
+
+from datetime import datetime, date, time, timedelta
+from data import data
+from event_admin import invite_user, remove_user
+from event_data import find_intersection
+from event_member import (edit_availability_weekly, edit_availability_special,
+                          edit_availability_daily, leave_event, MON, WED)
+from helpers import create_bot
+
+
+def expected_counts(event):
+    return find_intersection([s.times for s in event.availabilities.values()])
+
+
+def test_counts_follow_edits(event_member):
+    """
+    Test that counts match a full recount after each kind of edit.
+    """
+    admin, member, event_id = event_member
+    event = data.events[event_id]
+    day = date.today() + timedelta(days=3)
+
+    edit_availability_weekly(admin.username, event_id, True,
+                             MON, time(9), time(17))
+    edit_availability_weekly(member.username, event_id, True,
+                             MON, time(12), time(20))
+    assert event.counts == expected_counts(event)
+
+    edit_availability_daily(member.username, event_id, True, day)
+    edit_availability_special(admin.username, event_id, True,
+                              datetime.combine(day, time(10)),
+                              datetime.combine(day, time(23)))
+    assert event.counts == expected_counts(event)
+
+    edit_availability_weekly(member.username, event_id, False,
+                             WED, time(0), time(23, 30))
+    edit_availability_daily(admin.username, event_id, False, day)
+    assert event.counts == expected_counts(event)
+
+
+def test_counts_follow_members(event):
+    """
+    Test that counts are updated when members are removed or leave.
+    """
+    admin, event_id = event
+    event = data.events[event_id]
+    day = date.today() + timedelta(days=1)
+    bots = [create_bot() for _ in range(3)]
+    for b in bots:
+        invite_user(admin.username, b.username, event_id)
+        edit_availability_daily(b.username, event_id, True, day)
+
+    assert event.counts[1] == [3] * len(event.counts[1])
+
+    remove_user(admin.username, bots[0].username, event_id)
+    leave_event(bots[1].username, event_id)
+    assert event.counts[1] == [1] * len(event.counts[1])
+    assert event.counts == expected_counts(event)
+
+
+def test_weekly_counts(event_member):
+    """
+    Test that weekly edits are counted once per weekday, and only the days
+    overriding a template are counted by day.
+    """
+    admin, member, event_id = event_member
+    event = data.events[event_id]
+    day = date.today() + timedelta(days=3)
+
+    edit_availability_weekly(admin.username, event_id, True,
+                             MON, time(9), time(17))
+    edit_availability_weekly(member.username, event_id, True,
+                             MON, time(12), time(20))
+    assert event.deltas == {}
+    assert sum(map(any, event.weekly_counts)) == 1
+    assert event.counts == expected_counts(event)
+
+    edit_availability_weekly(member.username, event_id, True,
+                             day.weekday(), time(6), time(8))
+    assert event.deltas == {}
+    edit_availability_daily(member.username, event_id, False, day)
+    assert set(event.deltas) == {3}
+    assert event.counts == expected_counts(event)
+
+    leave_event(member.username, event_id)
+    assert event.counts == expected_counts(event)
+    assert not any(event.deltas[3])
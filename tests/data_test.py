@@ -0,0 +1,161 @@
+"""
+Tests for the compact User, Event and Schedule classes
+"""
+
+
+import pytest
+from data import data, User, Event, EventIndex, Schedule, SparseSchedule
+from error import InputError
+from auth import register
+from event_admin import create_event
+from benchmark import measure_memory
+from helpers import create_bot, expect_error, BOT_PASSWORD
+
+
+def test_no_instance_dicts():
+    """
+    Test that users, events and schedules keep no per-instance dict.
+    """
+    objects = [User("a", "hash", "a@b.com", "A", "B"), Event(1, "Title", "a"),
+               Schedule("a"), SparseSchedule("a")]
+    for obj in objects:
+        assert not hasattr(obj, "__dict__")
+        with pytest.raises(AttributeError):
+            obj.extra = 1
+
+
+def test_member_table():
+    """
+    Test that member_usernames and availabilities are views of one table,
+    and that removing a member removes their availabilities from counts.
+    """
+    event = Event(1, "Title", "a")
+    event.member_usernames.add("b")
+    event.add_schedule("c")
+    assert event.members.keys() == {"a", "b", "c"}
+    assert event.member_usernames == {"a", "b", "c"}
+    assert set(event.availabilities) == {"a", "c"}
+    assert "b" in event.member_usernames and "b" not in event.availabilities
+    assert event.availabilities.get("b") is None
+
+    event.availabilities["c"].set_day_intervals(2, 0, 4, True)
+    assert event.counts[2][:5] == [1, 1, 1, 1, 0]
+    event.member_usernames.remove("c")
+    assert event.member_usernames == {"a", "b"}
+    assert event.counts[2][:5] == [0] * 5
+
+    event.remove_schedule("a")
+    assert event.member_usernames == {"a", "b"}
+    assert len(event.availabilities) == 0
+    with pytest.raises(KeyError):
+        event.availabilities["a"]
+
+
+def test_schedule_map_counts():
+    """
+    Test that adding and deleting schedules through availabilities keeps
+    counts up to date.
+    """
+    event = Event(1, "Title", "a")
+    schedule = Schedule("b")
+    schedule.set_weekly(2, 0b1111, True)
+    schedule.set_day_intervals(9, 0, 2, False)
+    schedule.set_day_intervals(3, 10, 12, True)
+    event.availabilities["b"] = schedule
+    assert schedule.event is event
+    assert event.counts == [[schedule.row(d) >> t & 1 for t in range(48)]
+                            for d in range(60)]
+
+    event.availabilities["a"].set_day_intervals(2, 0, 1, True)
+    replacement = Schedule("b")
+    replacement.set_day_intervals(2, 0, 2, True)
+    event.availabilities["b"] = replacement
+    assert event.counts[2][:3] == [2, 1, 0]
+    assert not any(event.counts[9]) and not any(event.counts[3])
+
+    del event.availabilities["b"]
+    del event.availabilities["a"]
+    assert not any(map(any, event.counts))
+    assert event.member_usernames == {"a", "b"}
+
+
+def test_event_index():
+    """
+    Test that the index keeps the events in the order they were added
+    when events are removed, and pages from join sequence numbers.
+    """
+    index = EventIndex([5, 3, 9, 1])
+    index.add(3)
+    assert list(index) == [5, 3, 9, 1]
+    assert index.page(1, 10) == [(9, 2), (1, 3)]
+    assert index.page(None, 2) == [(5, 0), (3, 1)]
+    assert index.page(3, 10) == []
+
+    index.remove(3)
+    index.remove(5)
+    index.remove(1)
+    index.remove(7)
+    assert list(index) == [9] and len(index) == 1
+    index.add(5)
+    assert list(index) == [9, 5] and 3 not in index
+    assert index.page(1, 10) == [(9, 2), (5, 4)]
+    assert index.page(2, 10) == [(5, 4)]
+
+    index.remove(9)
+    index.remove(5)
+    assert list(index) == [] and index.next_seq == 5
+
+
+def test_change_email():
+    """
+    Test changing an email, including to one differing only in case, and
+    that the old email is freed.
+    """
+    bot = create_bot()
+    old_email = bot.email
+    data.change_email(bot.username, old_email.upper())
+    assert bot.email == old_email.upper()
+    assert data.emails[old_email] == bot.username
+
+    data.change_email(bot.username, "changed_" + old_email)
+    assert old_email not in data.emails
+    register("reuser" + bot.username, BOT_PASSWORD, "A", "B", old_email)
+
+
+def test_change_email_in_use():
+    """
+    Test that an email in use by another user, in any case, is refused.
+    """
+    bot = create_bot()
+    other = create_bot()
+    expect_error(data.change_email, InputError, bot.username, other.email)
+    expect_error(data.change_email, InputError, bot.username,
+                 other.email.upper())
+    assert data.emails[bot.email.lower()] == bot.username
+
+
+def test_remove_user():
+    """
+    Test that removing a user frees their username and email, and leaves
+    their event memberships behind.
+    """
+    bot = create_bot()
+    event_id = create_event(bot.username, "ABC", [])
+    data.remove_user(bot.username)
+    assert bot.username not in data.users
+    assert bot.email not in data.emails
+    assert bot.username in data.events[event_id].member_usernames
+
+    register(bot.username, BOT_PASSWORD, "A", "B", bot.email)
+    assert data.users[bot.username] is not bot
+
+
+def test_measure_memory():
+    """
+    Test that a small memory measurement reports memory for both users
+    and events.
+    """
+    result = measure_memory(20, 5)
+    assert result["bytes_per_user"] > 0 and result["bytes_per_event"] > 0
+    assert len(data.events) == 5
+    assert all(len(e.availabilities) == 4 for e in data.events.values())
@@ -0,0 +1,104 @@
+"""
+Tests for edit_availability_batch()
+"""
+
+
+from datetime import datetime, date, time, timedelta
+from data import data
+from error import AuthError, InputError
+from helpers import expect_error
+from auth import log_out
+from event_member import (edit_availability_batch as edit,
+                          edit_availability_weekly, edit_availability_special,
+                          edit_availability_daily, WEEKLY, SPECIAL, DAILY,
+                          MON, FRI)
+
+
+def test_invalid_username():
+    """
+    Test a non-existent username.
+    """
+    expect_error(edit, InputError, "aaa", 1, [])
+
+
+def test_invalid_event(bot):
+    """
+    Test a non-existent event.
+    """
+    expect_error(edit, InputError, bot.username, 1, [])
+
+
+def test_not_member(event, bot):
+    """
+    Test when the user is not a member of the event.
+    """
+    _, event_id = event
+    expect_error(edit, InputError, bot.username, event_id, [])
+
+
+def test_not_logged_in(event):
+    """
+    Test when the user is not logged in.
+    """
+    admin, event_id = event
+    log_out(admin.username)
+    expect_error(edit, AuthError, admin.username, event_id, [])
+
+
+def test_invalid_edit_type(event):
+    """
+    Test an edit that is not weekly, special or daily.
+    """
+    admin, event_id = event
+    expect_error(edit, InputError, admin.username, event_id,
+                 [("monthly", True, 1)])
+
+
+def test_invalid_edit_rolls_back(event):
+    """
+    Test that no edits are applied when one of them is invalid.
+    """
+    admin, event_id = event
+    day = date.today() + timedelta(days=1)
+    edits = [
+        (DAILY, True, day),
+        (WEEKLY, True, MON, time(9), time(12)),
+        (WEEKLY, True, MON, time(12), time(9)),
+    ]
+    expect_error(edit, InputError, admin.username, event_id, edits)
+
+    event = data.events[event_id]
+    assert not any(event.availabilities[admin.username].rows)
+    assert not any(any(day) for day in event.counts)
+
+
+def test_success_edit(event_member):
+    """
+    Test that a batch has the same effect as the single edits in order.
+    """
+    admin, member, event_id = event_member
+    day = date.today() + timedelta(days=3)
+    start = datetime.combine(day, time(10))
+    end = datetime.combine(day + timedelta(days=1), time(2, 30))
+    edits = [
+        (WEEKLY, True, MON, time(9), time(17)),
+        (WEEKLY, True, FRI, time(6), time(23)),
+        (DAILY, False, day),
+        (SPECIAL, True, start, end),
+        (WEEKLY, False, MON, time(12), time(13)),
+    ]
+    edit(member.username, event_id, edits)
+
+    edit_availability_weekly(admin.username, event_id, True,
+                             MON, time(9), time(17))
+    edit_availability_weekly(admin.username, event_id, True,
+                             FRI, time(6), time(23))
+    edit_availability_daily(admin.username, event_id, False, day)
+    edit_availability_special(admin.username, event_id, True, start, end)
+    edit_availability_weekly(admin.username, event_id, False,
+                             MON, time(12), time(13))
+
+    event = data.events[event_id]
+    assert (event.availabilities[member.username].rows ==
+            event.availabilities[admin.username].rows)
+    assert all(c in (0, 2) for day in event.counts for c in day)
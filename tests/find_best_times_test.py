@@ -3,13 +3,19 @@ Tests for find_best_times()
 """
 
 
+import pytest
 from datetime import datetime, date, time, timedelta
-from helpers import expect_error
+from helpers import create_bot, expect_error
 from error import InputError, AuthError
-from data import data
-from event_data import find_best_times, find_intersection, find_best_intervals
+import event_data
+from data import data, Event, INTERVALS
+from event_data import (find_best_times, find_intersection,
+                        find_best_intervals, best_times_cache, ResultCache,
+                        recompute_all_best_times, event_payloads,
+                        find_payload_best_times, map_payload_chunks,
+                        get_search_start)
 from auth import log_out
-from event_admin import edit_event_deadline, edit_event_length
+from event_admin import create_event, edit_event_deadline, edit_event_length
 from event_member import (edit_availability_daily, edit_availability_special)
 
 
@@ -76,3 +82,156 @@ def test_success_find(event_member):
     assert result == [datetime.combine(current, time(14)),
                       datetime.combine(current, time(14, 30)),
                       datetime.combine(date.today() + timedelta(days=3), event.min_time)]
+
+
+def test_large_cutoff_ties(event_member):
+    """
+    Test that a large cutoff keeps every tied candidate, earliest first.
+    """
+    admin, member, event_id = event_member
+    edit_event_deadline(admin.username,
+                        date.today() + timedelta(days=3), event_id)
+    edit_event_length(admin.username, 1, event_id)
+    day = date.today() + timedelta(days=2)
+    edit_availability_daily(admin.username, event_id, True, day)
+    edit_availability_daily(member.username, event_id, True, day)
+
+    event = data.events.get(event_id)
+    result = find_best_times(member.username, event_id, cutoff=100)
+    starts = [datetime.combine(day, event.min_time) + timedelta(minutes=30 * i)
+              for i in range(27)]
+    assert result[:27] == starts
+    assert len(result) > 27
+    assert result[27:] == sorted(result[27:])
+
+
+def test_cache_hit(event_member):
+    """
+    Test that repeated calls are answered from the cache.
+    """
+    _, member, event_id = event_member
+    first = find_best_times(member.username, event_id)
+    second = find_best_times(member.username, event_id)
+
+    assert first == second
+    assert best_times_cache.hits == 1 and best_times_cache.misses == 1
+
+
+def test_cache_invalidated(event_member):
+    """
+    Test that availability and event edits invalidate cached results.
+    """
+    admin, member, event_id = event_member
+    day = date.today() + timedelta(days=4)
+    find_best_times(member.username, event_id)
+
+    edit_availability_daily(admin.username, event_id, True, day)
+    edit_availability_daily(member.username, event_id, True, day)
+    result = find_best_times(member.username, event_id)
+    assert result[0] == datetime.combine(day, time(8))
+
+    edit_event_deadline(admin.username, day - timedelta(days=1), event_id)
+    assert find_best_times(member.username, event_id)[0] != result[0]
+    edit_event_length(admin.username, 1, event_id)
+    find_best_times(member.username, event_id)
+    assert best_times_cache.hits == 0 and best_times_cache.misses == 4
+
+
+def test_cache_reloaded_event(event_member):
+    """
+    Test that results cached for an event are not used once it is reloaded
+    from storage, even if its version is the same.
+    """
+    admin, member, event_id = event_member
+    event = data.events[event_id]
+    find_best_times(member.username, event_id)
+
+    reloaded = Event(event_id, event.title, admin.username)
+    reloaded.create_time = event.create_time
+    reloaded.add_members([member.username])
+    reloaded.schedule(member.username).set_day_intervals(4, 0, INTERVALS,
+                                                         True)
+    reloaded.version = event.version
+    data.events[event_id] = reloaded
+
+    day = date.today() + timedelta(days=4)
+    result = find_best_times(member.username, event_id)
+    assert result[0] == datetime.combine(day, time(8))
+    assert best_times_cache.hits == 0
+
+
+def test_cache_eviction():
+    """
+    Test that the least recently used event is evicted.
+    """
+    cache = ResultCache(2)
+    cache.put(1, "a", [1])
+    cache.put(2, "a", [2])
+    assert cache.get(1, "a") == [1]
+    cache.put(3, "a", [3])
+
+    assert cache.get(2, "a") is None
+    assert cache.get(1, "a") == [1] and cache.get(3, "a") == [3]
+    assert cache.get(3, "b") is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_recompute_all(workers):
+    """
+    Test recomputing the best times of many events at once.
+    """
+    event_ids = []
+    for i in range(5):
+        admin = create_bot()
+        event_id = create_event(admin.username, "ABC", [])
+        edit_event_length(admin.username, i + 1, event_id)
+        edit_availability_daily(admin.username, event_id, True,
+                                date.today() + timedelta(days=i + 2))
+        event_ids.append(event_id)
+
+    result = recompute_all_best_times(event_ids, workers=workers)
+    assert list(result) == event_ids
+    for event_id in event_ids:
+        admin = data.events[event_id].admin_username
+        assert find_best_times(admin, event_id) == result[event_id]
+    assert best_times_cache.hits == 5 and best_times_cache.misses == 0
+
+    expect_error(recompute_all_best_times, InputError, [event_ids[0], -1])
+
+
+def test_event_payloads():
+    """
+    Test that payloads only hold the days anyone is available on.
+    """
+    admin = create_bot()
+    event_id = create_event(admin.username, "ABC", [])
+    edit_availability_daily(admin.username, event_id, True,
+                            date.today() + timedelta(days=3))
+
+    events = {}
+    (payload,) = event_payloads([event_id], 3, get_search_start(), events)
+    assert [d for d, _ in payload[1]] == [3]
+    event = data.events[event_id]
+    assert events == {event_id: (event, event.version)}
+    assert find_payload_best_times(payload) == \
+        (event_id, find_best_times(admin.username, event_id))
+
+
+def test_payload_chunks(monkeypatch):
+    """
+    Test that payloads are taken lazily, a few chunks ahead of the results.
+    """
+    admin = create_bot()
+    event_id = create_event(admin.username, "ABC", [])
+    monkeypatch.setattr(event_data, "RECOMPUTE_CHUNK", 2)
+    taken = []
+
+    def payloads():
+        for i in range(100):
+            taken.append(i)
+            yield from event_payloads([event_id], 3, get_search_start(), {})
+
+    results = map_payload_chunks(payloads(), 1)
+    next(results)
+    assert len(taken) <= (event_data.RECOMPUTE_WINDOW + 1) * 2
+    assert len(list(results)) == 99
@@ -0,0 +1,147 @@
+"""
+Tests for find_earliest_quorum_time()
+"""
+
+
+import pytest
+from datetime import date, datetime, time, timedelta
+from error import InputError, AuthError
+from helpers import expect_error
+from auth import log_out
+from event_admin import edit_event_deadline, edit_event_length
+from event_data import find_earliest_quorum_time as find
+from event_member import edit_availability_special
+
+
+@pytest.fixture
+def quorum_event(event_members):
+    """
+    Return the event of event_members, two hours long.
+    """
+    admin, bots, event_id = event_members
+    edit_event_length(admin.username, 2, event_id)
+    return admin, bots, event_id
+
+
+def available(user, event_id, days, start, end):
+    day = date.today() + timedelta(days=days)
+    edit_availability_special(user.username, event_id, True,
+                              datetime.combine(day, start),
+                              datetime.combine(day, end))
+
+
+def at(days, hour, minute=0):
+    return datetime.combine(date.today() + timedelta(days=days),
+                            time(hour, minute))
+
+
+def test_invalid_username():
+    """
+    Test a non-existent username.
+    """
+    expect_error(find, InputError, "aaa", 1, 1)
+
+
+def test_invalid_event(bot):
+    """
+    Test a non-existent event.
+    """
+    expect_error(find, InputError, bot.username, 1, 1)
+
+
+def test_not_member(event, bot):
+    """
+    Test when the user is not a member of the event.
+    """
+    _, event_id = event
+    expect_error(find, InputError, bot.username, event_id, 1)
+
+
+def test_not_logged_in(event):
+    """
+    Test when the user is not logged in.
+    """
+    admin, event_id = event
+    log_out(admin.username)
+    expect_error(find, AuthError, admin.username, event_id, 1)
+
+
+def test_invalid_quorum(bot, quorum_event):
+    """
+    Test quorums no time can meet.
+    """
+    admin, bots, event_id = quorum_event
+    expect_error(find, InputError, admin.username, event_id, 0)
+    expect_error(find, InputError, admin.username, event_id, 4)
+    expect_error(find, InputError, admin.username, event_id, [])
+    expect_error(find, InputError, admin.username, event_id,
+                 [bots[0].username, bot.username])
+
+
+@pytest.mark.parametrize("event_members", [3], indirect=True)
+def test_count(quorum_event):
+    """
+    Test that the earliest time with enough members is found, even when
+    a later time has more.
+    """
+    admin, bots, event_id = quorum_event
+    available(bots[0], event_id, 3, time(9), time(12))
+    available(bots[1], event_id, 3, time(10), time(12))
+    for bot in bots:
+        available(bot, event_id, 4, time(9), time(12))
+
+    assert find(admin.username, event_id, 2) == at(3, 10)
+    assert find(admin.username, event_id, 1) == at(3, 9)
+    assert find(admin.username, event_id, 3) == at(4, 9)
+    assert find(admin.username, event_id, 4) is None
+
+
+def test_same_members(quorum_event):
+    """
+    Test that members must be available for the whole event, not just
+    enough members in each interval.
+    """
+    admin, bots, event_id = quorum_event
+    # Two members are counted from 9.00 to 11.00, but never the same two
+    available(admin, event_id, 2, time(9), time(10))
+    available(bots[0], event_id, 2, time(9), time(11))
+    available(bots[1], event_id, 2, time(10), time(11))
+    available(bots[1], event_id, 6, time(13), time(15, 30))
+    available(admin, event_id, 6, time(13, 30), time(16))
+
+    assert find(admin.username, event_id, 2) == at(6, 13, 30)
+
+
+@pytest.mark.parametrize("event_members", [3], indirect=True)
+def test_required_members(quorum_event):
+    """
+    Test that every required member must be available.
+    """
+    admin, bots, event_id = quorum_event
+    available(bots[0], event_id, 2, time(9), time(12))
+    available(bots[1], event_id, 2, time(9), time(10))
+    available(bots[1], event_id, 4, time(15), time(18))
+    available(bots[0], event_id, 4, time(8), time(16, 30))
+    available(bots[1], event_id, 5, time(15), time(18))
+    available(bots[0], event_id, 5, time(8), time(17))
+
+    required = [bots[0].username, bots[1].username]
+    assert find(admin.username, event_id, required) == at(5, 15)
+    assert find(admin.username, event_id, [bots[0].username]) == at(2, 9)
+    # bots[2] has no schedule
+    assert find(admin.username, event_id,
+                required + [bots[2].username]) is None
+
+
+@pytest.mark.parametrize("event_members", [1], indirect=True)
+def test_deadline(quorum_event):
+    """
+    Test that times after the deadline are not found.
+    """
+    admin, bots, event_id = quorum_event
+    available(bots[0], event_id, 5, time(9), time(12))
+    assert find(admin.username, event_id, 1) == at(5, 9)
+    edit_event_deadline(admin.username, date.today() + timedelta(days=4),
+                        event_id)
+    assert find(admin.username, event_id, 1) is None
+    assert find(admin.username, event_id, [bots[0].username]) is None
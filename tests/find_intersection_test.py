@@ -0,0 +1,91 @@
+"""
+Tests for find_intersection()
+"""
+
+
+import pytest
+import event_data
+from data import (Schedule, SparseSchedule, convert_schedule, EMPTY_COUNTS,
+                  MAX_DAYS, INTERVALS)
+from event_data import (find_intersection, find_intersection_numpy,
+                        NUMPY_MIN_MEMBERS)
+
+
+def make_schedules(n):
+    """
+    Return n schedules, where schedule i is available on intervals
+    i up to 2i of every day.
+    """
+    schedules = [Schedule(str(i)) for i in range(n)]
+    for i, s in enumerate(schedules):
+        for d in range(MAX_DAYS):
+            s.set_day_intervals(d, i, 2 * i, True)
+
+    return schedules
+
+
+def test_counts():
+    """
+    Test that each entry counts the available members.
+    """
+    schedules = make_schedules(4)
+    result = find_intersection([s.times for s in schedules])
+
+    assert len(result) == MAX_DAYS and len(result[0]) == INTERVALS
+    assert result[5][:8] == [0, 1, 1, 2, 1, 1, 0, 0]
+
+
+def test_schedules_unchanged():
+    """
+    Test that the given schedules are not modified.
+    """
+    schedules = make_schedules(3)
+    rows = [s.rows[:] for s in schedules]
+    find_intersection([s.times for s in schedules])
+
+    assert [s.rows for s in schedules] == rows
+
+
+def test_sparse_schedules():
+    """
+    Test that sparse and dense schedules are counted the same way.
+    """
+    schedules = make_schedules(6)
+    sparse = [convert_schedule(s, SparseSchedule) for s in schedules[3:]]
+    mixed = schedules[:3] + sparse
+
+    assert (find_intersection([s.times for s in mixed]) ==
+            find_intersection([s.times for s in schedules]))
+
+
+def test_numpy_matches(monkeypatch):
+    """
+    Test that the numpy engine gives the same result.
+    """
+    pytest.importorskip("numpy")
+    times = [s.times for s in make_schedules(20)]
+    result = find_intersection_numpy(times)
+
+    monkeypatch.setattr(event_data, "np", None)
+    assert result == find_intersection(times)
+
+
+def test_untouched_days_skipped(monkeypatch):
+    """
+    Test that days no member is available on are left as EMPTY_COUNTS by
+    both engines.
+    """
+    schedules = [Schedule(str(i)) for i in range(NUMPY_MIN_MEMBERS)]
+    schedules[0].set_day_intervals(7, 2, 4, True)
+    schedules[1] = convert_schedule(schedules[1], SparseSchedule)
+    schedules[1].set_intervals(7 * INTERVALS + 3, 8 * INTERVALS + 1, True)
+    times = [s.times for s in schedules]
+
+    results = [find_intersection(times)]
+    monkeypatch.setattr(event_data, "np", None)
+    results.append(find_intersection(times))
+    for result in results:
+        assert [d for d in range(MAX_DAYS)
+                if result[d] is not EMPTY_COUNTS] == [7, 8]
+        assert result[7][:5] == [0, 0, 1, 2, 1]
+        assert result[8][:2] == [1, 0]
@@ -0,0 +1,80 @@
+"""
+Tests for invite_users()
+"""
+
+
+from datetime import date, timedelta
+from data import data
+from error import AuthError, InputError
+from helpers import expect_error, create_bot
+from event_admin import create_event, invite_users
+from event_member import edit_availability_daily
+from auth import log_out
+
+
+def test_invalid_member(event, bot):
+    """
+    Test that nobody is invited when one username does not exist.
+    """
+    admin, event_id = event
+    expect_error(invite_users, InputError,
+                 admin.username, [bot.username, "aaa"], event_id)
+    assert data.events[event_id].member_usernames == {admin.username}
+    assert not bot.joined_event_ids
+
+
+def test_not_admin(event, bot):
+    """
+    Test when the inviter is not the event admin.
+    """
+    _, event_id = event
+    expect_error(invite_users, AuthError,
+                 bot.username, [bot.username], event_id)
+
+
+def test_not_logged_in(event, bot):
+    """
+    Test when the admin is not logged in.
+    """
+    admin, event_id = event
+    log_out(admin.username)
+    expect_error(invite_users, AuthError,
+                 admin.username, [bot.username], event_id)
+
+
+def test_success_invite(event):
+    """
+    Test inviting many users, including repeats and existing members,
+    who get a schedule once they edit.
+    """
+    admin, event_id = event
+    bots = [create_bot() for _ in range(5)]
+    usernames = [b.username for b in bots]
+    invite_users(admin.username, usernames + usernames[:2] + [admin.username],
+                 event_id)
+
+    event = data.events[event_id]
+    assert event.member_usernames == set(usernames) | {admin.username}
+    assert set(event.availabilities) == {admin.username}
+    for b in bots:
+        assert list(b.joined_event_ids) == [event_id]
+    assert list(admin.joined_event_ids) == [event_id]
+
+    day = date.today() + timedelta(days=2)
+    edit_availability_daily(usernames[0], event_id, True, day)
+    assert set(event.availabilities) == {admin.username, usernames[0]}
+    assert max(max(d) for d in event.counts) == 1
+
+
+def test_create_event_members(bot):
+    """
+    Test that members added by create_event join the event and can edit.
+    """
+    admin = create_bot()
+    event_id = create_event(admin.username, "ABC", [bot.username])
+    assert list(admin.joined_event_ids) == [event_id]
+    assert list(bot.joined_event_ids) == [event_id]
+
+    edit_availability_daily(bot.username, event_id, True,
+                            date.today() + timedelta(days=1))
+    assert bot.username in data.events[event_id].availabilities
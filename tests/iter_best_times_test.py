@@ -0,0 +1,124 @@
+"""
+Tests for iter_best_times()
+"""
+
+
+import pytest
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from data import data, DEFAULT_LENGTH
+from error import InputError, AuthError
+from helpers import expect_error
+from auth import log_out
+from event_admin import edit_event_deadline
+from event_data import iter_best_times, find_best_times, get_search_start
+from event_member import edit_availability_daily, edit_availability_special
+
+
+@pytest.fixture
+def ranked_event(event_members):
+    """
+    Return the admin and ID of the event of event_members, with members
+    available at overlapping times.
+    """
+    admin, members, event_id = event_members
+    edit_event_deadline(admin.username, date.today() + timedelta(days=10),
+                        event_id)
+    for i, member in enumerate(members):
+        day = date.today() + timedelta(days=3)
+        start = datetime.combine(day, time(9 + i))
+        edit_availability_special(member.username, event_id, True,
+                                  start, start + timedelta(hours=4))
+    edit_availability_daily(admin.username, event_id, True,
+                            date.today() + timedelta(days=5))
+    return admin, event_id
+
+
+def test_invalid_username():
+    """
+    Test a non-existent username.
+    """
+    expect_error(iter_best_times, InputError, "aaa", 1)
+
+
+def test_invalid_event(bot):
+    """
+    Test a non-existent event.
+    """
+    expect_error(iter_best_times, InputError, bot.username, 1)
+
+
+def test_not_member(event, bot):
+    """
+    Test when the user is not a member of the event, which is raised
+    before any time is taken.
+    """
+    _, event_id = event
+    expect_error(iter_best_times, InputError, bot.username, event_id)
+
+
+def test_not_logged_in(event):
+    """
+    Test when the user is not logged in.
+    """
+    admin, event_id = event
+    log_out(admin.username)
+    expect_error(iter_best_times, AuthError, admin.username, event_id)
+
+
+@pytest.mark.parametrize("event_members", [3], indirect=True)
+def test_matches_find_best_times(ranked_event):
+    """
+    Test that the first times are those find_best_times finds, for any
+    cutoff.
+    """
+    admin, event_id = ranked_event
+    for cutoff in (1, 3, 10, 50):
+        assert list(islice(iter_best_times(admin.username, event_id),
+                           cutoff)) == \
+            find_best_times(admin.username, event_id, cutoff)
+
+
+@pytest.mark.parametrize("event_members", [3], indirect=True)
+def test_all_times(ranked_event):
+    """
+    Test that every start time is given once, from the best score to the
+    worst, and earliest first among equal scores.
+    """
+    admin, event_id = ranked_event
+    event = data.events[event_id]
+    times = list(iter_best_times(admin.username, event_id))
+    assert len(times) == len(set(times))
+    assert min(times) >= get_search_start()
+    assert max(times).date() <= event.event_deadline
+
+    def score(start):
+        d = (start.date() - event.create_time.date()).days
+        t = start.hour * 2 + start.minute // 30
+        return sum(event.counts[d][t:t + DEFAULT_LENGTH * 2])
+
+    ranked = [(-score(start), start) for start in times]
+    assert ranked == sorted(ranked)
+    # 10.00, 10.30 and 11.00 all overlap 16 member intervals
+    day = date.today() + timedelta(days=3)
+    assert times[:3] == [datetime.combine(day, time(10)),
+                         datetime.combine(day, time(10, 30)),
+                         datetime.combine(day, time(11))]
+
+
+@pytest.mark.parametrize("event_members", [3], indirect=True)
+def test_lazy_snapshot(ranked_event):
+    """
+    Test that times taken after a later change still come from the event
+    as it was when iter_best_times was called.
+    """
+    admin, event_id = ranked_event
+    times = iter_best_times(admin.username, event_id)
+    first = next(times)
+    edit_availability_daily(admin.username, event_id, False,
+                            date.today() + timedelta(days=5))
+    edit_availability_daily(admin.username, event_id, True,
+                            date.today() + timedelta(days=7))
+    assert all(start.date() != date.today() + timedelta(days=7)
+               for start in islice(times, 20))
+    assert first == next(iter_best_times(admin.username, event_id))
@@ -0,0 +1,223 @@
+"""
+Tests for JournalStorage
+"""
+
+
+import os
+import threading
+import time
+import pytest
+import journal
+from datetime import date, timedelta
+from data import data, Storage, User, FULL_DAY
+from journal import JournalStorage, LOG_FILE, PREVIOUS_LOG_FILE, \
+    SNAPSHOT_FILE
+from auth import log_out
+from event_admin import create_event, invite_user, remove_user
+from event_data import find_best_times
+from event_member import edit_availability_daily
+from personal_calendar import edit_calendar_daily
+from helpers import create_bot
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    """
+    Use a journal in a new directory for storage, and stop using it
+    afterwards.
+    """
+    directory = str(tmp_path)
+    data.use_storage(JournalStorage(directory))
+    yield directory
+    data.storage.close()
+    data.use_storage(Storage())
+
+
+def restart(directory):
+    """
+    Close the journal and recover from its files, as after a restart.
+    """
+    data.storage.close()
+    data.use_storage(JournalStorage(directory))
+
+
+def make_event():
+    admin = create_bot()
+    member = create_bot()
+    event_id = create_event(admin.username, "ABC", [])
+    invite_user(admin.username, member.username, event_id)
+    for d in range(2, 6):
+        edit_availability_daily(member.username, event_id, True,
+                                date.today() + timedelta(days=d))
+    return admin, member, event_id
+
+
+def test_replay(journal_dir):
+    """
+    Test that a restart replays every change.
+    """
+    admin, member, event_id = make_event()
+    extra = create_bot()
+    invite_user(admin.username, extra.username, event_id)
+    remove_user(admin.username, extra.username, event_id)
+    log_out(extra.username)
+    before = find_best_times(member.username, event_id)
+    counts = data.events[event_id].counts
+    second = create_event(admin.username, "DEF", [member.username])
+
+    restart(journal_dir)
+    assert find_best_times(member.username, event_id) == before
+    assert data.events[event_id].counts == counts
+    assert extra.username not in data.events[event_id].member_usernames
+    assert not data.users[extra.username].logged_in
+    assert data.emails[extra.email] == extra.username
+    assert list(data.users[member.username].joined_event_ids) == \
+        [event_id, second]
+    assert list(data.users[admin.username].joined_event_ids) == \
+        [event_id, second]
+    assert list(data.users[extra.username].joined_event_ids) == []
+
+
+def test_snapshot(journal_dir, monkeypatch):
+    """
+    Test that a long log is compacted into a snapshot, and that the
+    snapshot and the log written after it are both recovered.
+    """
+    monkeypatch.setattr(journal, "SNAPSHOT_RECORDS", 10)
+    admin, member, event_id = make_event()
+    data.storage.flush()
+    assert os.path.exists(os.path.join(journal_dir, SNAPSHOT_FILE))
+    assert data.storage.log_records < 10
+
+    late = create_bot()
+    restart(journal_dir)
+    assert data.events[event_id].member_usernames == {admin.username,
+                                                      member.username}
+    assert data.users[late.username].logged_in
+    assert list(data.users[member.username].joined_event_ids) == [event_id]
+
+
+def test_background_sync(journal_dir, monkeypatch):
+    """
+    Test that a lone commit is fsynced within FSYNC_SECONDS seconds,
+    without any later commit.
+    """
+    monkeypatch.setattr(journal, "FSYNC_SECONDS", 0.05)
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync",
+                        lambda fd: synced.append(fd) or fsync(fd))
+
+    create_bot()
+    assert data.storage.unsynced == 1
+    time.sleep(0.5)
+    assert data.storage.unsynced == 0
+    assert synced
+
+
+def test_background_snapshot(journal_dir, monkeypatch):
+    """
+    Test that snapshots are written by the flusher, not by the commit that
+    makes one due.
+    """
+    monkeypatch.setattr(journal, "SNAPSHOT_RECORDS", 10)
+    threads = []
+    write_snapshot = JournalStorage.write_snapshot
+
+    def record_thread(self, snapshot):
+        threads.append(threading.current_thread())
+        write_snapshot(self, snapshot)
+
+    monkeypatch.setattr(JournalStorage, "write_snapshot", record_thread)
+    make_event()
+    data.storage.flush()
+    assert threads
+    assert threading.current_thread() not in threads
+
+
+def test_previous_log(journal_dir):
+    """
+    Test that a log left by a crash while a snapshot was written is
+    recovered and compacted.
+    """
+    admin, member, event_id = make_event()
+    data.storage.close()
+    os.replace(os.path.join(journal_dir, LOG_FILE),
+               os.path.join(journal_dir, PREVIOUS_LOG_FILE))
+
+    data.use_storage(JournalStorage(journal_dir))
+    assert not os.path.exists(os.path.join(journal_dir, PREVIOUS_LOG_FILE))
+    assert os.path.exists(os.path.join(journal_dir, SNAPSHOT_FILE))
+    assert data.storage.log_records == 0
+
+    restart(journal_dir)
+    assert data.events[event_id].member_usernames == {admin.username,
+                                                      member.username}
+
+
+def test_commit_per_thread(journal_dir):
+    """
+    Test that a commit only makes the writes of its own thread permanent.
+    """
+    storage = data.storage
+    mine = User("mine", "hash", "mine@b.com", "A", "B")
+    theirs = User("theirs", "hash", "theirs@b.com", "A", "B")
+    thread = threading.Thread(target=storage.save_user, args=(theirs,))
+    thread.start()
+    thread.join()
+    storage.save_user(mine)
+    storage.commit()
+
+    restart(journal_dir)
+    assert data.users.get("mine") is not None
+    assert data.users.get("theirs") is None
+
+
+def test_replay_lone_event(journal_dir):
+    """
+    Test that an event created without other members is recovered, and
+    its ID is not handed out again.
+    """
+    admin = create_bot()
+    event_id = create_event(admin.username, "ABC", [])
+
+    restart(journal_dir)
+    event = data.events.get(event_id)
+    assert event is not None
+    assert event.member_usernames == {admin.username}
+    assert data.event_next_id == event_id + 1
+
+
+def test_torn_record(journal_dir):
+    """
+    Test that a record cut short by a crash is dropped.
+    """
+    bot = create_bot()
+    data.storage.close()
+    path = os.path.join(journal_dir, LOG_FILE)
+    with open(path, "ab") as f:
+        f.write(b"\x50\x00\x00\x00\x01\x02")
+
+    data.use_storage(JournalStorage(journal_dir))
+    assert data.users[bot.username].logged_in
+    size = os.path.getsize(path)
+    create_bot()
+    assert os.path.getsize(path) > size
+
+
+def test_replay_calendar(journal_dir, monkeypatch):
+    """
+    Test that calendars are recovered from the snapshot and the log.
+    """
+    monkeypatch.setattr(journal, "SNAPSHOT_RECORDS", 10)
+    admin, member, event_id = make_event()
+    day = date.today() + timedelta(days=7)
+    edit_calendar_daily(member.username, True, day)
+    edit_calendar_daily(admin.username, True, day)
+    counts = data.events[event_id].counts
+
+    restart(journal_dir)
+    assert data.users[member.username].calendar.days == \
+        {day.toordinal(): FULL_DAY}
+    assert data.events[event_id].counts == counts
+    assert counts[7] == [2] * 48
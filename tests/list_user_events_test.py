@@ -0,0 +1,127 @@
+"""
+Tests for list_user_events()
+"""
+
+
+from data import data
+from error import InputError, AuthError
+from helpers import expect_error, create_bot
+from auth import log_out
+from event_admin import create_event, invite_user, remove_user
+from event_data import list_user_events
+from event_member import leave_event
+
+
+def make_events(user, count):
+    admin = create_bot()
+    event_ids = []
+    for i in range(count):
+        event_id = create_event(admin.username, "Event " + str(i), [])
+        invite_user(admin.username, user.username, event_id)
+        event_ids.append(event_id)
+    return admin, event_ids
+
+
+def list_all(username, limit):
+    event_ids = []
+    cursor = None
+    while True:
+        events, cursor = list_user_events(username, cursor, limit)
+        event_ids += [event["event_id"] for event in events]
+        if cursor is None:
+            return event_ids
+
+
+def test_invalid_username():
+    """
+    Test a non-existent username.
+    """
+    expect_error(list_user_events, InputError, "a")
+
+
+def test_not_logged_in(bot):
+    """
+    Test when the user is not logged in.
+    """
+    log_out(bot.username)
+    expect_error(list_user_events, AuthError, bot.username)
+
+
+def test_invalid_page(bot):
+    """
+    Test an invalid limit and cursors never given to the user.
+    """
+    make_events(bot, 1)
+    expect_error(list_user_events, InputError, bot.username, None, 0)
+    expect_error(list_user_events, InputError, bot.username, 1)
+    expect_error(list_user_events, InputError, bot.username, -1)
+
+
+def test_no_events(bot):
+    """
+    Test a user who is not in any event.
+    """
+    assert list_user_events(bot.username) == ([], None)
+
+
+def test_summary(event):
+    """
+    Test the details given for each event.
+    """
+    admin, event_id = event
+    event = data.events[event_id]
+    events, cursor = list_user_events(admin.username)
+    assert cursor is None
+    assert events == [{
+        "event_id": event_id,
+        "title": "ABC",
+        "admin": admin.username,
+        "create_time": event.create_time,
+        "length": event.event_length,
+        "deadline": event.event_deadline,
+    }]
+
+
+def test_pages(bot):
+    """
+    Test that paging visits every event once in the order they were joined,
+    and that a full last page has no next cursor.
+    """
+    _, event_ids = make_events(bot, 7)
+    assert list_all(bot.username, 3) == event_ids
+    assert list_all(bot.username, 7) == event_ids
+    assert list_all(bot.username, 100) == event_ids
+
+    events, cursor = list_user_events(bot.username, None, 7)
+    assert len(events) == 7 and cursor is None
+
+
+def test_leave_and_remove(bot):
+    """
+    Test that events left or removed from are no longer listed, and that
+    rejoining an event lists it last.
+    """
+    admin, event_ids = make_events(bot, 4)
+    leave_event(bot.username, event_ids[1])
+    remove_user(admin.username, bot.username, event_ids[2])
+    assert list_all(bot.username, 1) == [event_ids[0], event_ids[3]]
+    assert list(data.users[bot.username].joined_event_ids) == \
+        [event_ids[0], event_ids[3]]
+
+    invite_user(admin.username, bot.username, event_ids[1])
+    assert list_all(bot.username, 2) == [event_ids[0], event_ids[3],
+                                         event_ids[1]]
+
+
+def test_cursor_left(bot):
+    """
+    Test that paging goes on from the cursor of an event the user has since
+    left.
+    """
+    _, event_ids = make_events(bot, 3)
+    events, cursor = list_user_events(bot.username, None, 1)
+    leave_event(bot.username, events[0]["event_id"])
+    events, cursor = list_user_events(bot.username, cursor, 1)
+    assert events[0]["event_id"] == event_ids[1]
+    leave_event(bot.username, event_ids[2])
+    assert list_user_events(bot.username, cursor, 1) == ([], None)
@@ -0,0 +1,135 @@
+"""
+Tests for thread safety of event entry points
+"""
+
+
+import sys
+import time
+from datetime import date, timedelta
+from threading import Thread
+from data import data, RWLock
+from event_admin import create_event, invite_user, remove_user
+from event_data import find_best_times, find_intersection, list_user_events
+from event_member import edit_availability_daily
+from helpers import create_bot
+
+
+def run_threads(targets):
+    """
+    Run each function in targets in its own thread, returning any
+    exceptions raised.
+    """
+    errors = []
+
+    def run(f):
+        try:
+            f()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [Thread(target=run, args=(f,)) for f in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def test_readers_share_lock():
+    """
+    Test that readers can hold the lock at the same time, but a writer
+    waits for them.
+    """
+    lock = RWLock()
+    acquired = []
+
+    def take(kind):
+        with getattr(lock, kind)():
+            acquired.append(kind)
+
+    with lock.read():
+        reader = Thread(target=take, args=("read",))
+        reader.start()
+        reader.join()
+        writer = Thread(target=take, args=("write",))
+        writer.start()
+        writer.join(0.05)
+        assert acquired == ["read"]
+
+    writer.join()
+    assert acquired == ["read", "write"]
+
+
+def test_unique_event_ids(bot):
+    """
+    Test that events created at the same time get different IDs.
+    """
+    ids = []
+    errors = run_threads([lambda: ids.append(create_event(bot.username,
+                                                          "ABC", []))
+                          for _ in range(50)])
+    assert not errors
+    assert len(set(ids)) == 50
+
+
+def test_concurrent_invite_and_find(event):
+    """
+    Test inviting, editing and finding best times in one event at once.
+    """
+    admin, event_id = event
+    bots = [create_bot() for _ in range(30)]
+    day = date.today() + timedelta(days=2)
+
+    def join(bot):
+        invite_user(admin.username, bot.username, event_id)
+        edit_availability_daily(bot.username, event_id, True, day)
+
+    def poll():
+        for _ in range(20):
+            find_best_times(admin.username, event_id)
+
+    targets = [lambda b=b: join(b) for b in bots] + [poll] * 5
+    targets += [lambda b=b: remove_user(admin.username, b.username, event_id)
+                for b in bots[:10]]
+    assert all(type(e).__name__ == "InputError"
+               for e in run_threads(targets))
+
+    event = data.events[event_id]
+    schedules = [s.times for s in event.availabilities.values()]
+    assert event.counts == find_intersection(schedules)
+
+
+def test_concurrent_membership_and_paging(bot):
+    """
+    Test that a user's events can be paged through while the user is
+    invited to and removed from events by other threads.
+    """
+    # Switch threads often, so they interleave within index operations
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    admin = create_bot()
+    event_ids = [create_event(admin.username, "ABC", [bot.username])
+                 for _ in range(50)]
+    stop = time.monotonic() + 0.5
+
+    def page():
+        while time.monotonic() < stop:
+            cursor = None
+            while True:
+                events, cursor = list_user_events(bot.username, cursor, 3)
+                if cursor is None:
+                    break
+
+    def change(event_ids):
+        while time.monotonic() < stop:
+            for event_id in event_ids:
+                remove_user(admin.username, bot.username, event_id)
+                invite_user(admin.username, bot.username, event_id)
+
+    try:
+        errors = run_threads([page, page, lambda: change(event_ids[::2]),
+                              lambda: change(event_ids[1::2])])
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert sorted(data.users[bot.username].joined_event_ids) == event_ids
@@ -0,0 +1,209 @@
+"""
+Tests for edit_calendar_weekly(), edit_calendar_special() and
+edit_calendar_daily()
+"""
+
+
+from datetime import date, datetime, time, timedelta
+from data import data, FULL_DAY, interval_mask
+from error import AuthError, InputError
+from helpers import expect_error, create_bot
+from auth import log_out
+from event_admin import create_event, invite_user, remove_user
+from event_data import find_best_times, find_intersection
+from event_member import (edit_availability_daily, edit_availability_weekly,
+                          leave_event)
+from personal_calendar import (edit_calendar_weekly, edit_calendar_special,
+                               edit_calendar_daily, CALENDAR_DAYS)
+
+
+def check_counts(event_id):
+    """
+    Check that an event's counts match its members' schedules.
+    """
+    event = data.events[event_id]
+    times = [schedule.times for schedule in event.availabilities.values()]
+    assert event.counts == find_intersection(times)
+
+
+def test_invalid_username():
+    """
+    Test a non-existent username.
+    """
+    expect_error(edit_calendar_daily, InputError, "a", True, date.today())
+
+
+def test_not_logged_in(bot):
+    """
+    Test when the user is not logged in.
+    """
+    log_out(bot.username)
+    expect_error(edit_calendar_weekly, AuthError, bot.username, True, 0,
+                 time(9), time(10))
+
+
+def test_invalid_edits(bot):
+    """
+    Test invalid days and times.
+    """
+    today = date.today()
+    now = datetime.combine(today, time(12))
+    expect_error(edit_calendar_weekly, InputError, bot.username, True, 7,
+                 time(9), time(10))
+    expect_error(edit_calendar_weekly, InputError, bot.username, True, 0,
+                 time(10), time(10))
+    expect_error(edit_calendar_daily, InputError, bot.username, True,
+                 today - timedelta(days=1))
+    expect_error(edit_calendar_daily, InputError, bot.username, True,
+                 today + timedelta(days=CALENDAR_DAYS))
+    expect_error(edit_calendar_special, InputError, bot.username, True,
+                 now, now)
+    expect_error(edit_calendar_special, InputError, bot.username, True,
+                 now - timedelta(days=1), now)
+    expect_error(edit_calendar_special, InputError, bot.username, True,
+                 now, now + timedelta(days=CALENDAR_DAYS + 1))
+    assert bot.calendar is None
+
+
+def test_shared(bot):
+    """
+    Test that one calendar edit reaches every event of the user, including
+    events where the user has no schedule yet, and only those.
+    """
+    admin = create_bot()
+    own_event = create_event(bot.username, "A", [])
+    invited = create_event(admin.username, "B", [bot.username])
+    other = create_event(admin.username, "C", [])
+    versions = {event_id: data.events[event_id].version
+                for event_id in (own_event, invited, other)}
+
+    day = date.today() + timedelta(days=3)
+    edit_calendar_daily(bot.username, True, day)
+    for event_id in (own_event, invited):
+        event = data.events[event_id]
+        assert event.counts[3] == [1] * 48
+        assert event.version > versions[event_id]
+        assert event.availabilities[bot.username].calendar is bot.calendar
+        check_counts(event_id)
+    assert data.events[other].version == versions[other]
+    assert bot.username not in data.events[other].availabilities
+
+    edit_calendar_daily(bot.username, False, day)
+    assert data.events[invited].counts[3] == [0] * 48
+    check_counts(invited)
+
+
+def test_weekly(bot):
+    """
+    Test that a weekly calendar edit is made on the right days of events
+    created on different days of the week.
+    """
+    first = create_event(bot.username, "A", [])
+    second = create_event(bot.username, "B", [])
+    data.events[second].create_time -= timedelta(days=2)
+    weekday = (date.today() + timedelta(days=1)).weekday()
+    edit_calendar_weekly(bot.username, True, weekday, time(9), time(11))
+
+    mask = interval_mask(18, 22)
+    for event_id, day in ((first, 1), (second, 3)):
+        event = data.events[event_id]
+        schedule = event.availabilities[bot.username]
+        assert [d for d in range(60) if schedule.row(d)] == \
+            list(range(day, 60, 7))
+        assert schedule.row(day) == mask
+        check_counts(event_id)
+
+    found = find_best_times(bot.username, first)
+    assert found[0].date() == date.today() + timedelta(days=1)
+
+
+def test_event_overrides(bot):
+    """
+    Test that changes made for one event override the calendar there only,
+    and stay when the calendar changes.
+    """
+    first = create_event(bot.username, "A", [])
+    second = create_event(bot.username, "B", [])
+    weekday = (date.today() + timedelta(days=2)).weekday()
+    edit_calendar_weekly(bot.username, True, weekday, time(9), time(12))
+
+    day = date.today() + timedelta(days=2)
+    edit_availability_daily(bot.username, first, False, day)
+    edit_availability_weekly(bot.username, first, True, weekday,
+                             time(14), time(15))
+    schedule = data.events[first].availabilities[bot.username]
+    assert schedule.row(2) == interval_mask(28, 30)
+    assert schedule.row(9) == interval_mask(18, 24) | interval_mask(28, 30)
+    assert data.events[second].availabilities[bot.username].row(2) == \
+        interval_mask(18, 24)
+
+    edit_calendar_weekly(bot.username, True, weekday, time(8), time(9))
+    assert schedule.row(2) == interval_mask(28, 30)
+    assert schedule.row(9) == interval_mask(16, 24) | interval_mask(28, 30)
+    assert data.events[second].availabilities[bot.username].row(2) == \
+        interval_mask(16, 24)
+
+    edit_availability_weekly(bot.username, first, False, weekday,
+                             time(8), time(10))
+    assert schedule.row(9) == interval_mask(20, 24) | interval_mask(28, 30)
+    for event_id in (first, second):
+        check_counts(event_id)
+
+
+def test_special(bot):
+    """
+    Test a special calendar edit spanning midnight.
+    """
+    event_id = create_event(bot.username, "A", [])
+    start = datetime.combine(date.today() + timedelta(days=4), time(23))
+    edit_calendar_special(bot.username, True, start,
+                          start + timedelta(hours=2))
+    schedule = data.events[event_id].availabilities[bot.username]
+    assert schedule.row(4) == interval_mask(46, 48)
+    assert schedule.row(5) == interval_mask(0, 2)
+    check_counts(event_id)
+
+
+def test_membership(bot):
+    """
+    Test that users joining an event bring their calendar, and leaving
+    or being removed takes it away.
+    """
+    admin = create_bot()
+    first = create_event(admin.username, "A", [])
+    second = create_event(admin.username, "B", [])
+    day = date.today() + timedelta(days=5)
+    edit_calendar_daily(bot.username, True, day)
+
+    invite_user(admin.username, bot.username, first)
+    invite_user(admin.username, bot.username, second)
+    own_event = create_event(bot.username, "C", [])
+    for event_id in (first, second, own_event):
+        assert data.events[event_id].counts[5] == [1] * 48
+        check_counts(event_id)
+
+    leave_event(bot.username, first)
+    remove_user(admin.username, bot.username, second)
+    for event_id in (first, second):
+        assert data.events[event_id].counts[5] == [0] * 48
+        check_counts(event_id)
+
+    edit_calendar_daily(bot.username, False, day)
+    assert data.events[own_event].counts[5] == [0] * 48
+
+
+def test_thin_schedules(bot):
+    """
+    Test that a calendar is stored once, however many events it is used in.
+    """
+    admin = create_bot()
+    event_ids = [create_event(admin.username, "A", [bot.username])
+                 for _ in range(5)]
+    edit_calendar_weekly(bot.username, True, 0, time(9), time(17))
+    edit_calendar_daily(bot.username, True, date.today() + timedelta(days=1))
+    for event_id in event_ids:
+        schedule = data.events[event_id].availabilities[bot.username]
+        assert not any(schedule.weekly) and not schedule.cleared
+        assert schedule.run_count() == 0
+        assert bot.calendar.days == {
+            (date.today() + timedelta(days=1)).toordinal(): FULL_DAY}
@@ -0,0 +1,91 @@
+"""
+Tests for the profiling hooks
+"""
+
+
+import json
+import os
+import pstats
+import pytest
+from profiling import profiler, enable, disable, dump
+from event_data import find_best_times
+
+
+@pytest.fixture
+def profiling_off():
+    yield
+    disable()
+    profiler.reset()
+
+
+def test_disabled(profiling_off, event):
+    """
+    Test that nothing is recorded until profiling is enabled.
+    """
+    admin, event_id = event
+    find_best_times(admin.username, event_id)
+    assert profiler.spans == {}
+
+
+def test_spans(profiling_off, event):
+    """
+    Test that spans are recorded for entry points and the functions they
+    call, and that disabling stops recording.
+    """
+    admin, event_id = event
+    enable()
+    find_best_times(admin.username, event_id)
+    find_best_times(admin.username, event_id)
+    disable()
+    find_best_times(admin.username, event_id)
+
+    spans = profiler.spans
+    assert spans["event_data.find_best_times"][0] == 2
+    assert spans["error_checks.check_username"][0] == 2
+    assert spans["event_data.find_best_intervals"][0] == 1
+    calls, total, longest = spans["event_data.find_best_times"]
+    assert 0 < longest <= total
+
+
+def test_select_functions(profiling_off, event):
+    """
+    Test that only the functions asked for are profiled.
+    """
+    admin, event_id = event
+    enable(functions=["find_best_intervals", "error_checks.check_event_id"])
+    find_best_times(admin.username, event_id)
+
+    assert set(profiler.spans) == {"event_data.find_best_intervals",
+                                   "error_checks.check_event_id"}
+
+
+def test_sample_rate(profiling_off, event):
+    """
+    Test that sampled out calls are not recorded, nor are the calls they
+    make.
+    """
+    admin, event_id = event
+    enable(sample_rate=0)
+    for _ in range(10):
+        find_best_times(admin.username, event_id)
+    assert profiler.spans == {}
+
+
+def test_dump(profiling_off, tmp_path, event):
+    """
+    Test that dumped spans and cProfile statistics can be read back.
+    """
+    admin, event_id = event
+    enable(functions=["find_best_times"], use_cprofile=True)
+    find_best_times(admin.username, event_id)
+    dump(tmp_path)
+
+    with open(os.path.join(tmp_path, "spans.json")) as f:
+        spans = json.load(f)
+    assert spans["event_data.find_best_times"]["calls"] == 1
+
+    stats = pstats.Stats(os.path.join(tmp_path,
+                                      "event_data.find_best_times.prof"))
+    assert any(name == "find_best_intervals"
+               for _, _, name in stats.stats)
+    assert not profiler.state.profiling
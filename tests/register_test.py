@@ -3,6 +3,7 @@ Tests for register()
 """
 
 
+from threading import Thread
 from auth import register, MAX_USERNAME, MIN_PASSWORD, MAX_NAME
 from data import data
 from error import InputError
@@ -79,6 +80,37 @@ def test_email_not_unique(bot):
     expect_error(register, InputError, "a", "abcdef", "a", "a", bot.email)
 
 
+def test_email_not_unique_case(bot):
+    """
+    Test an email that differs from an existing one only by case.
+    """
+    expect_error(register, InputError, "a", "abcdef", "a", "a",
+                 bot.email.upper())
+
+
+def test_concurrent_same_email():
+    """
+    Test that only one of many simultaneous registrations with the same
+    email succeeds.
+    """
+    errors = []
+
+    def attempt(i):
+        try:
+            register("user" + str(i), "abcdef", "A", "B", "same@email.com")
+        except InputError:
+            errors.append(i)
+
+    threads = [Thread(target=attempt, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 19
+    assert list(data.emails) == ["same@email.com"]
+
+
 def test_success_register():
     """
     Test a successful registration.
@@ -0,0 +1,79 @@
+"""
+Tests for remove_users()
+"""
+
+
+import pytest
+from datetime import date, timedelta
+from data import data
+from error import AuthError, InputError
+from helpers import expect_error
+from event_admin import remove_users
+from event_data import find_intersection
+from event_member import edit_availability_daily
+from auth import log_out
+
+
+def test_not_member(bot, event_members):
+    """
+    Test that nobody is removed when one user is not a member.
+    """
+    admin, bots, event_id = event_members
+    expect_error(remove_users, InputError, admin.username,
+                 [bots[0].username, bot.username], event_id)
+    assert len(data.events[event_id].member_usernames) == 3
+
+
+def test_remove_self(event_members):
+    """
+    Test that the admin cannot be in the list of removed members.
+    """
+    admin, bots, event_id = event_members
+    expect_error(remove_users, InputError, admin.username,
+                 [bots[0].username, admin.username], event_id)
+    assert len(data.events[event_id].member_usernames) == 3
+
+
+def test_not_admin(event_members):
+    """
+    Test when the remover is not the event admin.
+    """
+    _, bots, event_id = event_members
+    expect_error(remove_users, AuthError, bots[0].username,
+                 [bots[1].username], event_id)
+
+
+@pytest.mark.parametrize("event_members", [1], indirect=True)
+def test_not_logged_in(event_members):
+    """
+    Test when the admin is not logged in.
+    """
+    admin, bots, event_id = event_members
+    log_out(admin.username)
+    expect_error(remove_users, AuthError, admin.username,
+                 [bots[0].username], event_id)
+
+
+@pytest.mark.parametrize("event_members", [4], indirect=True)
+def test_success_remove(event_members):
+    """
+    Test that removed members, including repeats, leave the counts and
+    their joined events, while the event version changes once.
+    """
+    admin, bots, event_id = event_members
+    day = date.today() + timedelta(days=1)
+    for user in [admin] + bots:
+        edit_availability_daily(user.username, event_id, True, day)
+    event = data.events[event_id]
+    version = event.version
+    removed = [bots[0].username, bots[1].username, bots[0].username]
+    remove_users(admin.username, removed, event_id)
+
+    assert event.member_usernames == {admin.username, bots[2].username,
+                                      bots[3].username}
+    assert event.version == version + 1
+    assert max(max(d) for d in event.counts) == 3
+    assert event.counts == find_intersection(
+        [s.times for s in event.availabilities.values()])
+    assert not bots[0].joined_event_ids
+    assert list(bots[2].joined_event_ids) == [event_id]
@@ -0,0 +1,87 @@
+"""
+Tests for the mapped schedule file
+"""
+
+
+import pytest
+import schedule_file as module
+from datetime import date, time, timedelta
+from data import data
+from event_admin import create_event, invite_user, edit_event_length
+from event_data import find_best_times, find_intersection
+from event_member import edit_availability_daily, edit_availability_weekly, TUE
+from helpers import create_bot
+from schedule_file import write_schedules, ScheduleFile
+
+
+def make_events():
+    """
+    Make three events with different members and availabilities.
+    """
+    event_ids = []
+    for n in range(3):
+        admin = create_bot()
+        event_id = create_event(admin.username, "ABC", [])
+        edit_event_length(admin.username, n + 1, event_id)
+        for i in range(n + 2):
+            bot = create_bot()
+            invite_user(admin.username, bot.username, event_id)
+            edit_availability_daily(bot.username, event_id, True,
+                                    date.today() + timedelta(days=2 + i))
+            edit_availability_weekly(bot.username, event_id, True,
+                                     TUE, time(9 + i), time(15))
+        event_ids.append(event_id)
+
+    return event_ids
+
+
+@pytest.fixture
+def schedule_file(tmp_path):
+    """
+    Return the event ids of three events, and a file with their schedules.
+    """
+    event_ids = make_events()
+    path = str(tmp_path / "schedules.bin")
+    write_schedules(path, data.events.values())
+    f = ScheduleFile(path)
+    yield event_ids, f
+    f.close()
+
+
+def test_read_schedules(schedule_file):
+    """
+    Test that mapped schedules have the same rows as the originals.
+    """
+    event_ids, f = schedule_file
+    for event_id in event_ids:
+        event = data.events[event_id]
+        mapped = f.get_event(event_id)
+        assert set(mapped.availabilities) == set(event.availabilities)
+        for username, schedule in event.availabilities.items():
+            assert mapped.availabilities[username].rows == schedule.rows
+
+        times = [s.times for s in mapped.availabilities.values()]
+        assert find_intersection(times) == event.counts
+        assert f.tally(mapped) == event.counts
+
+    assert f.get_event(max(event_ids) + 1) is None
+
+
+def test_tally_without_numpy(schedule_file, monkeypatch):
+    """
+    Test counting mapped schedules without numpy.
+    """
+    event_ids, f = schedule_file
+    monkeypatch.setattr(module, "np", None)
+    event = f.get_event(event_ids[1])
+    assert f.tally(event) == data.events[event_ids[1]].counts
+
+
+def test_find_best_times(schedule_file):
+    """
+    Test that best times from the file match those of the event.
+    """
+    event_ids, f = schedule_file
+    for event_id in event_ids:
+        admin = data.events[event_id].admin_username
+        assert f.find_best_times(event_id) == find_best_times(admin, event_id)
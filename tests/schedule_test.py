@@ -0,0 +1,221 @@
+"""
+Tests for Schedule
+"""
+
+
+import sys
+import random
+import pytest
+from datetime import datetime, time, timedelta
+from data import (data, Schedule, SparseSchedule, EMPTY_COUNTS, EMPTY_WEEK,
+                  MAX_DAYS, INTERVALS, DENSE_MIN_RUNS, convert_schedule,
+                  interval_mask, apply_mask, day_masks)
+from event_data import find_intersection
+from event_member import (edit_availability_weekly, edit_availability_special,
+                          MON)
+
+
+def test_times_view():
+    """
+    Test that reads and writes through times update the packed rows.
+    """
+    schedule = Schedule("a")
+    schedule.times[3][14] = True
+    assert schedule.times[3][14]
+    assert schedule.rows[3] == 1 << 14
+
+    schedule.times[3][14] = False
+    assert not any(schedule.times[3])
+    assert schedule.rows[3] == 0
+
+
+def test_set_intervals_across_days():
+    """
+    Test setting a range of intervals that crosses midnight.
+    """
+    schedule = Schedule("a")
+    schedule.set_intervals(2 * INTERVALS - 2, 3 * INTERVALS + 2, True)
+
+    assert schedule.times[1][INTERVALS - 2] and schedule.times[1][INTERVALS - 1]
+    assert all(schedule.times[2])
+    assert schedule.times[3][:3] == [True, True, False]
+    assert sum(bin(row).count("1") for row in schedule.rows) == INTERVALS + 4
+
+
+def test_compact():
+    """
+    Test that a schedule takes far less memory than a 2D list of bools.
+    """
+    schedule = Schedule("a")
+    for d in range(MAX_DAYS):
+        schedule.set_day_intervals(d, 0, INTERVALS, True)
+
+    grid = [[True] * INTERVALS for _ in range(MAX_DAYS)]
+    grid_size = sys.getsizeof(grid) + sum(sys.getsizeof(r) for r in grid)
+    size = sys.getsizeof(schedule.rows) + sum(sys.getsizeof(r)
+                                              for r in schedule.rows)
+    assert size * 10 < grid_size
+
+
+def test_sparse_merges_blocks():
+    """
+    Test that touching blocks are merged and removals split blocks.
+    """
+    schedule = SparseSchedule("a")
+    schedule.set_intervals(10, 20, True)
+    schedule.set_intervals(20, 30, True)
+    schedule.set_intervals(5, 10, True)
+    assert schedule.bounds == [5, 30]
+
+    schedule.set_intervals(12, 14, False)
+    assert schedule.bounds == [5, 12, 14, 30]
+
+    schedule.set_intervals(0, 100, False)
+    assert schedule.bounds == []
+
+
+def test_sparse_matches_dense():
+    """
+    Test that random edits give the same rows in both storages.
+    """
+    rand = random.Random(1)
+    dense = Schedule("a")
+    sparse = SparseSchedule("a")
+    for _ in range(300):
+        start = rand.randrange(MAX_DAYS * INTERVALS)
+        end = start + rand.randrange(1, 3 * INTERVALS)
+        available = rand.random() < 0.6
+        dense.set_intervals(start, end, available)
+        sparse.set_intervals(start, end, available)
+
+        day = rand.randrange(MAX_DAYS)
+        row = rand.getrandbits(INTERVALS) if rand.random() < 0.1 else 0
+        if row:
+            dense.set_row(day, row)
+            sparse.set_row(day, row)
+
+    assert sparse.rows == dense.rows
+    assert sparse.runs() == dense.runs()
+
+
+def test_storage_chosen_by_blocks(event):
+    """
+    Test that an event switches a schedule's storage as blocks are added
+    and removed.
+    """
+    admin, event_id = event
+    event = data.events[event_id]
+    assert isinstance(event.availabilities[admin.username], SparseSchedule)
+
+    # Each special edit adds a block on a different day
+    first_day = event.create_time.date() + timedelta(days=1)
+    for d in range(DENSE_MIN_RUNS + 1):
+        start = datetime.combine(first_day + timedelta(days=d), time(9))
+        edit_availability_special(admin.username, event_id, True,
+                                  start, start + timedelta(minutes=30))
+    schedule = event.availabilities[admin.username]
+    assert type(schedule) == Schedule
+    assert schedule.run_count() > DENSE_MIN_RUNS
+
+    # Weekly edits are kept in the template, which adds no blocks
+    edit_availability_weekly(admin.username, event_id, True,
+                             MON, time(12), time(13))
+    assert type(event.availabilities[admin.username]) == Schedule
+
+    edit_availability_special(admin.username, event_id, False,
+                              datetime.combine(first_day, time(0)),
+                              start + timedelta(days=1))
+    schedule = event.availabilities[admin.username]
+    assert isinstance(schedule, SparseSchedule)
+    assert schedule.weekly != EMPTY_WEEK
+    assert not any(any(day) for day in event.counts[1:DENSE_MIN_RUNS + 2])
+    assert any(any(day) for day in event.counts[DENSE_MIN_RUNS + 2:])
+
+
+def test_untouched_days_take_no_memory(event):
+    """
+    Test that only days written to are stored, and that an event's days
+    without availability share one read only row of counts.
+    """
+    schedule = Schedule("a")
+    schedule.set_day_intervals(4, 0, 2, True)
+    schedule.set_day_intervals(9, 0, 2, True)
+    schedule.set_day_intervals(9, 0, 2, False)
+    assert schedule.days == {4: 3}
+    assert schedule.touched_days() == [4]
+
+    sparse = SparseSchedule("a")
+    sparse.set_intervals(INTERVALS - 1, INTERVALS + 1, True)
+    sparse.set_intervals(3 * INTERVALS + 1, 3 * INTERVALS + 2, True)
+    sparse.set_intervals(3 * INTERVALS + 5, 3 * INTERVALS + 6, True)
+    assert sparse.touched_days() == [0, 1, 3]
+
+    admin, event_id = event
+    event = data.events[event_id]
+    assert all(day is EMPTY_COUNTS for day in event.counts)
+    with pytest.raises(TypeError):
+        event.counts[0][0] = 1
+
+    event.availabilities[admin.username].set_day_intervals(2, 0, 1, True)
+    assert event.counts[2][0] == 1
+    assert sum(day is EMPTY_COUNTS for day in event.counts) == MAX_DAYS - 1
+    assert EMPTY_COUNTS == [0] * INTERVALS
+
+
+def test_weekly_template():
+    """
+    Test that weekly edits only write the template, and that later edits
+    win over earlier ones whichever layer they are in.
+    """
+    schedule = Schedule("a")
+    schedule.set_weekly(2, interval_mask(18, 34), True)
+    assert schedule.days == {} and schedule.cleared == {}
+    assert schedule.rows[9] == interval_mask(18, 34)
+    assert schedule.rows[10] == 0
+
+    schedule.set_day_intervals(9, 20, 22, False)
+    schedule.set_day_intervals(16, 40, 42, True)
+    assert schedule.rows[9] == interval_mask(18, 20) | interval_mask(22, 34)
+    assert schedule.rows[16] == interval_mask(18, 34) | interval_mask(40, 42)
+
+    schedule.set_weekly(2, interval_mask(18, 42), True)
+    assert schedule.rows[9] == interval_mask(18, 42)
+    assert schedule.days == {} and schedule.cleared == {}
+
+
+def test_weekly_matches_dated():
+    """
+    Test that random weekly and dated edits give the same rows and counts
+    as writing every week's day separately.
+    """
+    rand = random.Random(2)
+    schedules = [Schedule("a"), SparseSchedule("b")]
+    expected = [0] * MAX_DAYS
+    for _ in range(200):
+        available = rand.random() < 0.6
+        if rand.random() < 0.3:
+            weekday = rand.randrange(7)
+            mask = interval_mask(*sorted(rand.sample(range(INTERVALS + 1), 2)))
+            for s in schedules:
+                s.set_weekly(weekday, mask, available)
+            for d in range(weekday, MAX_DAYS, 7):
+                expected[d] = apply_mask(expected[d], mask, available)
+        else:
+            start = rand.randrange(MAX_DAYS * INTERVALS)
+            end = start + rand.randrange(1, 2 * INTERVALS)
+            for s in schedules:
+                s.set_intervals(start, end, available)
+            for d, mask in day_masks(start, end):
+                expected[d] = apply_mask(expected[d], mask, available)
+
+    for s in schedules:
+        assert s.rows == expected
+        for d, row in s.cleared.items():
+            assert row & ~s.weekly[d % 7] == 0
+
+    copy = convert_schedule(schedules[1], Schedule)
+    assert copy.rows == expected
+
+    counts = find_intersection([s.times for s in schedules])
+    assert counts == [[2 * (row >> t & 1) for t in range(INTERVALS)]
+                      for row in expected]
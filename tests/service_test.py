@@ -0,0 +1,78 @@
+"""
+Tests for MeeterService
+"""
+
+
+import asyncio
+import pytest
+from datetime import date, timedelta
+from data import data
+from error import InputError
+from event_data import find_best_times
+from service import MeeterService
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def service():
+    service = MeeterService()
+    yield service
+    service.close()
+
+
+def test_errors_raised(service):
+    """
+    Test that errors from the functions are raised by the coroutines.
+    """
+    with pytest.raises(InputError):
+        run(service.find_best_times("aaa", 1))
+
+
+def test_many_clients(service):
+    """
+    Test many clients joining and editing two events at once.
+    """
+    day = date.today() + timedelta(days=2)
+
+    async def client(name, event_id):
+        await service.register(name, "abcdef", "A", "B", name + "@a.com")
+        await service.invite_user("admin", name, event_id)
+        await service.edit_availability_daily(name, event_id, True, day)
+        return await service.find_best_times(name, event_id)
+
+    async def main():
+        await service.register("admin", "abcdef", "A", "B", "admin@a.com")
+        first = await service.create_event("admin", "ABC", [])
+        second = await service.create_event("admin", "DEF", [])
+        await asyncio.gather(*[client("user" + str(i), (first, second)[i % 2])
+                               for i in range(40)])
+        return first, second
+
+    first, second = run(main())
+    assert len(data.events[first].member_usernames) == 21
+    assert max(max(day) for day in data.events[second].counts) == 20
+    assert (run(service.find_best_times("admin", first)) ==
+            find_best_times("admin", first))
+    assert not service.event_locks
+
+
+def test_same_event_in_order(service):
+    """
+    Test that calls for the same event run in the order they were made.
+    """
+    day = date.today() + timedelta(days=2)
+
+    async def main():
+        await service.register("admin", "abcdef", "A", "B", "admin@a.com")
+        event_id = await service.create_event("admin", "ABC", [])
+        await asyncio.gather(*[
+            service.edit_availability_daily("admin", event_id, i % 2 == 0,
+                                            day)
+            for i in range(21)])
+        return event_id
+
+    event_id = run(main())
+    assert all(data.events[event_id].availabilities["admin"].times[2])
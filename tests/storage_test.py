@@ -0,0 +1,149 @@
+"""
+Tests for SQLiteStorage
+"""
+
+
+import pytest
+from threading import Thread
+from datetime import date, time, timedelta
+from data import data, Storage, User
+from storage import (SQLiteStorage, pack_rows, unpack_rows, pack_calendar,
+                     unpack_calendar)
+from auth import log_out, register
+from event_admin import create_event, invite_user, edit_event_length
+from event_data import find_best_times
+from event_member import edit_availability_daily, edit_availability_weekly, MON
+from event_data import find_intersection
+from personal_calendar import edit_calendar_weekly, edit_calendar_daily
+from helpers import create_bot, expect_error
+from error import InputError
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Use a new SQLite database for storage, and stop using it afterwards.
+    """
+    path = str(tmp_path / "meeter.db")
+    data.use_storage(SQLiteStorage(path))
+    yield path
+    data.use_storage(Storage())
+
+
+def test_pack_rows():
+    """
+    Test that packed rows unpack to the same rows.
+    """
+    rows = [(d * 2654435761) % (1 << 48) for d in range(60)]
+    assert unpack_rows(pack_rows(rows)) == rows
+
+
+def test_restart(db):
+    """
+    Test that users, events and schedules are loaded after a restart.
+    """
+    admin = create_bot()
+    member = create_bot()
+    other = create_bot()
+    event_id = create_event(admin.username, "ABC", [])
+    invite_user(admin.username, member.username, event_id)
+    edit_event_length(admin.username, 2, event_id)
+    day = date.today() + timedelta(days=3)
+    edit_availability_daily(admin.username, event_id, True, day)
+    edit_availability_weekly(member.username, event_id, True,
+                             MON, time(9), time(12))
+    log_out(other.username)
+    second = create_event(admin.username, "DEF", [member.username])
+    # Editing a schedule must not move its event to the end of the order
+    edit_availability_daily(member.username, event_id, True, day)
+    before = find_best_times(member.username, event_id)
+    counts = data.events[event_id].counts
+
+    data.use_storage(SQLiteStorage(db))
+    assert not data.users and not data.events
+
+    assert find_best_times(member.username, event_id) == before
+    event = data.events[event_id]
+    assert event.counts == counts
+    assert event.event_length == 2
+    assert event.member_usernames == {admin.username, member.username}
+    assert set(data.events) == {event_id}
+    assert list(data.users[member.username].joined_event_ids) == \
+        [event_id, second]
+
+    assert not data.users[other.username].logged_in
+    assert data.event_next_id == second + 1
+    expect_error(register, InputError,
+                 "x", "abcdef", "A", "B", admin.email.upper())
+
+
+def test_commit_per_thread(db):
+    """
+    Test that a commit only makes the writes of its own thread permanent.
+    """
+    storage = data.storage
+    mine = User("mine", "hash", "mine@b.com", "A", "B")
+    theirs = User("theirs", "hash", "theirs@b.com", "A", "B")
+    thread = Thread(target=storage.save_user, args=(theirs,))
+    thread.start()
+    thread.join()
+    storage.save_user(mine)
+    storage.commit()
+
+    data.use_storage(SQLiteStorage(db))
+    assert data.users.get("mine") is not None
+    assert data.users.get("theirs") is None
+
+
+def test_restart_lone_event(db):
+    """
+    Test that an event created without other members is loaded after a
+    restart, and its ID is not handed out again.
+    """
+    admin = create_bot()
+    event_id = create_event(admin.username, "ABC", [])
+
+    data.use_storage(SQLiteStorage(db))
+    event = data.events.get(event_id)
+    assert event is not None
+    assert event.member_usernames == {admin.username}
+    assert data.event_next_id == event_id + 1
+
+
+def test_pack_calendar(bot):
+    """
+    Test that a packed calendar unpacks to the same calendar.
+    """
+    edit_calendar_weekly(bot.username, True, MON, time(9), time(12))
+    edit_calendar_daily(bot.username, False, date.today())
+    calendar = unpack_calendar(pack_calendar(bot.calendar))
+    assert calendar.weekly == bot.calendar.weekly
+    assert calendar.days == bot.calendar.days
+
+
+def test_restart_calendar(db):
+    """
+    Test that calendars, and the event changes laid over them, are loaded
+    after a restart, and that calendar edits then still reach every event.
+    """
+    admin = create_bot()
+    member = create_bot()
+    first = create_event(admin.username, "ABC", [member.username])
+    second = create_event(admin.username, "DEF", [member.username])
+    edit_calendar_weekly(member.username, True, MON, time(9), time(12))
+    day = date.today() + timedelta(days=(7 - date.today().weekday()))
+    edit_availability_daily(member.username, first, False, day)
+    counts = [data.events[event_id].counts for event_id in (first, second)]
+
+    data.use_storage(SQLiteStorage(db))
+    assert [data.events[event_id].counts
+            for event_id in (first, second)] == counts
+
+    edit_calendar_daily(member.username, True, day)
+    for event_id in (first, second):
+        event = data.events[event_id]
+        times = [s.times for s in event.availabilities.values()]
+        assert event.counts == find_intersection(times)
+    d = (day - date.today()).days
+    assert data.events[first].availabilities[member.username].row(d) == 0
+    assert data.events[second].counts[d] == [1] * 48